@@ -2,7 +2,6 @@
 Albert Heijn Scraper - Simplified DOM-based approach
 Uses the same pattern as CarrefourScraper for consistency
 """
-import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -10,9 +9,89 @@ from bs4 import BeautifulSoup
 import json
 import time
 from cf_scraper import determine_wine_type, determine_bottle_size
+from wine_schema import normalize_wine
+from run_telemetry import RunTelemetry
+from browser import open_site, close_browser, has_consent, cookie_names, save_consent, wait_for_count
+from scraper_debug import DEBUG_CAPTURE, HTML_PARSER, save_page
+from scraper_fixtures import record_page
+
+def parse_products(page_html, seen_urls=None, telemetry=None, category=None, parser=HTML_PARSER):
+    """Wines on an Albert Heijn category page: (number of article elements, [wine])
+    URLs in seen_urls (updated in place) are skipped, so categories can share products"""
+    if seen_urls is None:
+        seen_urls = set()
+    soup = BeautifulSoup(page_html, parser)
+    products = soup.find_all('article')
+    
+    wines = []
+    for product in products:
+        try:
+            # Extract name - try multiple selectors
+            name_elem = product.select_one("[data-testid='product-title']")
+            if not name_elem:
+                name_elem = product.select_one("h3")
+            if not name_elem:
+                name_elem = product.select_one(".title")
+            
+            if not name_elem:
+                if telemetry:
+                    telemetry.failure('ah:no_name', category=category)
+                continue
+                
+            name = name_elem.get_text(strip=True)
+            
+            # Extract price
+            price = "N/A"
+            price_elem = product.select_one("[data-testid='price-amount']")
+            if not price_elem:
+                price_elem = product.select_one(".price-amount")
+            if price_elem:
+                price = price_elem.get_text(strip=True).replace('€', '').strip()
+            
+            # Extract URL
+            link = "#"
+            link_elem = product.find('a')
+            if link_elem:
+                link = link_elem.get('href', '#')
+            
+            if link.startswith('/'):
+                link = f"https://www.ah.be{link}"
+            
+            # Skip if we've seen this URL before (deduplication)
+            if link in seen_urls or link == "#":
+                continue
+            
+            seen_urls.add(link)
+            
+            # Extract image
+            image_url = "https://upload.wikimedia.org/wikipedia/commons/a/ac/No_image_available.svg"
+            img_elem = product.select_one("img")
+            if img_elem:
+                image_url = img_elem.get('src', image_url)
+            
+            wine = normalize_wine({
+                "name": name,
+                "price": price,
+                "url": link,
+                "image_url": image_url,
+                "type": determine_wine_type(name),
+                "size": determine_bottle_size(name),
+                "vivino_score": None,
+                "store": "Albert Heijn"
+            })
+            wines.append(wine)
+            
+        except Exception as e:
+            # Skip products that fail to parse
+            if telemetry:
+                telemetry.failure(f'ah:parse_{type(e).__name__}', category=category)
+            continue
+    return len(products), wines
+
 
 class AlbertHeijnScraper:
-    def __init__(self):
+    def __init__(self, telemetry=None):
+        self.telemetry = telemetry or RunTelemetry('albert_heijn', log_file=None)
         self.category_urls = [
             "https://www.ah.be/producten/21613/witte-wijn",      # White wine
             "https://www.ah.be/producten/21539/rose",             # Rosé
@@ -20,39 +99,45 @@ class AlbertHeijnScraper:
             "https://www.ah.be/producten/23522/bubbels-en-mousserende-wijn"  # Sparkling
         ]
         
-    def get_wines(self):
-        """Scrape wines from all categories using Selenium + BeautifulSoup"""
+    def get_wines(self, on_wine=None):
+        """Scrape wines from all categories using Selenium + BeautifulSoup.
+        If on_wine is given it is called with each wine as soon as it is parsed."""
         print("Starting Albert Heijn scraper...")
         all_wines = []
         seen_urls = set()  # Simple deduplication by URL
         driver = None
+        t = self.telemetry
         
         try:
-            options = uc.ChromeOptions()
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            # options.add_argument('--headless')  # Keep visible to avoid detection
-            
-            driver = uc.Chrome(options=options)
+            # Headless with images and trackers blocked (see browser.py)
+            driver = open_site('ah', self.category_urls[0], t)
             
-            # Handle cookies once at the start
-            driver.get(self.category_urls[0])
-            time.sleep(5)
-            try:
-                cookie_btn = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Accepteren') or contains(text(), 'Accept') or contains(text(), 'accepteren')]"))
-                )
-                cookie_btn.click()
-                print("Cookies accepted.")
-                time.sleep(2)
-            except:
-                print("No cookie banner found.")
+            # Handle cookies once at the start (the saved browser profile remembers an earlier consent)
+            if has_consent(driver, 'ah'):
+                print("Cookies already accepted (saved session).")
+            else:
+                with t.stage('ah:cookies'):
+                    consent_before = cookie_names(driver)
+                    try:
+                        cookie_btn = WebDriverWait(driver, 10).until(
+                            EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Accepteren') or contains(text(), 'Accept') or contains(text(), 'accepteren')]"))
+                        )
+                        cookie_btn.click()
+                        print("Cookies accepted.")
+                        t.wait(2, 'ah:cookies')
+                    except:
+                        print("No cookie banner found.")
+                    save_consent(driver, 'ah', consent_before)
 
             # Scrape each category
             for url in self.category_urls:
                 print(f"\nScraping URL: {url}")
+                category = url.rstrip('/').rsplit('/', 1)[-1]
+                crawl_stage = f'ah:crawl:{category}'
+                crawl_start = time.perf_counter()
+                category_wines = 0
                 driver.get(url)
-                time.sleep(5)
+                wait_for_count(driver, By.TAG_NAME, "article", 0)
                 
                 # Click "meer resultaten" button to load all wines
                 print("  Loading all products by clicking 'meer resultaten'...")
@@ -61,8 +146,6 @@ class AlbertHeijnScraper:
                 
                 for i in range(max_clicks):
                     try:
-                        time.sleep(2)
-                        
                         # Count current products
                         current_products = len(driver.find_elements(By.TAG_NAME, "article"))
                         if current_products > products_loaded:
@@ -79,99 +162,52 @@ class AlbertHeijnScraper:
                             btn = meer_buttons[0]
                             # Scroll to button
                             driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", btn)
-                            time.sleep(1)
+                            t.wait(1, crawl_stage)
                             
                             # Click the button using JavaScript to avoid visibility issues
                             driver.execute_script("arguments[0].click();", btn)
+                            t.count('ah.clicks')
                             print(f"  Clicked 'meer resultaten' button (click {i+1})")
-                            time.sleep(3)
+                            # Continue as soon as the new products are there
+                            wait_for_count(driver, By.TAG_NAME, "article", current_products)
                         else:
                             print(f"  No more 'meer resultaten' button found after {i} clicks")
                             break
                             
                     except Exception as e:
+                        t.failure(f'ah:click_{type(e).__name__}', category=category, click=i + 1)
                         print(f"  Error clicking load more: {e}")
                         print(f"  Finished loading after {i} clicks")
                         break
                 
                 print(f"  Finished loading. Total products on page: {products_loaded}")
+                t.record_stage(crawl_stage, time.perf_counter() - crawl_start, products=products_loaded)
                 
                 # Parse content with BeautifulSoup
-                soup = BeautifulSoup(driver.page_source, 'html.parser')
-                products = soup.find_all('article')
+                parse_start = time.perf_counter()
+                page_html = driver.page_source
+                record_page('ah', url, page_html)
+                article_count, wines = parse_products(page_html, seen_urls, t, category)
+                print(f"  Found {article_count} article elements")
                 
-                print(f"  Found {len(products)} article elements")
-                
-                for product in products:
-                    try:
-                        # Extract name - try multiple selectors
-                        name_elem = product.select_one("[data-testid='product-title']")
-                        if not name_elem:
-                            name_elem = product.select_one("h3")
-                        if not name_elem:
-                            name_elem = product.select_one(".title")
-                        
-                        if not name_elem:
-                            continue
-                            
-                        name = name_elem.get_text(strip=True)
-                        
-                        # Extract price
-                        price = "N/A"
-                        price_elem = product.select_one("[data-testid='price-amount']")
-                        if not price_elem:
-                            price_elem = product.select_one(".price-amount")
-                        if price_elem:
-                            price = price_elem.get_text(strip=True).replace('€', '').strip()
-                        
-                        # Extract URL
-                        link = "#"
-                        link_elem = product.find('a')
-                        if link_elem:
-                            link = link_elem.get('href', '#')
-                        
-                        if link.startswith('/'):
-                            link = f"https://www.ah.be{link}"
-                        
-                        # Skip if we've seen this URL before (deduplication)
-                        if link in seen_urls or link == "#":
-                            continue
-                        
-                        seen_urls.add(link)
-                        
-                        # Extract image
-                        image_url = "https://upload.wikimedia.org/wikipedia/commons/a/ac/No_image_available.svg"
-                        img_elem = product.select_one("img")
-                        if img_elem:
-                            image_url = img_elem.get('src', image_url)
-                        
-                        all_wines.append({
-                            "name": name,
-                            "price": price,
-                            "url": link,
-                            "image_url": image_url,
-                            "type": determine_wine_type(name),
-                            "size": determine_bottle_size(name),
-                            "vivino_score": "N/A",
-                            "store": "Albert Heijn"
-                        })
-                        
-                    except Exception as e:
-                        # Skip products that fail to parse
-                        continue
+                for wine in wines:
+                    all_wines.append(wine)
+                    category_wines += 1
+                    t.count('products')
+                    if on_wine:
+                        on_wine(wine)
                 
-                category_count = len(all_wines) - len([w for w in all_wines if w not in all_wines[-products_loaded:]])
-                print(f"  Extracted {len(all_wines)} total wines so far")
+                t.record_stage(f'ah:parse:{category}', time.perf_counter() - parse_start, products=category_wines)
+                print(f"  Extracted {category_wines} new wines ({len(all_wines)} total wines so far)")
                         
         except Exception as e:
             print(f"Selenium scraping error: {e}")
         finally:
             if driver:
                 try:
-                    with open("ah_selenium_dump.html", "w", encoding="utf-8") as f:
-                        f.write(driver.page_source)
-                    print("Saved HTML to ah_selenium_dump.html")
-                    driver.quit()
+                    if DEBUG_CAPTURE:
+                        print(f"Saved HTML to {save_page('ah_final', driver.page_source)}")
+                    close_browser(driver)
                 except:
                     pass
         
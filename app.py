@@ -1,113 +1,134 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, send_file, abort
 import json
+import math
 from cf_scraper import CarrefourScraper
 from vivino_scraper import VivinoScraper
 import threading
-import pandas as pd
 import os
+import time
+import metrics
+from entity_resolution import load_canonical_ids
+from wine_schema import read_wines_csv
+from price_history import PriceHistory
+from image_cache import ImageCache, attach_image_urls, cache_path, DIGEST_RE, CACHE_MAX_AGE
+from wine_facets import FacetIndex, FACETS
+from wine_ranking import top_wines, METRICS, DEFAULT_K, MAX_K
 
 app = Flask(__name__)
+metrics.init_app(app)
 carrefour_scraper = CarrefourScraper()
 vivino_scraper = VivinoScraper()
 
 # Cache for wines to avoid re-scraping on every request
 wine_cache = []
+# canonical id -> listings of the same wine across stores (from entity_resolution.py)
+canonical_offers = {}
+# Filter index over wine_cache for /api/wines (see wine_facets.py)
+facet_index = FacetIndex([])
 
 def load_wines_from_csv():
-    """Load wine data from CSVs."""
+    """Load wine data from CSVs (parsed into native types by wine_schema)."""
     all_wines = []
     seen_urls = set()  # Track URLs to avoid duplicates
     
-    # Load Carrefour wines
-    if os.path.exists('carrefour_wines.csv'):
-        print("Loading wines from carrefour_wines.csv...")
-        df = pd.read_csv('carrefour_wines.csv')
-        if 'name' in df.columns:
-            for _, row in df.iterrows():
-                url = row.get('url', '#')
-                # Skip if we've already seen this URL (duplicate)
-                if url in seen_urls or url == '#':
-                    continue
-                seen_urls.add(url)
-                all_wines.append(process_wine_row(row, 'Carrefour'))
-    
-    # Load Albert Heijn wines
-    if os.path.exists('ah_wines.csv'):
-        print("Loading wines from ah_wines.csv...")
-        df = pd.read_csv('ah_wines.csv')
-        if 'name' in df.columns:
-            for _, row in df.iterrows():
-                url = row.get('url', '#')
-                # Skip if we've already seen this URL (duplicate)
-                if url in seen_urls or url == '#':
-                    continue
-                seen_urls.add(url)
-                all_wines.append(process_wine_row(row, 'Albert Heijn'))
+    for csv_file, store_name in [('carrefour_wines.csv', 'Carrefour'), ('ah_wines.csv', 'Albert Heijn')]:
+        if not os.path.exists(csv_file):
+            continue
+        print(f"Loading wines from {csv_file}...")
+        for wine in read_wines_csv(csv_file, store_name):
+            # Skip if we've already seen this URL (duplicate)
+            if wine['url'] in seen_urls or wine['url'] == '#':
+                continue
+            seen_urls.add(wine['url'])
+            all_wines.append(wine)
                 
     print(f"Total loaded wines: {len(all_wines)}")
     return all_wines
 
-def process_wine_row(row, store_name):
-    """Helper to process a CSV row into a wine object"""
-    # Handle NaN values
-    score = row.get('vivino_score', 'N/A')
-    if pd.isna(score): score = "N/A"
-    
-    price = row.get('price', 'N/A')
-    if pd.isna(price): price = "N/A"
-    
-    image_url = row.get('image_url', 'https://upload.wikimedia.org/wikipedia/commons/a/ac/No_image_available.svg')
-    if pd.isna(image_url): image_url = "https://upload.wikimedia.org/wikipedia/commons/a/ac/No_image_available.svg"
-    
-    wine_type = row.get('type', 'Other')
-    if pd.isna(wine_type): wine_type = 'Other'
-    
-    size = row.get('size', 'Other')
-    if pd.isna(size): size = 'Other'
-
-    return {
-        "name": row['name'],
-        "price": price,
-        "url": row.get('url', '#'),
-        "image_url": image_url,
-        "vivino_score": score,
-        "type": wine_type,
-        "size": size,
-        "store": store_name
-    }
-
 def update_cache():
-    global wine_cache
+    global wine_cache, canonical_offers, facet_index
     print("Updating wine cache...")
+    start = time.perf_counter()
     
     # Load from CSV (names only)
     wines = load_wines_from_csv()
     
+    # Serve cached thumbnails when image_cache.py has processed the image
+    attach_image_urls(wines, ImageCache())
+    
+    # Attach canonical ids so the same wine can be compared across stores
+    canonical_ids = load_canonical_ids()
+    offers = {}
+    for w in wines:
+        w['canonical_id'] = canonical_ids.get(w['url'])
+        if w['canonical_id']:
+            offers.setdefault(w['canonical_id'], []).append(w)
+    
+    index = FacetIndex(wines, load_pairings(), pairings_cache["stamp"])
+    
     wine_cache = wines
+    canonical_offers = offers
+    facet_index = index
+    metrics.REFRESH_DURATION.observe(time.perf_counter() - start)
+    metrics.WINES_CACHED.set(len(wines))
     print(f"Wine cache updated with {len(wines)} wines.")
 
+def ensure_wine_cache():
+    """Load the wine cache on first use"""
+    if wine_cache:
+        metrics.cache_hit('wines')
+    else:
+        metrics.cache_miss('wines')
+        update_cache()
+
 PAIRINGS_FILE = 'pairings.json'
+# Serializes pairings updates (read-modify-write of pairings.json and the pairing index)
+pairings_lock = threading.Lock()
+# Parsed pairings.json, reused until the file changes on disk
+pairings_cache = {"stamp": None, "data": {}}
+MAX_BULK_PAIRINGS = 10000
+
+def pairings_stamp():
+    try:
+        stat = os.stat(PAIRINGS_FILE)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
 
 def load_pairings():
-    if os.path.exists(PAIRINGS_FILE):
+    """pairings.json as a dict, shared by all requests until the file changes; writers
+    change a copy, which save_pairings installs once it is on disk"""
+    stamp = pairings_stamp()
+    if stamp == pairings_cache["stamp"]:
+        metrics.cache_hit('pairings')
+        return pairings_cache["data"]
+    metrics.cache_miss('pairings')
+    
+    migrated = {}
+    if stamp is not None:
         try:
             with open(PAIRINGS_FILE, 'r') as f:
                 data = json.load(f)
                 # Migration: If values are lists, convert to dicts
-                migrated = {}
                 for k, v in data.items():
                     if isinstance(v, list):
                         migrated[k] = {"pairings": v, "description": ""}
                     else:
                         migrated[k] = v
-                return migrated
         except json.JSONDecodeError:
             return {}
-    return {}
+    pairings_cache["stamp"], pairings_cache["data"] = stamp, migrated
+    return migrated
 
 def save_pairings(pairings):
-    with open(PAIRINGS_FILE, 'w') as f:
+    # Write a temp file and swap it in, so a crash never leaves a truncated pairings.json
+    tmp_file = PAIRINGS_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
         json.dump(pairings, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, PAIRINGS_FILE)
+    pairings_cache["stamp"], pairings_cache["data"] = pairings_stamp(), pairings
 
 @app.route('/')
 def index():
@@ -116,8 +137,7 @@ def index():
 @app.route('/wine/<path:wine_name>')
 def wine_detail(wine_name):
     global wine_cache
-    if not wine_cache:
-        update_cache()
+    ensure_wine_cache()
         
     # Find wine
     wine = next((w for w in wine_cache if w['name'] == wine_name), None)
@@ -132,80 +152,361 @@ def wine_detail(wine_name):
     
     return render_template('wine_detail.html', wine=wine)
 
+@app.route('/img/<digest>.webp')
+def cached_image(digest):
+    """Thumbnails from image_cache.py - content-addressed, so they never change"""
+    if not DIGEST_RE.match(digest):
+        abort(404)
+    path = cache_path(digest)
+    if not os.path.exists(path):
+        abort(404)
+    response = send_file(path, mimetype='image/webp', max_age=CACHE_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}, immutable'
+    return response
+
+def current_facet_index():
+    """The filter index, with its pairing facet refreshed if pairings.json changed"""
+    index = facet_index
+    load_pairings()
+    if index.pairings_version != pairings_cache["stamp"]:
+        # Same lock as the pairing updates, so a rebuild never races an incremental update
+        with pairings_lock:
+            pairings_data = load_pairings()
+            if index.pairings_version != pairings_cache["stamp"]:
+                index.set_pairings(pairings_data, pairings_cache["stamp"])
+    return index
+
+def list_arg(name):
+    """Query values given as ?type=red&type=white or ?type=red,white"""
+    values = []
+    for value in request.args.getlist(name):
+        values.extend(v.strip() for v in value.split(',') if v.strip() and v.strip().lower() != 'all')
+    return values
+
+def number_arg(name, default=None):
+    """A finite float query value; ValueError naming the parameter otherwise"""
+    value = request.args.get(name)
+    if value is None or value.strip() == '':
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number") from None
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be a finite number")
+    return number
+
+def int_arg(name, default=None):
+    """An integer query value; ValueError naming the parameter otherwise"""
+    value = request.args.get(name)
+    if value is None or value.strip() == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+
 @app.route('/api/wines')
 def get_wines():
-    global wine_cache
-    if not wine_cache:
-        update_cache()
+    """Filtered, sorted slice of the wines plus facet counts
     
-    pairings_data = load_pairings()
+    Filters (any combination): type, size, store, pairing (several values allowed),
+    min_price/max_price in euros, min_score. Paging: offset, limit.
+    """
+    ensure_wine_cache()
+    index = current_facet_index()
+    
+    try:
+        min_price = number_arg('min_price')
+        max_price = number_arg('max_price')
+        min_score = number_arg('min_score')
+        offset = max(0, int_arg('offset', 0))
+        limit = int_arg('limit')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    positions, counts = index.query(
+        facets={facet: list_arg(facet) for facet in FACETS},
+        min_price=None if min_price is None else round(min_price * 100),
+        max_price=None if max_price is None else round(max_price * 100),
+        min_score=min_score,
+        sort=request.args.get('sort', 'price-low'))
+    
+    wines = wine_page(index, positions, offset, limit)
+    return jsonify({"total": len(positions), "offset": offset, "facets": counts, "wines": wines})
+
+def wine_page(index, positions, offset=0, limit=None):
+    """Copies of the wines at positions[offset:offset + limit], with their pairings merged in"""
+    page = positions[offset:] if limit is None else positions[offset:offset + max(0, limit)]
     wines = []
-    for w in wine_cache:
-        wine_copy = w.copy()
-        # Handle both old (list) and new (dict) formats just in case, though load_pairings handles migration
-        p_data = pairings_data.get(w['name'], {"pairings": [], "description": ""})
+    for i in page:
+        wine_copy = index.wines[i].copy()
+        p_data = index.pairings.get(wine_copy['name'], {"pairings": [], "description": ""})
         wine_copy['pairings'] = p_data.get('pairings', [])
         wine_copy['description'] = p_data.get('description', "")
         wines.append(wine_copy)
+    return wines
+
+@app.route('/api/top')
+def top():
+    """Best value wines: /api/top?metric=score_under_cap&max_price=10&type=red&k=10
     
-    # Filter by store if specified
-    store_filter = request.args.get('store', 'all')
-    if store_filter != 'all':
-        wines = [w for w in wines if w.get('store', '').lower() == store_filter.lower()]
-    
-    sort_by = request.args.get('sort', 'price-low')
-    
-    if sort_by == 'price-low':
-        def get_price(w):
-            try:
-                return float(str(w['price']).replace('€', '').replace(',', '.').strip())
-            except (ValueError, TypeError):
-                return 99999.0
-        wines.sort(key=get_price)
-    elif sort_by == 'price-high':
-        def get_price(w):
-            try:
-                return float(str(w['price']).replace('€', '').replace(',', '.').strip())
-            except (ValueError, TypeError):
-                return 0.0
-        wines.sort(key=get_price, reverse=True)
-    elif sort_by == 'score':
-        def get_score(w):
-            try:
-                return float(w['vivino_score'])
-            except (ValueError, TypeError):
-                return 0.0
-        wines.sort(key=get_score, reverse=True)
-        
-    return jsonify(wines)
+    metric: score_per_euro (default) or score_under_cap.
+    Facet filters as in /api/wines; group_by=store or type returns the top k per group.
+    """
+    ensure_wine_cache()
+    index = facet_index
+    
+    metric = request.args.get('metric', 'score_per_euro')
+    group_by = request.args.get('group_by') or None
+    if metric not in METRICS:
+        return jsonify({"error": f"metric must be one of {', '.join(METRICS)}"}), 400
+    if group_by not in (None, 'store', 'type', 'size'):
+        return jsonify({"error": "group_by must be store, type or size"}), 400
+    try:
+        k = int_arg('k', DEFAULT_K)
+        max_price = number_arg('max_price', 10.0)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if k < 1:
+        return jsonify({"error": "k must be a positive integer"}), 400
+    if max_price < 0:
+        return jsonify({"error": "max_price must not be negative"}), 400
+    k = min(k, MAX_K)
+    
+    result = top_wines(index, metric, {facet: list_arg(facet) for facet in ('type', 'size', 'store')},
+                       k=k, price_cap=round(max_price * 100), group_by=group_by)
+    
+    def wine_entries(ranked):
+        return [dict(index.wines[i], value=round(value, 4)) for i, value in ranked]
+    
+    response = {"metric": metric, "k": k}
+    if metric == 'score_under_cap':
+        response["max_price"] = max_price
+    if group_by:
+        response["groups"] = {group: wine_entries(ranked) for group, ranked in result.items()}
+    else:
+        response["wines"] = wine_entries(result)
+    return jsonify(response)
+
+@app.route('/api/compare/<canonical_id>')
+def compare_prices(canonical_id):
+    """All store offers for one canonical wine, cheapest first"""
+    ensure_wine_cache()
+    
+    offers = canonical_offers.get(canonical_id)
+    if not offers:
+        return jsonify({"error": "Wine not found"}), 404
+    
+    return jsonify(sorted(offers, key=lambda w: (w['price_cents'] is None, w['price_cents'] or 0)))
+
+@app.route('/api/price-history')
+def price_history():
+    """Price change points for one wine: /api/price-history?url=<wine url>"""
+    url = request.args.get('url')
+    if not url:
+        return jsonify({"error": "url is required"}), 400
+    
+    history = PriceHistory()  # SQLite connections are per thread, so one per request
+    try:
+        wine = history.history(url)
+    finally:
+        history.close()
+    if not wine:
+        return jsonify({"error": "Wine not found"}), 404
+    
+    wine['points'] = [{"scraped_at": t, "price_cents": cents, "price": None if cents is None else cents / 100}
+                      for t, cents in wine['points']]
+    return jsonify(wine)
+
+DEFAULT_DEALS = 50
+MAX_DEALS = 500  # Cap on ?limit, like MAX_K for /api/top
+
+@app.route('/api/deals')
+def deals():
+    """Wines currently priced well below their recent regular price"""
+    store = request.args.get('store')
+    try:
+        limit = int_arg('limit', DEFAULT_DEALS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    limit = min(limit, MAX_DEALS)
+    
+    history = PriceHistory()
+    try:
+        found = history.deals(store=None if store in (None, 'all') else store, limit=limit)
+    finally:
+        history.close()
+    for deal in found:
+        deal['price'] = deal['price_cents'] / 100
+        deal['regular_price'] = deal['regular_price_cents'] / 100
+    return jsonify(found)
 
 @app.route('/api/pairings', methods=['POST'])
 def update_pairing():
-    data = request.json
-    wine_name = data.get('name')
-    
-    if not wine_name:
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('name'):
         return jsonify({"error": "Invalid data"}), 400
+    error = validate_pairing_fields(data)
+    if error:
+        return jsonify({"error": error}), 400
+    wine_name = data['name']
+        
+    with pairings_lock:
+        # Change copies: the cached dict stays as it is if the write fails
+        all_pairings = dict(load_pairings())
+        index = facet_index
+        index_current = index.pairings_version == pairings_cache["stamp"]
+        
+        current_data = dict(all_pairings.get(wine_name, {"pairings": [], "description": ""}))
+        
+        # Update fields if present
+        if 'pairings' in data:
+            current_data['pairings'] = data['pairings']
+        if 'description' in data:
+            current_data['description'] = data['description']
+            
+        all_pairings[wine_name] = current_data
+        save_pairings(all_pairings)
         
-    all_pairings = load_pairings()
+        # Re-tag just this wine; an index that was already stale is rebuilt on its next use
+        if index_current:
+            index.pairings = all_pairings
+            index.update_pairings(wine_name, current_data['pairings'], pairings_cache["stamp"])
     
-    # Get existing data or initialize
-    current_data = all_pairings.get(wine_name, {"pairings": [], "description": ""})
+    return jsonify({"status": "success", "data": current_data})
+
+def validate_pairing_fields(item):
+    """Error message for a name, id, pairings or description of the wrong type, else None"""
+    for key in ('name', 'id'):
+        if item.get(key) is not None and not isinstance(item[key], str):
+            return f"{key} must be a string"
+    if 'pairings' in item and not (isinstance(item['pairings'], list)
+                                   and all(isinstance(p, str) for p in item['pairings'])):
+        return "pairings must be a list of strings"
+    if 'description' in item and not isinstance(item['description'], str):
+        return "description must be a string"
+    return None
+
+def validate_pairing_update(item):
+    """Error message for an invalid bulk item, None if it is valid"""
+    if not isinstance(item, dict):
+        return "Item must be an object"
+    if not item.get('name') and not item.get('id'):
+        return "Item needs a name or an id"
+    error = validate_pairing_fields(item)
+    if error:
+        return error
+    if 'pairings' not in item and 'description' not in item:
+        return "Nothing to update (no pairings or description)"
+    return None
+
+def pairing_names(item):
+    """Wine names an update applies to: its name, or every listing of its canonical id"""
+    if item.get('name'):
+        return [item['name']]
+    return sorted({w['name'] for w in canonical_offers.get(item['id'], [])})
+
+@app.route('/api/pairings/bulk', methods=['POST'])
+def update_pairings_bulk():
+    """Apply many pairings/description updates with a single write of pairings.json
+    
+    Body: {"updates": [{"name" or "id": ..., "pairings": [...], "description": "..."}, ...]}
+    (a bare list works too). "id" is a canonical id and updates all its store listings.
+    Invalid items are skipped and reported; the valid ones are applied together.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('updates') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return jsonify({"error": "Expected a list of updates"}), 400
+    if len(items) > MAX_BULK_PAIRINGS:
+        return jsonify({"error": f"At most {MAX_BULK_PAIRINGS} updates per request"}), 400
     
-    # Update fields if present
-    if 'pairings' in data:
-        current_data['pairings'] = data['pairings']
-    if 'description' in data:
-        current_data['description'] = data['description']
+    if any(isinstance(item, dict) and not item.get('name') and item.get('id') for item in items):
+        ensure_wine_cache()  # Canonical ids are resolved through the wine cache
+    
+    results = []
+    updated = {}
+    with pairings_lock:
+        # Change a copy: the cached dict stays as it is if the write fails
+        all_pairings = dict(load_pairings())
+        index = facet_index
+        index_current = index.pairings_version == pairings_cache["stamp"]
+        
+        for i, item in enumerate(items):
+            error = validate_pairing_update(item)
+            names = [] if error else pairing_names(item)
+            if not error and not names:
+                error = f"Unknown id: {item['id']}"
+            if error:
+                results.append({"index": i, "status": "error", "error": error})
+                continue
+            for name in names:
+                current_data = dict(all_pairings.get(name, {"pairings": [], "description": ""}))
+                if 'pairings' in item:
+                    current_data['pairings'] = item['pairings']
+                if 'description' in item:
+                    current_data['description'] = item['description']
+                all_pairings[name] = updated[name] = current_data
+            results.append({"index": i, "status": "success", "names": names})
         
-    all_pairings[wine_name] = current_data
-    save_pairings(all_pairings)
+        if updated:
+            save_pairings(all_pairings)
+            if index_current:
+                index.pairings = all_pairings
+                for name, current_data in updated.items():
+                    index.update_pairings(name, current_data['pairings'], pairings_cache["stamp"])
     
-    return jsonify({"status": "success", "data": current_data})
+    failed = sum(1 for r in results if r['status'] == 'error')
+    status = "success" if not failed else "partial" if updated else "failed"
+    return jsonify({"status": status,
+                    "applied": len(results) - failed, "failed": failed, "results": results}), \
+        400 if status == "failed" and items else 200
+
+@app.route('/api/pairings/<path:tag>')
+def wines_for_pairing(tag):
+    """Wines tagged with one pairing (e.g. /api/pairings/cheese), best score first"""
+    ensure_wine_cache()
+    index = current_facet_index()
+    limit = request.args.get('limit', type=int)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    
+    positions, _ = index.query(facets={'pairing': [tag]}, sort=request.args.get('sort', 'score'))
+    wines = wine_page(index, positions, offset, limit)
+    return jsonify({"pairing": tag, "total": len(positions), "offset": offset, "wines": wines})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# One rebuild at a time; the old cache keeps serving until update_cache swaps it
+refresh_state = {"running": False, "pending": False}
+refresh_lock = threading.Lock()
+
+def refresh_cache():
+    while True:
+        try:
+            update_cache()
+        except Exception as e:
+            print(f"Error refreshing wine cache: {e}")
+        with refresh_lock:
+            if not refresh_state["pending"]:
+                refresh_state["running"] = False
+                return
+            refresh_state["pending"] = False
 
-@app.route('/api/refresh')
+@app.route('/api/refresh', methods=['GET', 'POST'])
 def refresh():
-    thread = threading.Thread(target=update_cache)
+    with refresh_lock:
+        if refresh_state["running"]:
+            # The data may have changed after the running rebuild read it: rebuild once more
+            refresh_state["pending"] = True
+            return jsonify({"status": "queued"})
+        refresh_state["running"] = True
+    thread = threading.Thread(target=refresh_cache)
     thread.start()
     return jsonify({"status": "refreshing"})
 
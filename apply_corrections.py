@@ -1,160 +1,186 @@
+"""
+Apply Corrections
+Applies manual corrections from the problem wine CSVs to the store CSVs and to every
+copy of wines.json.
+
+Corrections are keyed by store + URL (name only for wines without a URL), so wines
+that share a name in different stores no longer overwrite each other. Every output
+is read once and rewritten in the same pass to a temporary file that replaces the
+original, and files without changes are left untouched.
+
+Usage:
+    python apply_corrections.py            # apply corrections
+    python apply_corrections.py --dry-run  # only show what would change
+"""
+import argparse
 import csv
-import os
 import json
+import os
+import sys
+from wine_schema import parse_score, parse_type
 
-# Define source files
-SOURCE_FILES = ['carrefour_wines.csv', 'ah_wines.csv', 'manual_wines.csv']
+# Source CSV -> store for rows without a store column
+SOURCE_FILES = [
+    ('carrefour_wines.csv', 'Carrefour'),
+    ('ah_wines.csv', 'Albert Heijn'),
+    ('manual_wines.csv', ''),
+]
 TYPE_CORRECTION_FILE = 'wines_with_other_type.csv'
 NO_RATING_FILE = 'wines_with_no_rating.csv'
-WINES_JSON = 'mobile_build/wines.json'
+WINES_JSON_FILES = ['static/wines.json', 'mobile_build/wines.json', 'www/static/wines.json']
+
+
+def correction_key(store, url, name):
+    """(store, url), or (store, name) for wines without a URL"""
+    url = (url or '').strip()
+    if url and url != '#':
+        return (store or '', url)
+    return (store or '', name)
+
 
 def load_corrections():
-    """Load both type and score corrections"""
+    """Load type and score corrections as (store, url) -> (name, value)"""
     type_corrections = {}
     score_corrections = {}
-    
+
     # Read corrections from wines_with_no_rating.csv
     if os.path.exists(NO_RATING_FILE):
         with open(NO_RATING_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                wine_name = row['Name']
-                
-                # Check both columns for corrections
+            for row in csv.DictReader(f):
                 # Priority: CORRECTED SCORE column, then Current Vivino Score if it's not 0
-                corrected_score = row.get('CORRECTED SCORE (write here)', '').strip()
-                current_score = row.get('Current Vivino Score', '0').strip()
-                
-                # Use corrected score if available, otherwise use current score if it's not 0
-                if corrected_score and corrected_score != '0':
-                    score_corrections[wine_name] = corrected_score
-                    print(f"  Found score correction for '{wine_name}': {corrected_score}")
-                elif current_score and current_score != '0':
-                    score_corrections[wine_name] = current_score
-                    print(f"  Found score correction for '{wine_name}': {current_score}")
-    
+                corrected_score = (row.get('CORRECTED SCORE (write here)') or '').strip()
+                current_score = (row.get('Current Vivino Score') or '0').strip()
+                score = corrected_score if parse_score(corrected_score) is not None else current_score
+                if parse_score(score) is not None:
+                    key = correction_key(row.get('Store'), row.get('URL'), row['Name'])
+                    score_corrections[key] = (row['Name'], score)
+
     # Read type corrections from wines_with_other_type.csv
     if os.path.exists(TYPE_CORRECTION_FILE):
         with open(TYPE_CORRECTION_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                name = row['Name']
-                corrected_type = row.get('CORRECTED TYPE (write here)', '').strip()
-                current_type = row.get('Current Type', '').strip()
-                
-                if corrected_type:
-                    type_corrections[name] = corrected_type
-                elif current_type and current_type.lower() != 'other':
-                    type_corrections[name] = current_type
-                    
+            for row in csv.DictReader(f):
+                corrected_type = (row.get('CORRECTED TYPE (write here)') or '').strip()
+                current_type = (row.get('Current Type') or '').strip()
+                new_type = corrected_type or (current_type if current_type.lower() != 'other' else '')
+                if new_type:
+                    key = correction_key(row.get('Store'), row.get('URL'), row['Name'])
+                    type_corrections[key] = (row['Name'], new_type)
+
     return type_corrections, score_corrections
 
-def update_csv_file(filename, type_corrections, score_corrections):
-    """Update a CSV file with corrections"""
+
+def correct_wine(wine, store, type_corrections, score_corrections, as_text=False):
+    """Apply the corrections for one wine dict in place; returns True if it changed.
+    CSV rows (as_text) get the score as text, JSON wines as a number."""
+    key = correction_key(store, wine.get('url'), wine.get('name'))
+    changed = False
+    if key in type_corrections and wine.get('type') != parse_type(type_corrections[key][1]):
+        wine['type'] = parse_type(type_corrections[key][1])
+        changed = True
+    if key in score_corrections and parse_score(wine.get('vivino_score')) != parse_score(score_corrections[key][1]):
+        score = parse_score(score_corrections[key][1])
+        wine['vivino_score'] = str(score) if as_text else score
+        changed = True
+    return changed
+
+
+def print_diff(filename, changes):
+    """Unified-style diff of the changed rows"""
+    print(f"--- {filename}")
+    print(f"+++ {filename} (corrected)")
+    for line_no, old, new in changes:
+        print(f"@@ {line_no} @@")
+        print(f"-{old}")
+        print(f"+{new}")
+
+
+def update_csv_file(filename, default_store, type_corrections, score_corrections, dry_run=False):
+    """Stream a source CSV through the corrections in one pass; returns the number of changed rows"""
     if not os.path.exists(filename):
         return 0
-        
-    updated_rows = []
-    updates_count = 0
-    header = []
-    
-    with open(filename, 'r', encoding='utf-8', newline='') as f:
-        reader = csv.reader(f)
-        try:
-            header = next(reader)
-        except StopIteration:
-            return 0
-            
-        # Find column indices
-        try:
-            name_idx = header.index('name')
-            type_idx = header.index('type')
-            score_idx = header.index('vivino_score')
-        except ValueError as e:
-            print(f"⚠️ Could not find required column in {filename}: {e}")
+
+    tmp_file = filename + '.tmp'
+    changes = []
+    with open(filename, 'r', encoding='utf-8', newline='') as src, \
+            open(os.devnull if dry_run else tmp_file, 'w', encoding='utf-8', newline='') as dst:
+        reader = csv.DictReader(src)
+        if not reader.fieldnames or not {'name', 'type', 'vivino_score'} <= set(reader.fieldnames):
+            print(f"⚠️ Could not find required columns in {filename}")
+            dst.close()
+            if not dry_run:
+                os.remove(tmp_file)
             return 0
-            
-        updated_rows.append(header)
-        
+        writer = csv.DictWriter(dst, fieldnames=reader.fieldnames, lineterminator='\n')
+        writer.writeheader()
         for row in reader:
-            if len(row) <= max(name_idx, type_idx, score_idx):
-                updated_rows.append(row)
-                continue
-                
-            name = row[name_idx]
-            
-            # Apply type correction
-            if name in type_corrections:
-                new_type = type_corrections[name]
-                if row[type_idx] != new_type:
-                    row[type_idx] = new_type
-                    updates_count += 1
-                    print(f"    Updated type for '{name}': {new_type}")
-            
-            # Apply score correction
-            if name in score_corrections:
-                new_score = score_corrections[name]
-                if row[score_idx] != new_score:
-                    row[score_idx] = new_score
-                    updates_count += 1
-                    print(f"    Updated score for '{name}': {new_score}")
-            
-            updated_rows.append(row)
-            
-    if updates_count > 0:
-        with open(filename, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerows(updated_rows)
-            
-    return updates_count
-
-def update_wines_json(score_corrections):
-    """Update wines.json with score corrections"""
-    if not os.path.exists(WINES_JSON):
-        print(f"⚠️ {WINES_JSON} not found")
+            old = dict(row)
+            if correct_wine(row, row.get('store') or default_store, type_corrections, score_corrections, as_text=True):
+                changes.append((f"line {reader.line_num}", ','.join(old.values()), ','.join(row.values())))
+            writer.writerow(row)
+
+    if dry_run:
+        if changes:
+            print_diff(filename, changes)
+    elif changes:
+        os.replace(tmp_file, filename)
+    else:
+        os.remove(tmp_file)
+    return len(changes)
+
+
+def update_wines_json(filename, type_corrections, score_corrections, dry_run=False):
+    """Patch one copy of wines.json and replace it atomically; returns the number of changed wines"""
+    if not os.path.exists(filename):
+        print(f"⚠️ {filename} not found")
         return 0
-    
-    with open(WINES_JSON, 'r', encoding='utf-8') as f:
+
+    with open(filename, 'r', encoding='utf-8') as f:
         wines_data = json.load(f)
-    
-    updates_count = 0
-    for wine in wines_data:
-        name = wine.get('name')
-        if name in score_corrections:
-            new_score = score_corrections[name]
-            old_score = wine.get('vivino_score', 'N/A')
-            if str(old_score) != str(new_score):
-                wine['vivino_score'] = new_score
-                updates_count += 1
-                print(f"    Updated JSON for '{name}': {old_score} -> {new_score}")
-    
-    if updates_count > 0:
-        with open(WINES_JSON, 'w', encoding='utf-8') as f:
+
+    changes = []
+    for i, wine in enumerate(wines_data):
+        old = json.dumps(wine, ensure_ascii=False)
+        if correct_wine(wine, wine.get('store'), type_corrections, score_corrections):
+            changes.append((f"wine {i}", old, json.dumps(wine, ensure_ascii=False)))
+
+    if dry_run:
+        if changes:
+            print_diff(filename, changes)
+    elif changes:
+        tmp_file = filename + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
             json.dump(wines_data, f, indent=2, ensure_ascii=False)
-    
-    return updates_count
+        os.replace(tmp_file, filename)
+    return len(changes)
+
 
 def main():
-    print("🔄 Loading corrections...")
+    parser = argparse.ArgumentParser(description="Apply manual corrections to the wine data")
+    parser.add_argument('--dry-run', action='store_true', help="print a diff instead of writing files")
+    args = parser.parse_args()
+
+    out = sys.stderr if args.dry_run else sys.stdout  # Keep stdout a clean diff in dry-run mode
+    print("🔄 Loading corrections...", file=out)
     type_corrections, score_corrections = load_corrections()
-    print(f"\nFound {len(type_corrections)} type corrections and {len(score_corrections)} score corrections.\n")
-    
+    print(f"Found {len(type_corrections)} type corrections and {len(score_corrections)} score corrections.\n",
+          file=out)
+
     total_updates = 0
-    
-    # Update source CSV files
-    for filename in SOURCE_FILES:
-        print(f"Processing {filename}...")
-        count = update_csv_file(filename, type_corrections, score_corrections)
-        print(f"  -> Updated {count} wines")
+    for filename, default_store in SOURCE_FILES:
+        count = update_csv_file(filename, default_store, type_corrections, score_corrections, args.dry_run)
+        print(f"  {filename}: {count} wines {'to update' if args.dry_run else 'updated'}", file=out)
         total_updates += count
-    
-    # Update wines.json
-    print(f"\nUpdating {WINES_JSON}...")
-    json_updates = update_wines_json(score_corrections)
-    print(f"  -> Updated {json_updates} wines in JSON")
-    total_updates += json_updates
-        
-    print(f"\n✅ Total updates applied: {total_updates}")
+
+    for filename in WINES_JSON_FILES:
+        count = update_wines_json(filename, type_corrections, score_corrections, args.dry_run)
+        print(f"  {filename}: {count} wines {'to update' if args.dry_run else 'updated'}", file=out)
+        total_updates += count
+
+    if args.dry_run:
+        print(f"\nDry run: {total_updates} updates, nothing written", file=out)
+    else:
+        print(f"\n✅ Total updates applied: {total_updates}")
+
 
 if __name__ == "__main__":
     main()
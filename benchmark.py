@@ -0,0 +1,293 @@
+"""
+Benchmark Suite
+Times the API hot paths and the data pipeline on synthetic catalogs of 1k, 10k and
+100k wines. The catalogs are built from rows of the real store CSVs, with the same
+columns and value formats, and get unique names, URLs and prices.
+
+Measured per catalog size:
+  load_wines_from_csv     - app startup load of the store CSVs
+  api_wines[store,sort]   - GET /api/wines for every store filter and sort order
+  wine_detail             - GET /wine/<name>
+  post_pairings           - concurrent POST /api/pairings (8 threads)
+  generate_wines_json     - CSVs -> static/wines.json
+  apply_corrections       - correction CSVs -> store CSVs and wines.json
+  classify                - wine type and size classifier over every name
+  match                   - fuzzy matcher index build + matching a sample of names
+
+Every run goes in a temporary directory (the real data files are never touched) and
+writes benchmark_results.json. With a baseline, any benchmark whose median is more than
+REGRESSION_TOLERANCE slower is flagged and the exit code is 1.
+
+Usage:
+    python benchmark.py                        # all sizes, compare with benchmark_baseline.json
+    python benchmark.py --sizes 1000 10000     # only some sizes
+    python benchmark.py --save-baseline        # store this run as the new baseline
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(REPO_DIR, 'benchmark_results.json')
+BASELINE_FILE = os.path.join(REPO_DIR, 'benchmark_baseline.json')
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+REPEAT = 3  # Median of REPEAT runs; fewer for the largest catalog (see repeats_for)
+REGRESSION_TOLERANCE = 0.25  # Flag benchmarks more than 25% slower than the baseline
+SEED = 42
+
+STORE_SOURCES = [('carrefour_wines.csv', 'Carrefour'), ('ah_wines.csv', 'Albert Heijn')]
+API_STORES = ['all', 'carrefour', 'albert heijn']
+API_SORTS = ['price-low', 'price-high', 'score']
+DETAIL_REQUESTS = 20
+PAIRING_THREADS = 8
+PAIRING_REQUESTS = 200
+MATCH_SAMPLE = 200
+CORRECTION_ROWS = 100
+
+
+def size_label(n):
+    return f"{n // 1000}k" if n >= 1000 else str(n)
+
+
+def repeats_for(n, repeat):
+    return 1 if n >= 100000 else repeat
+
+
+# --- Synthetic catalogs ---
+
+def load_templates():
+    """Real store rows per store, as text exactly as they are in the CSVs"""
+    templates = {}
+    for csv_file, store in STORE_SOURCES:
+        df = pd.read_csv(os.path.join(REPO_DIR, csv_file), dtype=str, keep_default_na=False)
+        templates[csv_file] = df
+    return templates
+
+
+def make_catalog(n, templates, out_dir, seed=SEED):
+    """Write n synthetic wines split over the store CSVs in out_dir; returns their names"""
+    rng = random.Random(seed)
+    names = []
+    per_store = [n // len(STORE_SOURCES)] * len(STORE_SOURCES)
+    per_store[0] += n - sum(per_store)
+    for (csv_file, store), count in zip(STORE_SOURCES, per_store):
+        df = templates[csv_file]
+        rows = df.sample(n=count, replace=True, random_state=rng.randrange(2 ** 31)).to_dict('records')
+        for i, row in enumerate(rows):
+            # Unique names and URLs; keep the real formats (vintage, volume in the name)
+            row['name'] = f"{row['name']} {rng.choice(['Reserva', 'Cuvée', 'Selection', 'Classic'])} {i}"
+            row['url'] = f"{row['url'].rsplit('.', 1)[0]}-{i}.html" if row['url'] else ''
+            if rng.random() < 0.95:
+                row['price'] = f"{rng.uniform(2.5, 60):.2f}"
+            if rng.random() < 0.8:
+                row['vivino_score'] = f"{rng.uniform(2.8, 4.6):.1f}"
+            names.append(row['name'])
+        pd.DataFrame(rows, columns=df.columns).to_csv(os.path.join(out_dir, csv_file), index=False)
+    os.makedirs(os.path.join(out_dir, 'static'), exist_ok=True)
+    return names
+
+
+def make_corrections(out_dir, seed=SEED):
+    """Correction CSVs for CORRECTION_ROWS wines of the synthetic catalog"""
+    rng = random.Random(seed)
+    wines = []
+    for csv_file, store in STORE_SOURCES:
+        df = pd.read_csv(os.path.join(out_dir, csv_file), dtype=str, keep_default_na=False)
+        wines.extend((store, row) for row in df.to_dict('records'))
+    picked = rng.sample(wines, min(CORRECTION_ROWS, len(wines)))
+    half = len(picked) // 2
+    pd.DataFrame([{
+        'Name': w['name'], 'Type': w['type'], 'Store': store, 'Price': w['price'],
+        'Current Vivino Score': '0', 'CORRECTED SCORE (write here)': f"{rng.uniform(3, 4.5):.1f}", 'URL': w['url'],
+    } for store, w in picked[:half]]).to_csv(os.path.join(out_dir, 'wines_with_no_rating.csv'), index=False)
+    pd.DataFrame([{
+        'Name': w['name'], 'Store': store, 'Price': w['price'], 'Current Type': 'Other',
+        'CORRECTED TYPE (write here)': rng.choice(['Red', 'White', 'Rosé']), 'Vivino Score': w['vivino_score'],
+        'URL': w['url'],
+    } for store, w in picked[half:]]).to_csv(os.path.join(out_dir, 'wines_with_other_type.csv'), index=False)
+
+
+# --- Timing ---
+
+def measure(fn, repeat, setup=None):
+    """Run fn repeat times (setup before each run, not timed); returns timings in ms"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):  # The pipeline scripts print progress
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(statistics.median(timings), 3), 'min_ms': round(min(timings), 3), 'runs': repeat}
+
+
+def post_pairings(app, names):
+    """PAIRING_REQUESTS pairing updates spread over PAIRING_THREADS concurrent clients"""
+    def worker(batch):
+        client = app.test_client()
+        for name in batch:
+            response = client.post('/api/pairings', json={'name': name, 'pairings': ['cheese'], 'description': 'x'})
+            assert response.status_code == 200
+    batches = [names[i::PAIRING_THREADS] for i in range(PAIRING_THREADS)]
+    with ThreadPoolExecutor(max_workers=PAIRING_THREADS) as pool:
+        list(pool.map(worker, batches))
+
+
+def run_size(n, templates, repeat):
+    """All benchmarks for one catalog size; returns {benchmark: timing}"""
+    import app as wine_app
+    import apply_corrections
+    import generate_wines_json
+    from wine_classifier import WineClassifier
+    from wine_matcher import WineMatcher
+
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix=f'winevino_bench_{size_label(n)}_')
+    old_cwd = os.getcwd()
+    try:
+        names = make_catalog(n, templates, work_dir)
+        os.chdir(work_dir)  # The app and scripts use paths relative to the working directory
+        rng = random.Random(SEED)
+        repeat = repeats_for(n, repeat)
+        print(f"\n📦 {size_label(n)} wines ({repeat} runs each)")
+
+        def record(name, timing):
+            results[name] = timing
+            print(f"  {name:<40} {timing['median_ms']:>10.1f} ms")
+
+        record('load_wines_from_csv', measure(wine_app.load_wines_from_csv, repeat))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            wine_app.update_cache()
+        client = wine_app.app.test_client()
+        for store in API_STORES:
+            for sort in API_SORTS:
+                record(f'api_wines[{store},{sort}]',
+                       measure(lambda: client.get('/api/wines', query_string={'store': store, 'sort': sort}), repeat))
+
+        detail_names = rng.sample([w['name'] for w in wine_app.wine_cache], DETAIL_REQUESTS)
+        timing = measure(lambda: [client.get(f'/wine/{name}') for name in detail_names], repeat)
+        timing['per_request_ms'] = round(timing['median_ms'] / DETAIL_REQUESTS, 3)
+        record('wine_detail', timing)
+
+        pairing_names = rng.sample(names, PAIRING_REQUESTS)
+        timing = measure(lambda: post_pairings(wine_app.app, pairing_names), repeat,
+                         setup=lambda: os.path.exists('pairings.json') and os.remove('pairings.json'))
+        timing['per_request_ms'] = round(timing['median_ms'] / PAIRING_REQUESTS, 3)
+        record('post_pairings', timing)
+
+        record('generate_wines_json', measure(generate_wines_json.generate_json, repeat))
+
+        # Restore the uncorrected data before each run so every run applies the same changes
+        pristine = {f: open(f, 'rb').read() for f, _ in STORE_SOURCES + [('static/wines.json', None)]}
+
+        def reset_data():
+            for path, data in pristine.items():
+                with open(path, 'wb') as f:
+                    f.write(data)
+
+        def correct():
+            type_corrections, score_corrections = apply_corrections.load_corrections()
+            for filename, default_store in apply_corrections.SOURCE_FILES:
+                apply_corrections.update_csv_file(filename, default_store, type_corrections, score_corrections)
+            apply_corrections.update_wines_json('static/wines.json', type_corrections, score_corrections)
+
+        make_corrections(work_dir)
+        record('apply_corrections', measure(correct, repeat, setup=reset_data))
+
+        classifier = WineClassifier()
+        frame = pd.DataFrame({'name': names})
+        record('classify', measure(lambda: classifier.classify_frame(frame), repeat))
+
+        sample = rng.sample(names, MATCH_SAMPLE)
+        record('match', measure(lambda: WineMatcher(names).match_many(sample), repeat))
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        wine_app.wine_cache = []
+    return results
+
+
+# --- Results and baseline ---
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Benchmarks whose median is more than tolerance slower than the baseline"""
+    regressions = []
+    for size, benchmarks in results.items():
+        for name, timing in benchmarks.items():
+            base = baseline.get(size, {}).get(name)
+            if not base or not base['median_ms']:
+                continue
+            ratio = timing['median_ms'] / base['median_ms']
+            if ratio > 1 + tolerance:
+                regressions.append((size, name, base['median_ms'], timing['median_ms'], ratio))
+    return regressions
+
+
+def save_json(data, path):
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_file, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API and data pipeline on synthetic catalogs")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="catalog sizes (wines)")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="runs per benchmark (median is reported)")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline file to compare with")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help="allowed slowdown before a regression is flagged (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("WINEVINO BENCHMARK")
+    print("=" * 60)
+    templates = load_templates()
+    results = {size_label(n): run_size(n, templates, args.repeat) for n in args.sizes}
+
+    run = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    save_json(run, RESULTS_FILE)
+    print(f"\n✓ Results saved to {RESULTS_FILE}")
+
+    if args.save_baseline:
+        save_json(run, args.baseline)
+        print(f"✓ Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠️ No baseline at {args.baseline} (run with --save-baseline to create one)")
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline['results'], args.tolerance)
+    if not regressions:
+        print(f"✅ No regressions against the baseline from {baseline['generated_at']}")
+        return
+    print(f"❌ {len(regressions)} regressions against the baseline from {baseline['generated_at']}:")
+    for size, name, before, after, ratio in regressions:
+        print(f"  {size} {name}: {before:.1f} ms → {after:.1f} ms ({ratio:.2f}x)")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
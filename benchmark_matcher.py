@@ -0,0 +1,147 @@
+"""
+Matcher Benchmark
+Compares the old difflib candidate selection with wine_matcher on:
+  - accuracy against the held-out labelled pairs in matcher_labels.csv
+  - speed of matching every store wine name against all other store wines
+
+matcher_labels.csv is split per store name: MATCH_THRESHOLD is tuned on the 'tune' rows
+only (--tune prints the threshold they support), and accuracy is reported on the
+'holdout' rows, which the threshold has never seen.
+
+Usage:
+    python benchmark_matcher.py          # held-out accuracy and speed
+    python benchmark_matcher.py --tune   # sweep thresholds on the tuning split
+"""
+import argparse
+import csv
+import difflib
+import re
+import time
+from collections import defaultdict
+import pandas as pd
+from wine_matcher import WineMatcher, rank_candidates, MATCH_THRESHOLD
+
+LABELS_FILE = 'matcher_labels.csv'
+DIFFLIB_THRESHOLD = 0.4
+TUNE_THRESHOLDS = [t / 100 for t in range(20, 91)]  # Candidate values for MATCH_THRESHOLD
+
+
+def difflib_clean(name):
+    """The cleaning VivinoScraper used before wine_matcher"""
+    name = re.sub(r'\b(75cl|750ml|1L|1\.5L|3L|Bag in Box|Bib)\b', '', name, flags=re.IGNORECASE)
+    name = re.sub(r'\b\d+(\.\d+)?%\s*alc\b', '', name, flags=re.IGNORECASE)
+    return re.sub(r'\s+', ' ', name).strip()
+
+
+def difflib_pick(name, candidates):
+    """Old selection logic: best SequenceMatcher ratio over 0.4, wrong years skipped"""
+    clean_name = difflib_clean(name)
+    target_year = re.search(r'\b(19|20)\d{2}\b', name)
+    best, highest = None, 0.0
+    for i, cand in enumerate(candidates):
+        ratio = difflib.SequenceMatcher(None, clean_name.lower(), cand.lower()).ratio()
+        result_year = re.search(r'\b(19|20)\d{2}\b', cand)
+        if target_year and result_year and target_year.group(0) != result_year.group(0):
+            continue
+        if ratio > highest:
+            best, highest = i, ratio
+    return best if highest > DIFFLIB_THRESHOLD else None
+
+
+def matcher_pick(name, candidates, threshold=MATCH_THRESHOLD):
+    ranked = rank_candidates(name, candidates)
+    if ranked and ranked[0][1] >= threshold:
+        return ranked[0][0]
+    return None
+
+
+def load_labels(split):
+    """store name -> [(candidate, is_match)] for one split ('tune' or 'holdout')"""
+    groups = defaultdict(list)
+    with open(LABELS_FILE, encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row['split'] == split:
+                groups[row['store_name']].append((row['candidate'], row['label'] == '1'))
+    return groups
+
+
+def accuracy(pick, groups):
+    correct = 0
+    for name, cands in groups.items():
+        idx = pick(name, [c for c, _ in cands])
+        if idx is not None and cands[idx][1]:
+            correct += 1
+    return correct / len(groups)
+
+
+def tune_threshold(groups):
+    """(threshold, accuracy): the middle of the widest run of thresholds with the best accuracy"""
+    scores = [(t, accuracy(lambda name, cands: matcher_pick(name, cands, t), groups)) for t in TUNE_THRESHOLDS]
+    best = max(acc for _, acc in scores)
+    runs, run = [], []
+    for t, acc in scores:
+        if acc == best:
+            run.append(t)
+        elif run:
+            runs.append(run)
+            run = []
+    if run:
+        runs.append(run)
+    widest = max(runs, key=len)
+    return round((widest[0] + widest[-1]) / 2, 2), best
+
+
+def load_store_names():
+    names = []
+    for csv_file in ['carrefour_wines.csv', 'ah_wines.csv']:
+        names.extend(pd.read_csv(csv_file)['name'].dropna().astype(str).tolist())
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Vivino result matcher")
+    parser.add_argument('--tune', action='store_true',
+                        help="sweep MATCH_THRESHOLD on the tuning split instead of benchmarking")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("MATCHER BENCHMARK")
+    print("=" * 60)
+
+    if args.tune:
+        groups = load_labels('tune')
+        threshold, best = tune_threshold(groups)
+        print(f"\nTuning split: {len(groups)} labelled wines ({LABELS_FILE})")
+        print(f"  best accuracy {best:.1%}, centred at threshold {threshold:.2f} "
+              f"(MATCH_THRESHOLD is {MATCH_THRESHOLD:.2f})")
+        return
+
+    groups = load_labels('holdout')
+    print(f"\nAccuracy on {len(groups)} held-out labelled wines ({LABELS_FILE}):")
+    print(f"  difflib:      {accuracy(difflib_pick, groups):.1%}")
+    print(f"  wine_matcher: {accuracy(matcher_pick, groups):.1%}")
+
+    names = load_store_names()
+    sample = names[:100]
+    print(f"\nSpeed: matching store names against {len(names)} candidates")
+
+    start = time.perf_counter()
+    for name in sample:
+        difflib_pick(name, names)
+    difflib_per_query = (time.perf_counter() - start) / len(sample)
+
+    start = time.perf_counter()
+    matcher = WineMatcher(names)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    matcher.match_many(names)
+    matcher_per_query = (time.perf_counter() - start) / len(names)
+
+    print(f"  difflib:      {difflib_per_query * 1000:.2f} ms/query (sampled {len(sample)} queries)")
+    print(f"  wine_matcher: {matcher_per_query * 1000:.3f} ms/query ({len(names)} queries, "
+          f"index built in {build_time * 1000:.0f} ms)")
+    print(f"  speedup:      {difflib_per_query / matcher_per_query:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
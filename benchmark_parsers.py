@@ -0,0 +1,114 @@
+"""
+Parser Benchmark
+Times the scrapers' extraction code on the recorded fixtures (scraper_fixtures.py), for
+every BeautifulSoup backend that is installed:
+
+  carrefour, ah   parse_products() of cf_scraper / ah_scraper
+  vivino          VivinoScraper.parse_results()
+  vivino_api      json.loads + VivinoAPIScraper.parse_matches() (no HTML backend)
+
+Reported per scraper and backend: pages/s, items/s and MB/s (best of --repeat runs),
+plus whether the backend extracts exactly the same items as the default (HTML_PARSER).
+
+Usage:
+    python benchmark_parsers.py                    # all fixtures
+    python benchmark_parsers.py --kind vivino --repeat 10
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+from bs4 import BeautifulSoup, FeatureNotFound
+from scraper_debug import HTML_PARSER
+from scraper_fixtures import FixtureStore, FIXTURES_DIR, KINDS
+
+BACKENDS = ('lxml', 'html.parser', 'html5lib')
+
+
+def available_backends():
+    backends = []
+    for backend in BACKENDS:
+        try:
+            BeautifulSoup('<p></p>', backend)
+            backends.append(backend)
+        except FeatureNotFound:
+            pass
+    return backends
+
+
+def extractor(kind, parser):
+    """Function page text -> extracted items, for one scraper and parser backend"""
+    if kind == 'carrefour':
+        from cf_scraper import parse_products
+        return lambda page: parse_products(page, parser=parser)[1]
+    if kind == 'ah':
+        from ah_scraper import parse_products
+        return lambda page: parse_products(page, parser=parser)[1]
+    if kind == 'vivino':
+        from vivino_scraper import VivinoScraper
+        scraper = VivinoScraper(debug_capture=False)
+        return lambda page: scraper.parse_results(page, parser=parser)[1]
+    if kind == 'vivino_api':
+        from vivino_api_scraper import VivinoAPIScraper
+        scraper = VivinoAPIScraper()
+        return lambda page: scraper.parse_matches(json.loads(page)) or []
+    raise ValueError(f"Unknown fixture kind: {kind}")
+
+
+def measure(extract, pages, repeat):
+    """(best time for all pages in seconds, items extracted per page)"""
+    best = None
+    items = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):  # Parsers log skipped results
+            start = time.perf_counter()
+            items = [extract(page) for page in pages]
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper parsers on recorded fixtures")
+    parser.add_argument('--kind', choices=KINDS, help="Only fixtures of this scraper")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per backend (best is reported)")
+    parser.add_argument('--dir', default=FIXTURES_DIR, help="Fixture directory")
+    args = parser.parse_args()
+
+    store = FixtureStore(args.dir)
+    backends = available_backends()
+    print("=" * 72)
+    print("PARSER BENCHMARK")
+    print("=" * 72)
+    print(f"Backends: {', '.join(backends)} (default: {HTML_PARSER})")
+
+    found = False
+    for kind in ([args.kind] if args.kind else KINDS):
+        entries = store.entries(kind)
+        if not entries:
+            continue
+        found = True
+        pages = [store.load(e) for e in entries]
+        megabytes = sum(e['bytes'] for e in entries) / 1e6
+        print(f"\n{kind}: {len(pages)} fixtures, {megabytes:.1f} MB")
+
+        kind_backends = ['json'] if kind == 'vivino_api' else [HTML_PARSER] + [b for b in backends if b != HTML_PARSER]
+        reference = None
+        for backend in kind_backends:
+            seconds, items = measure(extractor(kind, None if backend == 'json' else backend), pages, args.repeat)
+            items = json.loads(json.dumps(items, ensure_ascii=False))  # Tuples and lists compare equal
+            if reference is None:
+                reference = items
+            count = sum(len(page_items) for page_items in items)
+            same = '' if items is reference else ('  ✓ same items' if items == reference else '  ❌ different items')
+            print(f"  {backend:<12} {len(pages) / seconds:>9.1f} pages/s {count / seconds:>10.0f} items/s "
+                  f"{megabytes / seconds:>7.1f} MB/s  ({count} items){same}")
+
+    if not found:
+        print("\nNo fixtures recorded yet. Record some first:")
+        print("    WINEVINO_RECORD_FIXTURES=1 python export_pipeline.py")
+
+
+if __name__ == "__main__":
+    main()
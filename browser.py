@@ -0,0 +1,333 @@
+"""
+Browser - lean Chrome sessions for the Selenium scrapers
+All scrapers start Chrome through start_browser(site), which sets up:
+
+  headless      new headless mode, on by default (SITES[site]['headless']); a visible window
+                needs a display, so without one (Linux server) the browser is always headless
+  page loads    'eager': driver.get() returns once the DOM is ready, without waiting for
+                images, iframes and trackers
+  blocking      images, fonts, media and analytics are blocked through DevTools
+                (Network.setBlockedURLs); the categories are set per site (SITES[site]['block'])
+
+The scrapers read product data from the DOM (image URLs come from src attributes), so
+nothing they extract needs the blocked resources.
+
+If a headless browser gets a bot challenge instead of the page, open_site() retries with
+a visible window when there is a display to show it on.
+
+Every site has its own persistent Chrome profile in browser_profiles/<site>/, so cookies,
+consent choices and passed bot checks carry over from one run (and one script) to the
+next. session.json next to the profile records which cookies the cookie banner set:
+when they are all still there, has_consent() is True and the scraper skips the banner.
+Consent older than SESSION_MAX_AGE_DAYS is given again, and a profile that still gets a
+bot check has its cookies cleared. A profile is used by one browser at a time; a second
+browser for the same site (another script running) gets a temporary profile.
+
+Environment:
+  WINEVINO_HEADLESS=0          visible browser for every site (=1: headless for every site)
+  WINEVINO_BLOCK_RESOURCES=0   load everything
+  WINEVINO_BROWSER_PROFILES=0  fresh temporary profile for every browser
+
+Usage:
+    driver = open_site('carrefour', url, telemetry)   # started, first page loaded
+    if not has_consent(driver, 'carrefour'):
+        before = cookie_names(driver)
+        ...                                           # accept the cookie banner
+        save_consent(driver, 'carrefour', before)
+    count = wait_for_count(driver, By.TAG_NAME, 'article', more_than=30)
+    close_browser(driver)
+
+    driver = start_browser('vivino')
+"""
+import json
+import os
+import sys
+import time
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+import undetected_chromedriver as uc
+from selenium.webdriver.support.ui import WebDriverWait
+from run_telemetry import RunTelemetry
+
+HEADLESS = os.environ.get('WINEVINO_HEADLESS', '')  # '' = per site, '0' = visible, '1' = headless
+BLOCK_RESOURCES = os.environ.get('WINEVINO_BLOCK_RESOURCES', '') != '0'
+WINDOW_SIZE = '1920,1080'  # Desktop layout in headless mode (the scrapers click desktop buttons)
+LOAD_MORE_TIMEOUT = 10  # Seconds to wait for a "load more" click to add products
+CHALLENGE_WAIT = 15  # Seconds a bot check gets to pass on its own
+
+# URL patterns per resource category, for Network.setBlockedURLs
+BLOCK_PATTERNS = {
+    'images': ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+               '*.jpg?*', '*.jpeg?*', '*.png?*', '*.gif?*', '*.webp?*', '*.avif?*', '*.svg?*'],
+    'fonts': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot', '*.woff?*', '*.woff2?*', '*fonts.googleapis.com*',
+              '*fonts.gstatic.com*', '*use.typekit.net*'],
+    'media': ['*.mp4', '*.webm', '*.mp3', '*.m3u8', '*youtube.com/embed*', '*player.vimeo.com*'],
+    'analytics': ['*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+                  '*googlesyndication.com*', '*connect.facebook.net*', '*facebook.com/tr*', '*hotjar.com*',
+                  '*bat.bing.com*', '*criteo.com*', '*criteo.net*', '*adnxs.com*', '*tiktok.com*',
+                  '*pinterest.com*', '*snapchat.com*', '*clarity.ms*', '*nr-data.net*', '*newrelic.com*',
+                  '*sentry.io*', '*optimizely.com*', '*dynatrace.com*', '*contentsquare.net*'],
+}
+BLOCK_ALL = tuple(BLOCK_PATTERNS)
+
+# Per site: headless by default and the resource categories to block. The scrapers only
+# read the DOM, so no site needs an exception; drop a category here if one ever does.
+SITES = {
+    'carrefour': {'headless': True, 'block': BLOCK_ALL},
+    'ah': {'headless': True, 'block': BLOCK_ALL},
+    'vivino': {'headless': True, 'block': BLOCK_ALL},
+}
+
+PROFILE_DIR = 'browser_profiles'
+SESSION_FILE = 'session.json'
+LOCK_FILE = 'winevino.lock'
+_profile_locks = {}  # site -> open lock file, held until unlock_profile
+PERSISTENT_PROFILES = os.environ.get('WINEVINO_BROWSER_PROFILES', '') != '0'
+SESSION_MAX_AGE_DAYS = 30  # Accept the cookie banner again after this long (banners change)
+
+# Page titles of bot checks that a headless browser may get instead of the site
+CHALLENGE_TITLES = ('just a moment', 'attention required', 'access denied', 'are you a robot')
+
+
+def has_display():
+    """A visible window can be shown (always on Windows/macOS, needs X/Wayland on Linux)"""
+    if not sys.platform.startswith('linux'):
+        return True
+    return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+
+def use_headless(site, headless=None):
+    if headless is None:
+        headless = SITES[site]['headless'] if HEADLESS == '' else HEADLESS != '0'
+    if not headless and not has_display():
+        print(f"⚠️ No display for a visible {site} browser, running headless")
+        headless = True
+    return headless
+
+
+def blocked_urls(site):
+    """URL patterns to block for a site"""
+    return [p for category in SITES[site]['block'] for p in BLOCK_PATTERNS[category]]
+
+
+# --- Profiles and sessions ---
+
+def profile_dir(site):
+    return os.path.abspath(os.path.join(PROFILE_DIR, site))
+
+
+def lock_profile(site):
+    """Claim a site's profile for this process; False if another browser holds it
+
+    The claim is an OS lock on the lock file (flock, or msvcrt.locking on Windows), so it
+    ends with the process that held it and a crashed run never leaves a stale claim.
+    """
+    os.makedirs(profile_dir(site), exist_ok=True)
+    f = open(os.path.join(profile_dir(site), LOCK_FILE), 'a+')
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return False  # Held by another browser (possibly this process's, for the same site)
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))  # For whoever looks at the file; the lock is what counts
+    f.flush()
+    _profile_locks[site] = f
+    return True
+
+
+def unlock_profile(site):
+    f = _profile_locks.pop(site, None)
+    if f is None:
+        return
+    # The file stays: removing it would let a new file be locked while the old one still is
+    if not fcntl:
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+    f.close()
+
+
+def load_session(site):
+    try:
+        with open(os.path.join(profile_dir(site), SESSION_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_session(site, session):
+    path = os.path.join(profile_dir(site), SESSION_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(session, f, indent=1)
+    os.replace(tmp_file, path)
+
+
+def cookie_names(driver):
+    """Names of the cookies of the current page's site"""
+    try:
+        return {c['name'] for c in driver.get_cookies()}
+    except Exception:
+        return set()
+
+
+def has_consent(driver, site):
+    """True if the saved session already accepted the site's cookie banner and the
+    cookies that records it are still in the profile"""
+    if not getattr(driver, 'profile_site', None):
+        return False  # Temporary profile: nothing was saved
+    session = load_session(site)
+    markers = session.get('consent_cookies')
+    if not markers or time.time() - session.get('consent_at', 0) > SESSION_MAX_AGE_DAYS * 24 * 60 * 60:
+        return False
+    return set(markers) <= cookie_names(driver)
+
+
+def save_consent(driver, site, before):
+    """Remember the cookies the cookie banner set (present now, not in before)"""
+    if not getattr(driver, 'profile_site', None):
+        return
+    markers = sorted(cookie_names(driver) - set(before))
+    session = load_session(site)
+    if markers:
+        session.update(consent_cookies=markers, consent_at=time.time())
+    elif not has_consent(driver, site):
+        session.pop('consent_cookies', None)  # Consent is not recorded in cookies we can check
+    save_session(site, session)
+
+
+def forget_session(driver, site):
+    """Clear a profile's cookies (after a bot check it did not pass) and its saved consent"""
+    try:
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+    except Exception as e:
+        print(f"⚠️ Could not clear the {site} cookies: {e}")
+    session = load_session(site)
+    session.pop('consent_cookies', None)
+    save_session(site, session)
+
+
+# --- Browsers ---
+
+def start_browser(site, headless=None, telemetry=None, profile=PERSISTENT_PROFILES):
+    """Start a Chrome session set up for one site (a key of SITES), with the site's
+    persistent profile unless profile is False or another browser is using it"""
+    headless = use_headless(site, headless)
+    if profile and not lock_profile(site):
+        print(f"⚠️ The {site} browser profile is in use by another process, using a temporary profile")
+        profile = False
+    options = uc.ChromeOptions()
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.page_load_strategy = 'eager'
+    if headless:
+        options.add_argument('--disable-gpu')
+        options.add_argument(f'--window-size={WINDOW_SIZE}')
+    blocked = blocked_urls(site) if BLOCK_RESOURCES else []
+    if set(BLOCK_PATTERNS['images']) <= set(blocked):
+        # Also covers images whose URLs have no extension (resized product images)
+        options.add_argument('--blink-settings=imagesEnabled=false')
+
+    try:
+        driver = uc.Chrome(options=options, headless=headless,
+                           user_data_dir=profile_dir(site) if profile else None)
+    except Exception:
+        if profile:
+            unlock_profile(site)
+        raise
+    driver.profile_site = site if profile else None
+    if blocked:
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked})
+        except Exception as e:
+            print(f"⚠️ Could not block resources for {site}: {e}")
+            if telemetry:
+                telemetry.failure(f'{site}:block_resources')
+    print(f"✓ {site} browser started ({'headless' if headless else 'visible'}, "
+          f"{'saved' if profile else 'temporary'} profile, {len(blocked)} blocked URL patterns)")
+    return driver
+
+
+def close_browser(driver):
+    """Quit a browser and free its profile for the next one"""
+    try:
+        driver.quit()
+    finally:
+        site = getattr(driver, 'profile_site', None)
+        if site:
+            session = load_session(site)
+            session['last_used'] = time.time()
+            save_session(site, session)
+            unlock_profile(site)
+
+
+def is_challenge(driver):
+    """True if the page is a bot check instead of the site"""
+    try:
+        title = (driver.title or '').lower()
+    except Exception:
+        return False
+    return any(text in title for text in CHALLENGE_TITLES)
+
+
+def wait_for_site(driver, timeout=CHALLENGE_WAIT):
+    """Give an automatic bot check time to pass; False if it is still there"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.5).until(lambda d: not is_challenge(d))
+        return True
+    except Exception:
+        return False
+
+
+def open_site(site, url, telemetry=None, headless=None):
+    """Start a browser and load the site's first page. A headless browser that gets a bot
+    check is replaced by a visible one when a display is available; if the check still
+    does not pass, the profile's cookies are cleared and the page is loaded once more."""
+    headless = use_headless(site, headless)
+    t = telemetry or RunTelemetry(site, log_file=None)
+    with t.stage(f'{site}:browser_start'):
+        driver = start_browser(site, headless, t)
+    with t.stage(f'{site}:first_page'):
+        driver.get(url)
+        if wait_for_site(driver):
+            return driver
+        if headless and has_display():
+            print(f"⚠️ {site} sent a bot check to the headless browser, retrying with a visible one")
+            t.failure(f'{site}:headless_challenge')
+            close_browser(driver)
+            driver = start_browser(site, False, t)
+            driver.get(url)
+            if wait_for_site(driver):
+                return driver
+        if getattr(driver, 'profile_site', None):
+            # A stale clearance or session cookie can keep a check from passing
+            print(f"⚠️ {site} bot check did not pass, clearing the saved session")
+            t.failure(f'{site}:session_reset')
+            forget_session(driver, site)
+            driver.get(url)
+            wait_for_site(driver)
+    return driver
+
+
+def wait_for_count(driver, by, value, more_than, timeout=LOAD_MORE_TIMEOUT):
+    """Wait until more than more_than elements match (after a "load more" click);
+    returns the number found, which equals more_than if nothing was added in time"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.25).until(
+            lambda d: len(d.find_elements(by, value)) > more_than)
+    except Exception:
+        pass
+    return len(driver.find_elements(by, value))
@@ -1,4 +1,3 @@
-import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -11,165 +10,181 @@ import re
 import os
 
 import html
+from wine_classifier import classify_type, classify_size
+from wine_schema import normalize_wine
+from run_telemetry import RunTelemetry
+from browser import open_site, close_browser, has_consent, cookie_names, save_consent, wait_for_count
+from scraper_debug import DEBUG_CAPTURE, HTML_PARSER, save_page
+from scraper_fixtures import record_page
 
 def determine_wine_type(name):
-    """Infer wine type from name."""
-    name_lower = name.lower()
-    if any(word in name_lower for word in ['rouge', 'red', 'merlot', 'cabernet', 'syrah', 'pinot noir']):
-        return 'Red'
-    elif any(word in name_lower for word in ['blanc', 'white', 'chardonnay', 'sauvignon']):
-        return 'White'
-    elif any(word in name_lower for word in ['rosé', 'rose']):
-        return 'Rosé'
-    elif any(word in name_lower for word in ['champagne', 'cava', 'prosecco', 'sparkling', 'crémant']):
-        return 'Sparkling'
-    return 'Other'
+    """Infer wine type from name (see wine_classifier.py)."""
+    return classify_type(name)
 
 def determine_bottle_size(name):
-    """Infer bottle size from name."""
-    name_lower = name.lower()
-    if '25cl' in name_lower or '25 cl' in name_lower:
-        return '25cl'
-    elif any(x in name_lower for x in ['3 l', '3l', 'bib', 'box', 'bag in box']):
-        return 'Box'
-    elif '75cl' in name_lower or '75 cl' in name_lower:
-        return '75cl'
-    return 'Other'
+    """Infer bottle size from name (see wine_classifier.py)."""
+    return classify_size(name)
+
+
+def parse_products(page_html, telemetry=None, parser=HTML_PARSER):
+    """Wines on a Carrefour listing page: (number of product elements, [wine])"""
+    soup = BeautifulSoup(page_html, parser)
+    products = soup.find_all('div', {'class': 'product js-product'})
+    
+    if not products:
+        # Fallback to generic selector if specific class not found
+        products = soup.select(".product-card, article")
+    
+    wines = []
+    for product in products:
+        try:
+            # Try legacy parsing logic first (data attribute)
+            product_tile = product.select_one('.product-tile')
+            if product_tile and product_tile.get('data-select-item-event-object'):
+                raw_json = product_tile.get('data-select-item-event-object')
+                # Unescape HTML entities in JSON string
+                decoded_json = html.unescape(raw_json)
+                event_data = json.loads(decoded_json)
+                item = event_data.get('ecommerce', {}).get('items', [{}])[0]
+                name = item.get('item_name', 'N/A')
+                price = str(item.get('price', 'N/A'))
+                
+                # Find the product link (avoid wishlist button)
+                link_elem = product.select_one('.pdp-link a') or product.select_one('.image-container a')
+                link = link_elem['href'] if link_elem else "#"
+                
+                # Find image URL
+                img_elem = product.select_one('.product-card__image img, .image-container img')
+                image_url = "https://upload.wikimedia.org/wikipedia/commons/a/ac/No_image_available.svg"
+                if img_elem:
+                    image_url = img_elem.get('src') or img_elem.get('data-src') or image_url
+                    
+            else:
+                # Fallback to DOM parsing
+                name = product.select_one(".product-card__title, h3").get_text(strip=True)
+                price = product.select_one(".product-card__price, .price").get_text(strip=True)
+                link_elem = product.find('a')
+                link = link_elem['href'] if link_elem else "#"
+                
+                # Find image URL
+                img_elem = product.select_one('img')
+                image_url = "https://upload.wikimedia.org/wikipedia/commons/a/ac/No_image_available.svg"
+                if img_elem:
+                    image_url = img_elem.get('src') or img_elem.get('data-src') or image_url
+
+            wine = normalize_wine({
+                "name": name,
+                "price": price,
+                "url": "https://www.carrefour.be" + link if link.startswith("/") else link,
+                "image_url": image_url,
+                "type": determine_wine_type(name),
+                "size": determine_bottle_size(name),
+                "vivino_score": None
+            })
+            wines.append(wine)
+        except Exception as e:
+            if telemetry:
+                telemetry.failure(f'carrefour:parse_{type(e).__name__}')
+            continue
+    return len(products), wines
 
 
 class CarrefourScraper:
-    def __init__(self):
+    def __init__(self, telemetry=None):
         self.base_url = "https://www.carrefour.be/fr/boissons/vins"
         self.mock_data_path = os.path.join(os.path.dirname(__file__), 'mock_data.json')
+        self.telemetry = telemetry or RunTelemetry('carrefour', log_file=None)
 
-    def get_wines(self, search_term="wijn"):
+    def get_wines(self, search_term="wijn", on_wine=None):
+        """Scrape all wines. If on_wine is given it is called with each wine as soon as it is parsed."""
         print(f"Scraping {self.base_url} with Selenium...")
         wines = []
         driver = None
+        t = self.telemetry
         try:
-            options = uc.ChromeOptions()
-            # options.add_argument('--headless') # Run visible to bypass Cloudflare
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
+            # Headless with images and trackers blocked; open_site falls back to a visible
+            # browser if Cloudflare challenges the headless one
+            driver = open_site('carrefour', self.base_url, t)
             
-            driver = uc.Chrome(options=options)
-            driver.get(self.base_url)
-            time.sleep(5) # Wait for initial load
-            
-            # Handle cookies
-            try:
-                accept_button = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.ID, "onetrust-accept-btn-handler"))
-                )
-                accept_button.click()
-                print("Cookies accepted.")
-            except:
-                print("Cookie banner not found or already accepted.")
+            # Handle cookies (the saved browser profile remembers an earlier consent)
+            consent_before = None
+            if has_consent(driver, 'carrefour'):
+                print("Cookies already accepted (saved session).")
+            else:
+                with t.stage('carrefour:cookies'):
+                    consent_before = cookie_names(driver)
+                    try:
+                        accept_button = WebDriverWait(driver, 10).until(
+                            EC.presence_of_element_located((By.ID, "onetrust-accept-btn-handler"))
+                        )
+                        accept_button.click()
+                        print("Cookies accepted.")
+                    except:
+                        print("Cookie banner not found or already accepted.")
 
             # Wait for products
-            try:
-                WebDriverWait(driver, 20).until(
-                    EC.presence_of_all_elements_located((By.CLASS_NAME, "js-product"))
-                )
-            except:
-                print("Timeout waiting for products.")
+            with t.stage('carrefour:first_products'):
+                try:
+                    WebDriverWait(driver, 20).until(
+                        EC.presence_of_all_elements_located((By.CLASS_NAME, "js-product"))
+                    )
+                except:
+                    print("Timeout waiting for products.")
+                    t.failure('carrefour:products_timeout')
+            if consent_before is not None:
+                save_consent(driver, 'carrefour', consent_before)
 
             # Load all wines by clicking "Montrer plus de produits" button
             print("Loading all wines by clicking 'Montrer plus de produits'...")
             wines_loaded = 0
             max_clicks = 20  # Prevent infinite loop (514 wines / ~30 per page = ~17 clicks)
             
-            for i in range(max_clicks):
-                try:
-                    # Wait a bit for content to load
-                    time.sleep(2)
+            with t.stage('carrefour:crawl'):
+                for i in range(max_clicks):
+                    try:
+                        # Count current wines
+                        current_wines = len(driver.find_elements(By.CLASS_NAME, "js-product"))
+                        if current_wines > wines_loaded:
+                            print(f"Loaded {current_wines} wines so far...")
+                            wines_loaded = current_wines
                     
-                    # Count current wines
-                    current_wines = len(driver.find_elements(By.CLASS_NAME, "js-product"))
-                    if current_wines > wines_loaded:
-                        print(f"Loaded {current_wines} wines so far...")
-                        wines_loaded = current_wines
+                        # Find the "show-more" button (French: "Montrer plus de produits")
+                        show_more_buttons = driver.find_elements(By.CLASS_NAME, "show-more")
                     
-                    # Find the "show-more" button (French: "Montrer plus de produits")
-                    show_more_buttons = driver.find_elements(By.CLASS_NAME, "show-more")
-                    
-                    if show_more_buttons and show_more_buttons[0].is_displayed():
-                        # Scroll to button first
-                        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", show_more_buttons[0])
-                        time.sleep(1)
+                        if show_more_buttons and show_more_buttons[0].is_displayed():
+                            # Scroll to button first
+                            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", show_more_buttons[0])
+                            t.wait(1, 'carrefour:crawl')
                         
-                        # Click the button
-                        show_more_buttons[0].click()
-                        print(f"Clicked 'Montrer plus de produits' button (click {i+1})")
-                        time.sleep(3)  # Wait for new products to load
-                    else:
-                        print(f"No more 'show-more' button found after {i} clicks")
-                        break
+                            # Click the button
+                            show_more_buttons[0].click()
+                            t.count('carrefour.clicks')
+                            print(f"Clicked 'Montrer plus de produits' button (click {i+1})")
+                            # Continue as soon as the new products are there
+                            wait_for_count(driver, By.CLASS_NAME, "js-product", current_wines)
+                        else:
+                            print(f"No more 'show-more' button found after {i} clicks")
+                            break
                         
-                except Exception as e:
-                    print(f"Error clicking show more: {e}")
-                    print(f"Finished loading after {i} clicks")
-                    break
+                    except Exception as e:
+                        t.failure(f'carrefour:click_{type(e).__name__}', click=i + 1)
+                        print(f"Error clicking show more: {e}")
+                        print(f"Finished loading after {i} clicks")
+                        break
             
             print(f"Finished loading. Total wines on page: {wines_loaded}")
 
             # Parse content
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            products = soup.find_all('div', {'class': 'product js-product'})
-            
-            if not products:
-                # Fallback to generic selector if specific class not found
-                products = soup.select(".product-card, article")
-
-            print(f"Found {len(products)} products.")
-
-            for product in products:
-                try:
-                    # Try legacy parsing logic first (data attribute)
-                    product_tile = product.select_one('.product-tile')
-                    if product_tile and product_tile.get('data-select-item-event-object'):
-                        raw_json = product_tile.get('data-select-item-event-object')
-                        # Unescape HTML entities in JSON string
-                        decoded_json = html.unescape(raw_json)
-                        event_data = json.loads(decoded_json)
-                        item = event_data.get('ecommerce', {}).get('items', [{}])[0]
-                        name = item.get('item_name', 'N/A')
-                        price = str(item.get('price', 'N/A'))
-                        
-                        # Find the product link (avoid wishlist button)
-                        link_elem = product.select_one('.pdp-link a') or product.select_one('.image-container a')
-                        link = link_elem['href'] if link_elem else "#"
-                        
-                        # Find image URL
-                        img_elem = product.select_one('.product-card__image img, .image-container img')
-                        image_url = "https://upload.wikimedia.org/wikipedia/commons/a/ac/No_image_available.svg"
-                        if img_elem:
-                            image_url = img_elem.get('src') or img_elem.get('data-src') or image_url
-                            
-                    else:
-                        # Fallback to DOM parsing
-                        name = product.select_one(".product-card__title, h3").get_text(strip=True)
-                        price = product.select_one(".product-card__price, .price").get_text(strip=True)
-                        link_elem = product.find('a')
-                        link = link_elem['href'] if link_elem else "#"
-                        
-                        # Find image URL
-                        img_elem = product.select_one('img')
-                        image_url = "https://upload.wikimedia.org/wikipedia/commons/a/ac/No_image_available.svg"
-                        if img_elem:
-                            image_url = img_elem.get('src') or img_elem.get('data-src') or image_url
-
-                    wines.append({
-                        "name": name,
-                        "price": price,
-                        "url": "https://www.carrefour.be" + link if link.startswith("/") else link,
-                        "image_url": image_url,
-                        "type": determine_wine_type(name),
-                        "size": determine_bottle_size(name),
-                        "vivino_score": "N/A"
-                    })
-                except Exception as e:
-                    continue
+            parse_start = time.perf_counter()
+            page_html = driver.page_source
+            record_page('carrefour', self.base_url, page_html)
+            product_count, wines = parse_products(page_html, t)
+            print(f"Found {product_count} products.")
+            for wine in wines:
+                t.count('products')
+                if on_wine:
+                    on_wine(wine)
+            t.record_stage('carrefour:parse', time.perf_counter() - parse_start, products=product_count)
             
         except Exception as e:
             print(f"Selenium scraping error: {e}")
@@ -177,10 +192,9 @@ class CarrefourScraper:
         finally:
             if driver:
                 try:
-                    with open("selenium_dump.html", "w", encoding="utf-8") as f:
-                        f.write(driver.page_source)
-                    print("Saved HTML to selenium_dump.html")
-                    driver.quit()
+                    if DEBUG_CAPTURE:
+                        print(f"Saved HTML to {save_page('carrefour_final', driver.page_source)}")
+                    close_browser(driver)
                 except:
                     pass
         
@@ -193,7 +207,7 @@ class CarrefourScraper:
     def load_mock_data(self):
         if os.path.exists(self.mock_data_path):
             with open(self.mock_data_path, 'r') as f:
-                return json.load(f)
+                return [normalize_wine(w) for w in json.load(f)]
         return []
 
 
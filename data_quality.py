@@ -0,0 +1,180 @@
+"""
+Data Quality Report
+Runs every data check over static/wines.json in one vectorised pandas pass:
+
+  other_type         - type is "Other"
+  no_score           - Vivino score missing or 0
+  duplicates         - the same store listing (store + URL) appears more than once
+  suspicious_price   - price missing, not a number, <= 0, or far from the median of its bottle size
+  missing_image      - no image URL
+
+Writes the editable correction CSVs (wines_with_other_type.csv, wines_with_no_rating.csv)
+and a machine-readable data_quality_report.json. Corrections already typed into the
+CSVs are kept when they are regenerated. Results are cached per data version (a hash
+of wines.json), so running it after every refresh only costs a file hash when
+nothing changed.
+
+Usage:
+    python data_quality.py           # report + correction CSVs
+    python data_quality.py --force   # ignore the cached report
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+import pandas as pd
+
+WINES_JSON = 'static/wines.json'
+REPORT_FILE = 'data_quality_report.json'
+TYPE_CORRECTION_FILE = 'wines_with_other_type.csv'
+NO_RATING_FILE = 'wines_with_no_rating.csv'
+
+SPECIAL_STORES = {'WineVino Team'}  # Special entries (thank-you card) are not wines
+PRICE_OUTLIER_FACTOR = 5  # Flag prices more than 5x above or below the median for their size
+
+CHECKS = ['other_type', 'no_score', 'duplicates', 'suspicious_price', 'missing_image']
+REPORT_COLUMNS = ['name', 'store', 'price', 'type', 'size', 'vivino_score', 'url', 'image_url']
+
+TYPE_CSV_HEADER = ['Name', 'Store', 'Price', 'Current Type', 'CORRECTED TYPE (write here)', 'Vivino Score', 'URL']
+SCORE_CSV_HEADER = ['Name', 'Type', 'Store', 'Price', 'Current Vivino Score', 'CORRECTED SCORE (write here)', 'URL']
+
+
+def data_version(path=WINES_JSON):
+    """Content hash of the wine data"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load_wines(path=WINES_JSON):
+    df = pd.read_json(path, dtype=False)
+    for col in REPORT_COLUMNS:
+        if col not in df.columns:
+            df[col] = ''
+    df = df[~df['store'].isin(SPECIAL_STORES)].reset_index(drop=True)
+    return df
+
+
+def run_checks(df):
+    """Boolean mask per check, all computed column-wise"""
+    price = pd.to_numeric(df['price'], errors='coerce')
+    score = pd.to_numeric(df['vivino_score'], errors='coerce')
+    url = df['url'].fillna('').astype(str).str.strip()
+    image = df['image_url'].fillna('').astype(str).str.strip()
+
+    # Wines without a URL are identified by name, like everywhere else
+    listing = df['store'].astype(str) + '|' + url.where(~url.isin(['', '#']), df['name'].astype(str))
+    size_median = price.groupby(df['size']).transform('median')
+    far_from_median = (price > size_median * PRICE_OUTLIER_FACTOR) | (price < size_median / PRICE_OUTLIER_FACTOR)
+
+    return {
+        'other_type': df['type'].fillna('Other').astype(str).str.lower() == 'other',
+        'no_score': score.isna() | (score == 0),
+        'duplicates': listing.duplicated(keep=False),
+        'suspicious_price': price.isna() | (price <= 0) | far_from_median,
+        'missing_image': image.isin(['', '#', 'nan']),
+    }
+
+
+def build_report(df, version):
+    masks = run_checks(df)
+    clean = df[REPORT_COLUMNS].astype(object).where(df[REPORT_COLUMNS].notna(), None)
+    return {
+        'version': version,
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'total_wines': len(df),
+        'counts': {check: int(masks[check].sum()) for check in CHECKS},
+        'issues': {check: clean[masks[check]].to_dict('records') for check in CHECKS},
+    }
+
+
+def load_cached_report(version):
+    if not os.path.exists(REPORT_FILE):
+        return None
+    try:
+        with open(REPORT_FILE, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    except ValueError:
+        return None
+    return report if report.get('version') == version else None
+
+
+def save_json(data, path):
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, path)
+
+
+def existing_corrections(path, column):
+    """(store, url or name) -> value already typed into a correction CSV"""
+    corrections = {}
+    if not os.path.exists(path):
+        return corrections
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            value = (row.get(column) or '').strip()
+            if value:
+                corrections[(row.get('Store'), row.get('URL') or row.get('Name'))] = value
+    return corrections
+
+
+def write_correction_csv(path, header, rows, correction_column):
+    """Write a correction CSV, keeping corrections that were already filled in"""
+    kept = existing_corrections(path, correction_column)
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            key = (row['Store'], row['URL'] or row['Name'])
+            row[correction_column] = kept.get(key, '')
+            writer.writerow([row[h] for h in header])
+    os.replace(tmp_file, path)
+
+
+def write_correction_csvs(report):
+    other_rows = [{
+        'Name': w['name'], 'Store': w['store'], 'Price': w['price'], 'Current Type': w['type'] or 'Other',
+        'Vivino Score': w['vivino_score'] if w['vivino_score'] is not None else 'N/A', 'URL': w['url'] or '',
+    } for w in report['issues']['other_type']]
+    score_rows = [{
+        'Name': w['name'], 'Type': w['type'] or 'N/A', 'Store': w['store'], 'Price': w['price'],
+        'Current Vivino Score': w['vivino_score'] if w['vivino_score'] is not None else 'N/A', 'URL': w['url'] or '',
+    } for w in report['issues']['no_score']]
+    write_correction_csv(TYPE_CORRECTION_FILE, TYPE_CSV_HEADER, other_rows, 'CORRECTED TYPE (write here)')
+    write_correction_csv(NO_RATING_FILE, SCORE_CSV_HEADER, score_rows, 'CORRECTED SCORE (write here)')
+
+
+def get_report(force=False):
+    """Report for the current wines.json, from the cache when the data has not changed"""
+    version = data_version()
+    report = None if force else load_cached_report(version)
+    if report is not None:
+        return report, True
+    report = build_report(load_wines(), version)
+    save_json(report, REPORT_FILE)
+    return report, False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the wine data and write the correction CSVs")
+    parser.add_argument('--force', action='store_true', help="recompute even if the data has not changed")
+    args = parser.parse_args()
+
+    start = time.time()
+    report, cached = get_report(args.force)
+    if not cached or not (os.path.exists(TYPE_CORRECTION_FILE) and os.path.exists(NO_RATING_FILE)):
+        write_correction_csvs(report)
+
+    print(f"{'✓ Data unchanged, using cached report' if cached else '✓ Checked'} "
+          f"{report['total_wines']} wines ({(time.time() - start) * 1000:.0f} ms)")
+    for check in CHECKS:
+        count = report['counts'][check]
+        print(f"  {'⚠️ ' if count else '✅'} {check}: {count}")
+    print(f"\n✅ {REPORT_FILE}, {TYPE_CORRECTION_FILE} and {NO_RATING_FILE} are up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,183 @@
 """
 Vivino Score Enrichment Script
 Reads existing wine CSVs and adds/updates Vivino scores without re-scraping the stores
+
+Modes:
+  missing  - only wines without a score that were never looked up (default)
+  stale    - missing wines plus wines whose last lookup is older than --max-age-days
+  force    - every wine (the old "Force Update" behaviour)
+
+With --local-first, wines already known to the local Vivino index (vivino_index.py)
+are resolved without a network lookup. In stale mode, index entries older than
+--max-age-days do not count, so stale wines really are searched again.
+
+Wines that entity_resolution.py links to an already scored listing of the same wine
+take that score instead of a new lookup (except in force mode).
+
+Every lookup is written to vivino_scores.db in small batches, and the CSV is
+checkpointed after each batch, so an interrupted run resumes where it stopped.
 """
-import pandas as pd
+import argparse
+import os
 import time
+import pandas as pd
 from vivino_scraper import VivinoScraper
+from score_store import ScoreStore, wine_key
+from vivino_index import VivinoIndex
+from entity_resolution import build_canonical_wines, shared_scores
+from wine_schema import parse_score, read_wines_frame, write_wines_frame
+from run_telemetry import RunTelemetry
+
+MODES = ['missing', 'stale', 'force']
+BATCH_SIZE = 10  # Lookups per durable write
+DEFAULT_MAX_AGE_DAYS = 30
+
 
-def enrich_csv_with_vivino(csv_file):
+def has_score(value):
+    """True if a vivino_score value is a usable score"""
+    return parse_score(value) is not None
+
+
+def select_wines(df, lookups, mode, max_age_days, resume_from):
+    """Return the row indices that need a Vivino lookup"""
+    stale_before = time.time() - max_age_days * 24 * 60 * 60
+    selected = []
+    for idx, row in df.iterrows():
+        record = lookups.get(wine_key(row))
+        looked_up_at = record[1] if record else None
+
+        # Already done by the run we are resuming
+        if looked_up_at is not None and looked_up_at >= resume_from:
+            continue
+
+        if mode == 'force':
+            selected.append(idx)
+        elif mode == 'stale' and looked_up_at is not None and looked_up_at < stale_before:
+            selected.append(idx)
+        elif not has_score(row['vivino_score']) and looked_up_at is None:
+            selected.append(idx)
+    return selected
+
+
+def enrich_csv_with_vivino(csv_file, mode='missing', max_age_days=DEFAULT_MAX_AGE_DAYS, store=None,
+                           local_index=None, shared=None, telemetry=None):
     """Enrich a CSV file with Vivino scores"""
     print(f"\n{'='*60}")
-    print(f"Processing: {csv_file}")
+    print(f"Processing: {csv_file} (mode: {mode})")
     print(f"{'='*60}")
-    
+
+    own_store = store is None
+    store = store or ScoreStore()
+
     # Load existing CSV
     print(f"\n[1/3] Loading {csv_file}...")
-    df = pd.read_csv(csv_file)
+    columns = list(pd.read_csv(csv_file, nrows=0).columns)  # Keep the file's own columns
+    df = read_wines_frame(csv_file)
     print(f"✓ Loaded {len(df)} wines")
-    
-    # Count wines needing scores
-    wines_needing_scores = df # Scrape ALL wines
-    print(f"\n[2/3] Wines to scrape (Force Update): {len(wines_needing_scores)}")
-    
+
+    # Scores already in the CSV count as looked up when the CSV was last written
+    csv_time = os.path.getmtime(csv_file)
+    store.seed(csv_file, [(wine_key(row), row['name'], row['vivino_score'])
+                          for _, row in df.iterrows() if has_score(row['vivino_score'])], csv_time)
+    lookups = store.get_lookups(csv_file)
+
+    run_id, resume_from = store.start_run(csv_file, mode)
+    wines_needing_scores = select_wines(df, lookups, mode, max_age_days, resume_from)
+    print(f"\n[2/3] Wines to scrape: {len(wines_needing_scores)}")
+
     if len(wines_needing_scores) == 0:
-        print("✓ No wines found!")
+        print("✓ All wines are up to date!")
+        store.finish_run(run_id)
+        if own_store:
+            store.close()
         return
-    
+
     # Estimate time
     estimated_minutes = len(wines_needing_scores) * 5 / 60
     print(f"⚠️  Estimated time: {estimated_minutes:.1f} minutes")
     print(f"    ({len(wines_needing_scores)} wines × ~5 seconds each)")
-    
+
     # Scrape Vivino scores
     print(f"\n[3/3] Fetching Vivino scores...")
-    with VivinoScraper() as vivino:
-        for idx, row in wines_needing_scores.iterrows():
-            wine_name = row['name']
-            print(f"[{idx+1}/{len(df)}] Fetching score for: {wine_name}")
-            
-            score = vivino.get_score(wine_name)
-            df.at[idx, 'vivino_score'] = score
-            print(f"  → Score: {score}")
-            
-            time.sleep(2)  # Be respectful to Vivino
-    
-    # Save updated CSV
-    print(f"\nSaving updated {csv_file}...")
-    df.to_csv(csv_file, index=False, encoding='utf-8')
-    print(f"✓ Saved {len(df)} wines with updated scores")
+    batch = []
+    try:
+        with VivinoScraper(local_index=local_index, telemetry=telemetry) as vivino:
+            for i, idx in enumerate(wines_needing_scores, 1):
+                row = df.loc[idx]
+                wine_name = row['name']
+                print(f"[{i}/{len(wines_needing_scores)}] Fetching score for: {wine_name}")
+
+                key = wine_key(row)
+                from_sibling = mode != 'force' and shared and key in shared
+                if from_sibling:
+                    score = parse_score(shared[key])
+                    print("  (same wine as an already scored listing)")
+                    if telemetry:
+                        telemetry.count('vivino.sibling_hits')
+                else:
+                    score = vivino.get_score(wine_name)
+                # Keep a previous score rather than overwriting it with a failed lookup
+                if has_score(score) or not has_score(row['vivino_score']):
+                    df.at[idx, 'vivino_score'] = score
+                print(f"  → Score: {score}")
+
+                batch.append((key, wine_name, score, time.time()))
+                if len(batch) >= BATCH_SIZE:
+                    store.put_batch(csv_file, batch)
+                    write_wines_frame(df, csv_file, columns)
+                    batch = []
+
+                if not from_sibling and not vivino.last_was_local:
+                    vivino.telemetry.wait(2, 'vivino:politeness')  # Be respectful to Vivino
+    finally:
+        # Persist whatever finished, even when interrupted
+        if batch:
+            store.put_batch(csv_file, batch)
+        write_wines_frame(df, csv_file, columns)
+        print(f"\n✓ Saved {len(df)} wines to {csv_file}")
+
+    store.finish_run(run_id)
+    if own_store:
+        store.close()
+
 
 def main():
     """Main function to enrich both CSVs"""
+    parser = argparse.ArgumentParser(description="Add Vivino scores to the wine CSVs")
+    parser.add_argument('--mode', choices=MODES, default='missing',
+                        help="which wines to look up (default: missing)")
+    parser.add_argument('--max-age-days', type=int, default=DEFAULT_MAX_AGE_DAYS,
+                        help="in stale mode, re-check wines looked up longer ago than this")
+    parser.add_argument('--local-first', action='store_true',
+                        help="resolve wines from the local Vivino index before searching online")
+    args = parser.parse_args()
+
     print("="*60)
     print("VIVINO SCORE ENRICHMENT SCRIPT")
     print("="*60)
     print("\nThis script will add Vivino scores to existing wine CSVs")
     print("without re-scraping the supermarket websites.")
-    
-    # Process Carrefour wines
-    try:
-        enrich_csv_with_vivino('carrefour_wines.csv')
-    except FileNotFoundError:
-        print("\n⚠️  carrefour_wines.csv not found, skipping...")
-    except Exception as e:
-        print(f"\n❌ Error processing carrefour_wines.csv: {e}")
-    
-    # Process Albert Heijn wines
-    try:
-        enrich_csv_with_vivino('ah_wines.csv')
-    except FileNotFoundError:
-        print("\n⚠️  ah_wines.csv not found, skipping...")
-    except Exception as e:
-        print(f"\n❌ Error processing ah_wines.csv: {e}")
-    
+
+    store = ScoreStore()
+    local_index = None
+    if args.local_first:
+        local_index = VivinoIndex(max_age_days=args.max_age_days if args.mode == 'stale' else None)
+    shared = shared_scores(build_canonical_wines())
+    telemetry = RunTelemetry(f'enrich_{args.mode}')
+    for csv_file in ['carrefour_wines.csv', 'ah_wines.csv']:
+        try:
+            with telemetry.stage(f'enrich:{csv_file}'):
+                enrich_csv_with_vivino(csv_file, args.mode, args.max_age_days, store, local_index, shared, telemetry)
+        except FileNotFoundError:
+            print(f"\n⚠️  {csv_file} not found, skipping...")
+        except Exception as e:
+            telemetry.failure(f'enrich:{type(e).__name__}', csv_file=csv_file, error=str(e))
+            print(f"\n❌ Error processing {csv_file}: {e}")
+    store.close()
+    if local_index:
+        local_index.close()
+    telemetry.finish()
+
     print("\n" + "="*60)
     print("ENRICHMENT COMPLETE!")
     print("="*60)
@@ -0,0 +1,280 @@
+"""
+Canonical Wine Entity Resolution
+Clusters store listings (Carrefour, Albert Heijn, ...) that are the same wine into
+canonical wines with a stable ID and per-store offers.
+
+Listings are only compared inside blocks that share a rare name token, so the cost
+grows with the block sizes instead of O(n²). Pairs whose bottle size differs, whose
+prices are more than MAX_PRICE_RATIO apart, or that one store sells at two prices (AH
+lists its house wines under one name in several sizes) are dropped from the blocks.
+Type, colour and vintage must also be compatible before names are scored.
+
+The app and the Vivino enrichment only read canonical_ids.json. The full clusters
+(canonical_wines.json, not tracked in git) are written with --dump, for inspection.
+
+Usage:
+    python entity_resolution.py           # writes canonical_ids.json
+    python entity_resolution.py --dump    # also writes canonical_wines.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict
+from wine_matcher import prepare, similarity, fold_accents, STORE_PREFIXES
+from wine_schema import read_wines_csv
+
+STORE_FILES = [
+    ('carrefour_wines.csv', 'Carrefour'),
+    ('ah_wines.csv', 'Albert Heijn'),
+]
+CANONICAL_FILE = 'canonical_wines.json'  # Written with --dump only
+CANONICAL_IDS_FILE = 'canonical_ids.json'  # url -> canonical id, keeps IDs stable across runs
+
+RESOLVE_THRESHOLD = 0.85  # Similarity needed to call two listings the same wine
+MAX_BLOCK_SIZE = 40  # Tokens shared by more listings than this are too common to block on
+MAX_PRICE_RATIO = 1.5  # The same bottle costs at most this much more in one listing than in another
+
+COLOUR_WORDS = {
+    'rouge': 'red', 'red': 'red', 'rood': 'red', 'rooi': 'red', 'rosso': 'red', 'tinto': 'red',
+    'blanc': 'white', 'white': 'white', 'wit': 'white', 'bianco': 'white', 'blanco': 'white',
+    'rose': 'rose', 'rosato': 'rose', 'rosado': 'rose',
+}
+VOLUME_RE = re.compile(r'(?:(\d+)\s*x\s*)?(\d+(?:[.,]\d+)?)\s*(cl|ml|l)\b')
+BOX_RE = re.compile(r'\b(bag in box|bib|wijntap|tap)\b')
+
+
+def container(name):
+    """'6x75cl' -> '6x75', '37.5 cl' -> '37.5', wine boxes -> 'box', unknown -> None"""
+    text = fold_accents(str(name)).lower()
+    match = VOLUME_RE.search(text)
+    if match:
+        count, amount, unit = match.groups()
+        cl = float(amount.replace(',', '.')) * {'cl': 1, 'ml': 0.1, 'l': 100}[unit]
+        if cl >= 300 and not count:
+            return 'box'
+        volume = f'{cl:g}'
+        return f'{count}x{volume}' if count else volume
+    if BOX_RE.search(text):
+        return 'box'
+    return None
+
+
+def private_label(name):
+    """The store's own-brand prefix ('ah excellent selectie', ...) or None"""
+    text = fold_accents(str(name)).lower()
+    for prefix in STORE_PREFIXES:
+        folded = fold_accents(prefix)
+        if text.startswith(folded + ' ') or f' {folded} ' in f' {text} ':
+            return folded
+    return None
+
+
+def colours(name):
+    return {COLOUR_WORDS[t] for t in prepare(name).normalized.split() if t in COLOUR_WORDS}
+
+
+def make_listing(wine, store):
+    """Listing dict (from a normalized wine) with the features used for blocking and comparison"""
+    return {
+        'name': wine['name'],
+        'container': container(wine['name']),
+        'label': private_label(wine['name']),
+        'colours': colours(wine['name']),
+        'price': wine['price'],
+        'url': wine['url'],
+        'image_url': wine['image_url'],
+        'type': wine['type'],
+        'size': wine['size'],
+        'vivino_score': wine['vivino_score'],
+        'store': store,
+    }
+
+
+def load_listings():
+    """Load every store listing with a URL"""
+    listings = []
+    for csv_file, store in STORE_FILES:
+        for wine in read_wines_csv(csv_file, store):
+            if wine['url'] in ('', '#'):
+                continue
+            listings.append(make_listing(wine, store))
+    return listings
+
+
+def same_bottle(a, b):
+    """A known size and container must agree, and known prices must be within MAX_PRICE_RATIO.
+    One store listing the same wine twice at different prices sells two bottles (sizes,
+    packs), so listings of one store must have the same price."""
+    if a['store'] == b['store'] and a['price'] and b['price'] and a['price'] != b['price']:
+        return False
+    if a['size'] != 'Other' and b['size'] != 'Other' and a['size'] != b['size']:
+        return False
+    if a['container'] and b['container'] and a['container'] != b['container']:
+        return False
+    if a['price'] and b['price'] and max(a['price'], b['price']) > MAX_PRICE_RATIO * min(a['price'], b['price']):
+        return False
+    return True
+
+
+def compatible(a, b):
+    """Hard constraints: the same bottle (same_bottle), a known type, colour or vintage
+    must agree, and own-brand wines only match the same own brand"""
+    if a['type'] != 'Other' and b['type'] != 'Other' and a['type'] != b['type']:
+        return False
+    if not same_bottle(a, b):
+        return False
+    if a['label'] != b['label']:
+        return False
+    if a['colours'] and b['colours'] and not (a['colours'] & b['colours']):
+        return False
+    year_a, year_b = prepare(a['name']).year, prepare(b['name']).year
+    return not (year_a and year_b and year_a != year_b)
+
+
+def same_wine(a, b):
+    """Every token of the shorter name must appear in the longer one, and the names
+    must be similar overall. Containment keeps transitive merges from chaining
+    'Pinot Blanc' and 'Pinot Gris' of the same producer together."""
+    name_a, name_b = prepare(a['name']), prepare(b['name'])
+    shorter, longer = sorted((name_a.tokens, name_b.tokens), key=len)
+    if not shorter <= longer:
+        return False
+    return similarity(name_a, name_b) >= RESOLVE_THRESHOLD
+
+
+def candidate_pairs(listings):
+    """Pairs of listing indices that share at least one rare token and can be the same bottle"""
+    blocks = defaultdict(list)
+    for i, listing in enumerate(listings):
+        for token in prepare(listing['name']).tokens:
+            blocks[token].append(i)
+
+    pairs = set()
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+            continue
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                if same_bottle(listings[members[x]], listings[members[y]]):
+                    pairs.add((members[x], members[y]))
+    return pairs
+
+
+def resolve(listings):
+    """Return clusters as lists of listing indices"""
+    parent = list(range(len(listings)))
+    members = {i: [i] for i in range(len(listings))}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in sorted(candidate_pairs(listings)):
+        root_a, root_b = find(a), find(b)
+        if root_a == root_b or not same_wine(listings[a], listings[b]):
+            continue
+        # Check the whole clusters, so a listing without a size cannot bridge a 25cl and a 75cl
+        if all(compatible(listings[x], listings[y]) for x in members[root_a] for y in members[root_b]):
+            parent[root_a] = root_b
+            members[root_b].extend(members.pop(root_a))
+
+    return list(members.values())
+
+
+def load_canonical_ids():
+    if os.path.exists(CANONICAL_IDS_FILE):
+        with open(CANONICAL_IDS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def assign_ids(listings, clusters, known_ids):
+    """Give each cluster a stable ID: reuse the ID most of its URLs had before,
+    otherwise derive a new one from its first URL"""
+    used = set()
+    ids = []
+    for members in clusters:
+        votes = defaultdict(int)
+        for i in members:
+            old_id = known_ids.get(listings[i]['url'])
+            if old_id:
+                votes[old_id] += 1
+        canonical_id = None
+        for old_id in sorted(votes, key=votes.get, reverse=True):
+            if old_id not in used:
+                canonical_id = old_id
+                break
+        if canonical_id is None:
+            anchor = min(listings[i]['url'] for i in members)
+            canonical_id = 'w' + hashlib.sha1(anchor.encode('utf-8')).hexdigest()[:12]
+        used.add(canonical_id)
+        ids.append(canonical_id)
+    return ids
+
+
+def build_canonical_wines(listings=None):
+    """Resolve listings into canonical wines, sorted by ID"""
+    listings = listings if listings is not None else load_listings()
+    clusters = resolve(listings)
+    ids = assign_ids(listings, clusters, load_canonical_ids())
+
+    canonical = []
+    for canonical_id, members in zip(ids, clusters):
+        offers = [listings[i] for i in members]
+        scored = [o['vivino_score'] for o in offers if o['vivino_score'] is not None]
+        known_types = [o['type'] for o in offers if o['type'] != 'Other']
+        known_sizes = [o['size'] for o in offers if o['size'] != 'Other']
+        canonical.append({
+            'id': canonical_id,
+            'name': max((o['name'] for o in offers), key=len),
+            'type': known_types[0] if known_types else 'Other',
+            'size': known_sizes[0] if known_sizes else 'Other',
+            'vivino_score': scored[0] if scored else None,
+            'offers': [{k: o[k] for k in ('store', 'name', 'price', 'url', 'image_url')} for o in offers],
+        })
+    canonical.sort(key=lambda c: c['id'])
+    return canonical
+
+
+def url_to_canonical(canonical):
+    """url -> canonical id lookup"""
+    return {offer['url']: c['id'] for c in canonical for offer in c['offers']}
+
+
+def shared_scores(canonical):
+    """url -> score for listings whose canonical wine already has a score,
+    so Vivino is only searched once per canonical wine"""
+    return {offer['url']: c['vivino_score'] for c in canonical if c['vivino_score'] is not None
+            for offer in c['offers']}
+
+
+def save_canonical_wines(canonical, dump=False):
+    if dump:
+        with open(CANONICAL_FILE, 'w', encoding='utf-8') as f:
+            json.dump(canonical, f, ensure_ascii=False, indent=2)
+    with open(CANONICAL_IDS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(url_to_canonical(canonical), f, ensure_ascii=False, indent=0, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Group store listings into canonical wines")
+    parser.add_argument('--dump', action='store_true', help=f"Also write the full clusters to {CANONICAL_FILE}")
+    args = parser.parse_args()
+
+    print("Resolving store listings into canonical wines...")
+    listings = load_listings()
+    canonical = build_canonical_wines(listings)
+    multi = [c for c in canonical if len(c['offers']) > 1]
+    cross_store = [c for c in multi if len({o['store'] for o in c['offers']}) > 1]
+    save_canonical_wines(canonical, args.dump)
+    print(f"✓ {len(listings)} listings -> {len(canonical)} canonical wines")
+    print(f"  {len(multi)} wines with several listings, {len(cross_store)} sold in more than one store")
+    print(f"✓ Saved {CANONICAL_IDS_FILE}" + (f" and {CANONICAL_FILE}" if args.dump else ""))
+
+
+if __name__ == "__main__":
+    main()
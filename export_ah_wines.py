@@ -3,10 +3,12 @@ Albert Heijn Belgium Wine Scraper
 Scrapes wine data from ah.be and saves to ah_wines.csv
 """
 import pandas as pd
-import time
 import os
 from ah_scraper import AlbertHeijnScraper
 from vivino_scraper import VivinoScraper
+from price_history import record_csv_snapshot
+from run_telemetry import RunTelemetry
+from wine_schema import read_wines_csv, write_wines_frame
 
 def export_ah_wines():
     """Export Albert Heijn wines to CSV with Vivino scores"""
@@ -16,12 +18,14 @@ def export_ah_wines():
     
     # Step 1: Scrape Albert Heijn
     print("\n[1/3] Scraping Albert Heijn for wines...")
-    ah_scraper = AlbertHeijnScraper()
+    telemetry = RunTelemetry('export_ah')
+    ah_scraper = AlbertHeijnScraper(telemetry=telemetry)
     wines = ah_scraper.get_wines()
     print(f"✓ Found {len(wines)} wines from Albert Heijn")
     
     if len(wines) == 0:
         print("No wines found. Exiting.")
+        telemetry.finish()
         return
     
     # Step 2: Load existing scores to avoid re-scraping
@@ -29,11 +33,9 @@ def export_ah_wines():
     try:
         if os.path.exists('ah_wines.csv'):
             print("Loading existing scores from ah_wines.csv...")
-            old_df = pd.read_csv('ah_wines.csv')
-            if 'name' in old_df.columns and 'vivino_score' in old_df.columns:
-                for _, row in old_df.iterrows():
-                    if pd.notna(row['vivino_score']) and str(row['vivino_score']) != 'N/A':
-                        existing_scores[row['name']] = row['vivino_score']
+            for wine in read_wines_csv('ah_wines.csv'):
+                if wine['vivino_score'] is not None:
+                    existing_scores[wine['name']] = wine['vivino_score']
             print(f"✓ Loaded {len(existing_scores)} existing scores")
     except Exception as e:
         print(f"Could not load existing scores: {e}")
@@ -43,6 +45,7 @@ def export_ah_wines():
     for wine in wines:
         if wine['name'] in existing_scores:
             wine['vivino_score'] = existing_scores[wine['name']]
+            telemetry.count('vivino.csv_cache_hits')
         else:
             wines_to_scrape.append(wine)
     
@@ -52,14 +55,14 @@ def export_ah_wines():
         print("⚠️  Estimated time: {:.1f} minutes".format(len(wines_to_scrape) * 5 / 60))
     
     # Use context manager to keep browser open for all wines
-    with VivinoScraper() as vivino:
+    with VivinoScraper(telemetry=telemetry) as vivino:
         for i, wine in enumerate(wines, 1):
-            if wine.get('vivino_score') == 'N/A':
+            if wine.get('vivino_score') is None:
                 print(f"[{i}/{len(wines)}] Fetching score for: {wine['name']}")
                 score = vivino.get_score(wine['name'])
                 wine['vivino_score'] = score
                 print(f"  → Score: {score}")
-                time.sleep(2)  # Be respectful to Vivino
+                telemetry.wait(2, 'vivino:politeness')  # Be respectful to Vivino
     
     # Step 3: Save to CSV
     print("\n[3/3] Saving to ah_wines.csv...")
@@ -77,8 +80,10 @@ def export_ah_wines():
     if duplicates_removed > 0:
         print(f"  Removed {duplicates_removed} duplicate wines")
     
-    df.to_csv('ah_wines.csv', index=False, encoding='utf-8')
+    write_wines_frame(df, 'ah_wines.csv')
     print(f"✓ Saved {len(df)} wines to ah_wines.csv")
+    record_csv_snapshot('ah_wines.csv', 'Albert Heijn')
+    telemetry.finish()
     
     print("\n" + "=" * 60)
     print("EXPORT COMPLETE!")
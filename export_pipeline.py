@@ -0,0 +1,261 @@
+"""
+Concurrent Export Pipeline
+Scrapes all stores at the same time and streams every new wine into a single Vivino
+enrichment queue as soon as it is extracted. Rows are written to disk as they are
+finished, so total time is bounded by the slowest stage instead of the sum of all stages.
+
+Replaces running export_wines.py and export_ah_wines.py one after the other.
+
+Usage:
+    python export_pipeline.py                       # all stores
+    python export_pipeline.py --stores Carrefour    # one store (as the scheduler runs it)
+
+A store whose scraper raises keeps its previous CSV (no partial CSV, no price snapshot),
+and the run exits with status 1 so the scheduler retries it.
+"""
+import argparse
+import csv
+import os
+import queue
+import sys
+import threading
+import time
+from cf_scraper import CarrefourScraper
+from ah_scraper import AlbertHeijnScraper
+from vivino_scraper import VivinoScraper
+from vivino_index import VivinoIndex
+from price_history import record_csv_snapshot
+from run_telemetry import RunTelemetry
+from wine_schema import read_wines_csv, to_csv_record
+
+# store name -> (scraper class, output CSV, CSV columns)
+STORES = {
+    'Carrefour': (CarrefourScraper, 'carrefour_wines.csv',
+                  ['name', 'price', 'url', 'image_url', 'type', 'size', 'vivino_score']),
+    'Albert Heijn': (AlbertHeijnScraper, 'ah_wines.csv',
+                     ['name', 'price', 'url', 'image_url', 'type', 'size', 'vivino_score', 'store']),
+}
+
+VIVINO_DELAY = 2  # Seconds between Vivino lookups - be respectful to Vivino
+STARTUP_STAGGER = 3  # Seconds between browser launches (chromedriver patching is not thread-safe)
+
+_DONE = object()
+
+
+def load_existing_scores(csv_file):
+    """Load name -> score for wines that already have a Vivino score"""
+    existing_scores = {}
+    try:
+        for wine in read_wines_csv(csv_file):
+            if wine['vivino_score'] is not None:
+                existing_scores[wine['name']] = wine['vivino_score']
+    except Exception as e:
+        print(f"Could not load existing scores from {csv_file}: {e}")
+    return existing_scores
+
+
+class IncrementalCSVWriter:
+    """Appends finished rows to a partial CSV and swaps it into place when the store is done"""
+
+    def __init__(self, csv_file, columns):
+        self.csv_file = csv_file
+        self.partial_file = csv_file + '.partial'
+        self.lock = threading.Lock()
+        self.count = 0
+        self.f = open(self.partial_file, 'w', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.f, fieldnames=columns, extrasaction='ignore')
+        self.writer.writeheader()
+        self.f.flush()
+
+    def write(self, wine):
+        with self.lock:
+            self.writer.writerow(to_csv_record(wine))
+            self.f.flush()  # Rows survive an interrupted run
+            self.count += 1
+
+    def finish(self):
+        with self.lock:
+            self.f.close()
+            os.replace(self.partial_file, self.csv_file)
+
+    def discard(self):
+        """Close and delete the partial CSV, leaving the previous CSV in place"""
+        with self.lock:
+            self.f.close()
+            os.remove(self.partial_file)
+
+
+class ExportPipeline:
+    def __init__(self, stores=None):
+        self.stores = stores or list(STORES.keys())
+        self.enrich_queue = queue.Queue()
+        self.writers = {}
+        self.existing_scores = {}
+        self.seen_urls = {}
+        self.pending = {}  # store -> wines still waiting for a Vivino score
+        self.scraped = set()  # stores whose scraper has finished
+        self.finished = set()  # stores whose CSV has been swapped into place
+        self.failed = set()  # stores whose scraper raised: their partial CSV is thrown away
+        self.state_lock = threading.Lock()
+        self.stats = {store: {'scraped': 0, 'cached': 0, 'looked_up': 0} for store in self.stores}
+        self.telemetry = RunTelemetry('export_pipeline')
+
+    def submit(self, store, wine):
+        """Called by the scraper threads for every extracted wine"""
+        url = wine.get('url', '#')
+        with self.state_lock:
+            if url in self.seen_urls[store]:
+                return
+            self.seen_urls[store].add(url)
+            self.stats[store]['scraped'] += 1
+
+        if wine['name'] in self.existing_scores[store]:
+            wine['vivino_score'] = self.existing_scores[store][wine['name']]
+            self.stats[store]['cached'] += 1
+            self.telemetry.count('vivino.csv_cache_hits')
+            self.writers[store].write(wine)
+        else:
+            with self.state_lock:
+                self.pending[store] += 1
+            self.enrich_queue.put((store, wine))
+
+    def scrape_store(self, store):
+        """Run one store scraper, streaming wines into the pipeline"""
+        scraper_cls = STORES[store][0]
+        streamed = set()
+
+        def on_wine(wine):
+            streamed.add(id(wine))
+            self.submit(store, wine)
+
+        try:
+            with self.telemetry.stage(f'scrape:{store}'):
+                wines = scraper_cls(telemetry=self.telemetry).get_wines(on_wine=on_wine)
+            # Mock/fallback data is returned without going through the callback
+            for wine in wines:
+                if id(wine) not in streamed:
+                    self.submit(store, wine)
+        except Exception as e:
+            self.telemetry.failure(f'scrape:{type(e).__name__}', store=store, error=str(e))
+            print(f"❌ {store} scraper failed: {e}")
+            with self.state_lock:
+                self.failed.add(store)
+        else:
+            print(f"✓ {store}: scraping finished ({self.stats[store]['scraped']} wines)")
+        with self.state_lock:
+            self.scraped.add(store)
+        self.finish_store_if_done(store)
+
+    def finish_store_if_done(self, store):
+        """Swap a store's CSV into place once it is scraped and none of its wines wait for Vivino"""
+        with self.state_lock:
+            if store in self.finished or store not in self.scraped or self.pending[store]:
+                return
+            self.finished.add(store)
+        writer = self.writers[store]
+        if store in self.failed:
+            # A partial scrape would drop the wines it missed from the CSV and the price history
+            writer.discard()
+            print(f"❌ {store}: scrape failed, kept existing {writer.csv_file}")
+            return
+        if writer.count == 0:
+            # Keep the previous CSV rather than replacing it with an empty one
+            writer.discard()
+            print(f"⚠️  {store}: no wines found, kept existing {writer.csv_file}")
+            return
+        writer.finish()
+        record_csv_snapshot(writer.csv_file, store)
+        s = self.stats[store]
+        print(f"✓ {store}: saved {writer.count} wines to {writer.csv_file} "
+              f"({s['cached']} cached scores, {s['looked_up']} Vivino lookups)")
+
+    def write_enriched(self, store, wine):
+        self.writers[store].write(wine)
+        with self.state_lock:
+            self.pending[store] -= 1
+        self.finish_store_if_done(store)
+
+    def enrich_worker(self):
+        """Single Vivino worker - one browser session shared by all stores.
+        Wines already in the local Vivino index are resolved without a search."""
+        local_index = VivinoIndex()  # Created here: SQLite connections belong to one thread
+        try:
+            with VivinoScraper(local_index=local_index, telemetry=self.telemetry) as vivino:
+                while True:
+                    item = self.enrich_queue.get()
+                    if item is _DONE:
+                        return
+                    store, wine = item
+                    print(f"[Vivino] ({self.enrich_queue.qsize()} queued) {store}: {wine['name']}")
+                    try:
+                        wine['vivino_score'] = vivino.get_score(wine['name'])
+                    except Exception as e:
+                        self.telemetry.failure(f'vivino:{type(e).__name__}', wine=wine['name'], error=str(e))
+                        wine['vivino_score'] = None
+                    print(f"  → Score: {wine['vivino_score']}")
+                    with self.state_lock:
+                        self.stats[store]['looked_up'] += 1
+                    self.write_enriched(store, wine)
+                    if not vivino.last_was_local:
+                        self.telemetry.wait(VIVINO_DELAY, 'vivino:politeness')
+        except Exception as e:
+            # No Vivino session: the wines still go into the CSVs, without a score
+            self.telemetry.failure(f'vivino:worker_{type(e).__name__}', error=str(e))
+            print(f"❌ Vivino lookups stopped ({e}); saving the remaining wines without a score")
+            while True:
+                item = self.enrich_queue.get()
+                if item is _DONE:
+                    return
+                store, wine = item
+                wine['vivino_score'] = None
+                self.write_enriched(store, wine)
+        finally:
+            local_index.close()
+
+    def run(self):
+        print("=" * 60)
+        print("CONCURRENT WINE EXPORT PIPELINE")
+        print("=" * 60)
+        start = time.time()
+
+        for store in self.stores:
+            _, csv_file, columns = STORES[store]
+            self.existing_scores[store] = load_existing_scores(csv_file)
+            print(f"✓ {store}: loaded {len(self.existing_scores[store])} existing scores")
+            self.seen_urls[store] = set()
+            self.pending[store] = 0
+            self.writers[store] = IncrementalCSVWriter(csv_file, columns)
+
+        enricher = threading.Thread(target=self.enrich_worker, name='vivino')
+        enricher.start()
+
+        scrapers = []
+        for store in self.stores:
+            t = threading.Thread(target=self.scrape_store, args=(store,), name=store)
+            t.start()
+            scrapers.append(t)
+            time.sleep(STARTUP_STAGGER)
+
+        for t in scrapers:
+            t.join()
+        self.enrich_queue.put(_DONE)
+        enricher.join()
+        # Each store's CSV was swapped in as soon as its scrape and lookups were done
+        for store in self.stores:
+            self.finish_store_if_done(store)
+
+        print("\n" + "=" * 60)
+        print(f"EXPORT COMPLETE in {(time.time() - start) / 60:.1f} minutes")
+        if self.failed:
+            print(f"❌ Failed stores (existing CSVs kept): {', '.join(sorted(self.failed))}")
+        print("=" * 60)
+        self.telemetry.finish()
+        return not self.failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape the stores and add Vivino scores")
+    parser.add_argument('--stores', nargs='+', choices=list(STORES.keys()), help="Stores to scrape (default: all)")
+    args = parser.parse_args()
+    if not ExportPipeline(args.stores).run():
+        sys.exit(1)  # The scheduler retries failed runs
@@ -4,10 +4,14 @@ Run this once to generate carrefour_wines.csv, then the app loads from the CSV.
 """
 from cf_scraper import CarrefourScraper
 from vivino_scraper import VivinoScraper
+from price_history import record_csv_snapshot
+from run_telemetry import RunTelemetry
+from wine_schema import read_wines_csv, write_wines_frame, CSV_COLUMNS
 import pandas as pd
-import time
 import os
 
+CARREFOUR_COLUMNS = [c for c in CSV_COLUMNS if c != 'store']
+
 def export_wines():
     print("=" * 60)
     print("CARREFOUR WINE EXPORT SCRIPT")
@@ -15,12 +19,14 @@ def export_wines():
     
     # Step 1: Scrape Carrefour
     print("\n[1/3] Scraping Carrefour for all wines...")
-    carrefour = CarrefourScraper()
+    telemetry = RunTelemetry('export_carrefour')
+    carrefour = CarrefourScraper(telemetry=telemetry)
     wines = carrefour.get_wines()
     print(f"✓ Found {len(wines)} wines from Carrefour")
     
     if not wines:
         print("No wines found. Exiting.")
+        telemetry.finish()
         return
 
     # Step 1.5: Load existing scores to avoid re-scraping
@@ -28,11 +34,9 @@ def export_wines():
     try:
         if os.path.exists('carrefour_wines.csv'):
             print("Loading existing scores from carrefour_wines.csv...")
-            old_df = pd.read_csv('carrefour_wines.csv')
-            if 'name' in old_df.columns and 'vivino_score' in old_df.columns:
-                for _, row in old_df.iterrows():
-                    if pd.notna(row['vivino_score']) and str(row['vivino_score']) != 'N/A':
-                        existing_scores[row['name']] = row['vivino_score']
+            for wine in read_wines_csv('carrefour_wines.csv'):
+                if wine['vivino_score'] is not None:
+                    existing_scores[wine['name']] = wine['vivino_score']
             print(f"✓ Loaded {len(existing_scores)} existing scores")
     except Exception as e:
         print(f"Could not load existing scores: {e}")
@@ -45,6 +49,7 @@ def export_wines():
     for wine in wines:
         if wine['name'] in existing_scores:
             wine['vivino_score'] = existing_scores[wine['name']]
+            telemetry.count('vivino.csv_cache_hits')
         else:
             wines_to_scrape.append(wine)
             
@@ -53,14 +58,14 @@ def export_wines():
         print("⚠️  Estimated time: {:.1f} minutes".format(len(wines_to_scrape) * 5 / 60))
     
     # Use context manager to keep browser open for all wines
-    with VivinoScraper() as vivino:
+    with VivinoScraper(telemetry=telemetry) as vivino:
         for i, wine in enumerate(wines, 1):
-            if wine.get('vivino_score') == 'N/A':
+            if wine.get('vivino_score') is None:
                 print(f"[{i}/{len(wines)}] Fetching score for: {wine['name']}")
                 score = vivino.get_score(wine['name'])
                 wine['vivino_score'] = score
                 print(f"  → Score: {score}")
-                time.sleep(2)  # Be respectful to Vivino
+                telemetry.wait(2, 'vivino:politeness')  # Be respectful to Vivino
     
     # Step 3: Save to CSV
     print("\n[3/3] Saving to carrefour_wines.csv...")
@@ -73,8 +78,10 @@ def export_wines():
     if duplicates_removed > 0:
         print(f"  Removed {duplicates_removed} duplicate wines")
     
-    df.to_csv('carrefour_wines.csv', index=False, encoding='utf-8')
+    write_wines_frame(df, 'carrefour_wines.csv', CARREFOUR_COLUMNS)
     print(f"✓ Saved {len(df)} wines to carrefour_wines.csv")
+    record_csv_snapshot('carrefour_wines.csv', 'Carrefour')
+    telemetry.finish()
     
     print("\n" + "=" * 60)
     print("EXPORT COMPLETE!")
@@ -1,25 +1,28 @@
-import pandas as pd
+from collections import defaultdict
+from data_quality import get_report
 
-# Read the CSV
-df = pd.read_csv('carrefour_wines.csv')
+# Checks come from data_quality.py (cached per version of static/wines.json).
+# A duplicate is the same store listing (store + URL) appearing more than once.
+report, _ = get_report()
+duplicates = report['issues']['duplicates']
 
-# Find duplicates (all columns)
-duplicates = df[df.duplicated(keep=False)].sort_values('name')
+groups = defaultdict(list)
+for wine in duplicates:
+    groups[(wine['store'], wine['url'] or wine['name'])].append(wine)
 
 print(f'Total duplicate rows: {len(duplicates)}')
-print(f'Total wines in file: {len(df)}')
-print(f'Unique wines: {len(df) - len(duplicates) + len(duplicates.drop_duplicates())}')
+print(f'Total wines: {report["total_wines"]}')
+print(f'Unique wines: {report["total_wines"] - len(duplicates) + len(groups)}')
 
-if len(duplicates) > 0:
+if duplicates:
     print('\n' + '='*80)
     print('DUPLICATE WINES:')
     print('='*80)
-    
-    for name, group in duplicates.groupby('name'):
-        print(f'\n"{name}" - appears {len(group)} times')
-        print(f'  Price: €{group.iloc[0]["price"]}')
-        print(f'  Type: {group.iloc[0]["type"]}')
-        print(f'  Size: {group.iloc[0]["size"]}')
-        print(f'  Line numbers: {", ".join(str(i+2) for i in group.index)}')  # +2 because of header and 0-indexing
+
+    for (store, _), group in sorted(groups.items(), key=lambda item: item[1][0]['name']):
+        print(f'\n"{group[0]["name"]}" ({store}) - appears {len(group)} times')
+        print(f'  Price: €{group[0]["price"]}')
+        print(f'  Type: {group[0]["type"]}')
+        print(f'  Size: {group[0]["size"]}')
 else:
     print('\n✅ No duplicates found!')
@@ -1,70 +1,145 @@
-import pandas as pd
+"""
+Generate wines.json
+Builds the catalog the web and mobile apps load, from the store CSVs:
+
+  static/wines.json    the full catalog, for the Flask app
+  bundle catalogs      the same catalog for the Capacitor bundles (mobile_build/wines.json,
+                       www/static/wines.json), each wine with the detail_page that
+                       static_export.py writes into that bundle
+  wines/ shards        next to each app's wines.json (static/, mobile_build/, www/static/):
+                       manifest.json   counts, a catalog version and the file and hash of every shard
+                       first.<hash>.json   the first screen, FIRST_SCREEN_SIZE best-scored wines
+                       <store>-<type>.<hash>.json   the rest of the catalog, one shard per store and type
+
+The catalog keeps the store image URLs: the cached thumbnails (image_cache.py) are only
+served by the Flask app under /img/, which adds them to its own wine cache. GitHub Pages,
+the Capacitor bundles and the static export have no /img/ route.
+
+Shard files are named by content hash, so an app only downloads the shards whose hash
+changed since its last visit, and can show the first screen before the rest arrives.
+"""
+import hashlib
 import json
 import os
+import re
+import time
+import unicodedata
+from static_export import detail_page
+from wine_schema import read_wines_csv
+
+OUTPUT_FILE = 'static/wines.json'
+SHARD_DIRS = ('static/wines',)
+# Catalog and shard directory of each bundle that gets static detail pages
+BUNDLE_CATALOGS = (('mobile_build/wines.json', 'mobile_build/wines'),
+                   ('www/static/wines.json', 'www/static/wines'))
+SHARD_MANIFEST = 'manifest.json'
+FIRST_SCREEN_SIZE = 50  # One page of the mobile list (WINES_PER_PAGE in script.js)
+
+
+def shard_slug(value):
+    ascii_value = unicodedata.normalize('NFKD', value or 'unknown').encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '-', ascii_value.lower()).strip('-') or 'unknown'
+
+
+def shard_file(name, wines):
+    """(file name, hash, bytes) of one shard"""
+    data = json.dumps(wines, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return f"{name}.{digest}.json", digest, data
+
+
+def build_shards(wines):
+    """Manifest plus the shard files it lists (file name -> bytes)"""
+    groups = {}
+    for wine in wines:
+        groups.setdefault((wine.get('store') or '', wine.get('type') or ''), []).append(wine)
+
+    files = {}
+    shards = []
+    for (store, wine_type), group in sorted(groups.items()):
+        filename, digest, data = shard_file(f"{shard_slug(store)}-{shard_slug(wine_type)}", group)
+        files[filename] = data
+        shards.append({'store': store, 'type': wine_type, 'count': len(group), 'file': filename, 'hash': digest})
+
+    # Same order as the apps' default sort (Vivino score, highest first, unknown as 0)
+    first = sorted(wines, key=lambda w: -(w.get('vivino_score') or 0))[:FIRST_SCREEN_SIZE]
+    filename, digest, data = shard_file('first', first)
+    files[filename] = data
+
+    version = hashlib.sha256(''.join(s['hash'] for s in shards).encode()).hexdigest()[:12]
+    manifest = {
+        'version': version,
+        'generated': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'total': len(wines),
+        'first': {'count': len(first), 'file': filename, 'hash': digest},
+        'shards': shards,
+    }
+    return manifest, files
+
+
+def write_shards(wines, shard_dirs=SHARD_DIRS):
+    manifest, files = build_shards(wines)
+    manifest_data = json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8')
+    for shard_dir in shard_dirs:
+        os.makedirs(shard_dir, exist_ok=True)
+        for filename, data in files.items():
+            path = os.path.join(shard_dir, filename)
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(data)
+        # The manifest goes last, so it never lists a shard that is not there yet
+        tmp_file = os.path.join(shard_dir, SHARD_MANIFEST + '.tmp')
+        with open(tmp_file, 'wb') as f:
+            f.write(manifest_data)
+        os.replace(tmp_file, os.path.join(shard_dir, SHARD_MANIFEST))
+        for filename in os.listdir(shard_dir):
+            if filename.endswith('.json') and filename != SHARD_MANIFEST and filename not in files:
+                os.remove(os.path.join(shard_dir, filename))
+    print(f"✅ Wrote {len(manifest['shards'])} shards + first screen ({manifest['first']['count']} wines) "
+          f"to {', '.join(shard_dirs)}")
+    return manifest
+
 
 def generate_json():
     print("Loading wine data from CSVs...")
     
     wines = []
     
-    # Load Carrefour wines
-    if os.path.exists('carrefour_wines.csv'):
+    # CSV -> store for files without a store column; values are parsed by wine_schema,
+    # so unknown prices and scores are null instead of 0 or "N/A"
+    for csv_file, store, label in [('carrefour_wines.csv', 'Carrefour', 'Carrefour'),
+                                   ('ah_wines.csv', None, 'Albert Heijn'),
+                                   ('manual_wines.csv', None, 'manual')]:
+        if not os.path.exists(csv_file):
+            continue
         try:
-            cf_df = pd.read_csv('carrefour_wines.csv')
-            # Add store column if it doesn't exist
-            if 'store' not in cf_df.columns:
-                cf_df['store'] = 'Carrefour'
-            cf_wines = cf_df.to_dict('records')
-            print(f"Loaded {len(cf_wines)} Carrefour wines")
-            wines.extend(cf_wines)
+            loaded = read_wines_csv(csv_file, store)
+            print(f"Loaded {len(loaded)} {label} wines")
+            wines.extend(loaded)
         except Exception as e:
-            print(f"Error loading Carrefour wines: {e}")
-            
-    # Load Albert Heijn wines
-    if os.path.exists('ah_wines.csv'):
-        try:
-            ah_df = pd.read_csv('ah_wines.csv')
-            ah_wines = ah_df.to_dict('records')
-            print(f"Loaded {len(ah_wines)} Albert Heijn wines")
-            wines.extend(ah_wines)
-        except Exception as e:
-            print(f"Error loading Albert Heijn wines: {e}")
-
-    # Load Manual wines
-    if os.path.exists('manual_wines.csv'):
-        try:
-            manual_df = pd.read_csv('manual_wines.csv')
-            manual_wines = manual_df.to_dict('records')
-            print(f"Loaded {len(manual_wines)} manual wines")
-            wines.extend(manual_wines)
-        except Exception as e:
-            print(f"Error loading manual wines: {e}")
-    
-    # Clean up data (handle NaN, ensure types)
-    cleaned_wines = []
-    for wine in wines:
-        clean_wine = {}
-        for k, v in wine.items():
-            # Handle NaN values
-            if pd.isna(v):
-                if k in ['price', 'vivino_score']:
-                    clean_wine[k] = 0
-                else:
-                    clean_wine[k] = ""
-            else:
-                clean_wine[k] = v
-        cleaned_wines.append(clean_wine)
+            print(f"Error loading {label} wines: {e}")
     
     # Save to JSON
-    output_file = 'static/wines.json'
+    output_file = OUTPUT_FILE
     try:
         with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(cleaned_wines, f, ensure_ascii=False, indent=2)
+            json.dump(wines, f, ensure_ascii=False, indent=2)
         
         print(f"✅ Successfully generated {output_file}")
-        print(f"Total wines: {len(cleaned_wines)}")
+        print(f"Total wines: {len(wines)}")
         print(f"File size: {os.path.getsize(output_file) / 1024:.2f} KB")
         
+        write_shards(wines)
+        
+        # The bundles have no /wine/<name> route: link each wine to its exported page
+        bundle_wines = [dict(wine, detail_page=detail_page(wine['name'])) for wine in wines]
+        for catalog_file, shard_dir in BUNDLE_CATALOGS:
+            os.makedirs(os.path.dirname(catalog_file), exist_ok=True)
+            with open(catalog_file, 'w', encoding='utf-8') as f:
+                json.dump(bundle_wines, f, ensure_ascii=False, indent=2)
+            print(f"✅ Successfully generated {catalog_file}")
+            write_shards(bundle_wines, (shard_dir,))
+        
     except Exception as e:
         print(f"Error saving JSON: {e}")
 
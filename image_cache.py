@@ -0,0 +1,193 @@
+"""
+Image Cache - uniform thumbnails for store product images
+Downloads every catalog image with a bounded thread pool and stores two square WebP
+variants (list thumbnail and detail image) in a content-addressed cache:
+
+    image_cache/<first 2 hex chars>/<sha1 of the WebP bytes>.webp
+
+Because a file name is the hash of its content it never changes, so Flask serves
+them with a one-year immutable Cache-Control header. image_cache/index.json maps
+source URL -> variant hashes, so already cached images are never downloaded again.
+
+Sources can be http(s) URLs, file:// URLs or local paths ('/static/...' resolves
+to the app's static folder), which keeps the pipeline testable offline.
+Images Pillow cannot read (the SVG placeholder) keep their original URL.
+
+Usage:
+    python image_cache.py    # cache the images of every wine in the store CSVs
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse, unquote
+import requests
+from PIL import Image
+from wine_schema import read_wines_csv
+
+IMAGE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_cache')
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+VARIANTS = {'thumb': 200, 'detail': 600}  # Square edge in pixels
+WEBP_QUALITY = 80
+MAX_WORKERS = 8  # Concurrent downloads - keeps us polite to the store CDNs
+DOWNLOAD_TIMEOUT = 15
+CACHE_MAX_AGE = 365 * 24 * 60 * 60
+DIGEST_RE = re.compile(r'^[0-9a-f]{40}$')
+
+STORE_FILES = [
+    ('carrefour_wines.csv', 'Carrefour'),
+    ('ah_wines.csv', 'Albert Heijn'),
+    ('manual_wines.csv', None),
+]
+
+_local = threading.local()
+
+
+def _session():
+    # requests sessions are not thread-safe, so each download thread gets its own
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+        _local.session.headers['User-Agent'] = 'Mozilla/5.0 (WineVino image cache)'
+    return _local.session
+
+
+def fetch_image(source):
+    """Raw bytes of an image from a URL, a file:// URL or a local path"""
+    parsed = urlparse(source)
+    if parsed.scheme in ('http', 'https'):
+        response = _session().get(source, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    path = unquote(parsed.path) if parsed.scheme == 'file' else source
+    if path.startswith('/static/'):
+        path = os.path.join(STATIC_DIR, path[len('/static/'):])
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def make_variant(image, edge):
+    """Fit the image in an edge x edge square on a transparent background"""
+    image = image.copy()
+    image.thumbnail((edge, edge), Image.LANCZOS)
+    canvas = Image.new('RGBA', (edge, edge), (255, 255, 255, 0))
+    canvas.paste(image, ((edge - image.width) // 2, (edge - image.height) // 2))
+    out = io.BytesIO()
+    canvas.save(out, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return out.getvalue()
+
+
+def cache_path(digest, cache_dir=IMAGE_CACHE_DIR):
+    return os.path.join(cache_dir, digest[:2], digest + '.webp')
+
+
+def store_blob(data, cache_dir=IMAGE_CACHE_DIR):
+    """Write bytes under their own hash; returns the hash"""
+    digest = hashlib.sha1(data).hexdigest()
+    path = cache_path(digest, cache_dir)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_file = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, path)
+    return digest
+
+
+def process_image(source, cache_dir=IMAGE_CACHE_DIR):
+    """Download one image and cache all variants; returns {variant: hash} or None"""
+    data = fetch_image(source)
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = image.convert('RGBA')
+    except (OSError, Image.DecompressionBombError):
+        return None  # Not a raster image Pillow can read (e.g. SVG)
+    return {name: store_blob(make_variant(image, edge), cache_dir) for name, edge in VARIANTS.items()}
+
+
+class ImageCache:
+    def __init__(self, cache_dir=IMAGE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index_file = os.path.join(cache_dir, 'index.json')
+        self.index = self.load_index()
+
+    def load_index(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except ValueError:
+                pass
+        return {}
+
+    def save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=0, sort_keys=True)
+        os.replace(tmp_file, self.index_file)
+
+    def is_cached(self, source):
+        """True if the source was processed before and its files still exist
+        (None means it was processed but is not a raster image)"""
+        if source not in self.index:
+            return False
+        entry = self.index[source]
+        return entry is None or all(os.path.exists(cache_path(d, self.cache_dir)) for d in entry.values())
+
+    def prefetch(self, sources, max_workers=MAX_WORKERS):
+        """Cache every source that is not cached yet; returns (cached, failed) counts"""
+        todo = sorted({s for s in sources if s and not self.is_cached(s)})
+        cached = failed = 0
+        if not todo:
+            return cached, failed
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(process_image, source, self.cache_dir): source for source in todo}
+            for i, future in enumerate(as_completed(futures), 1):
+                source = futures[future]
+                try:
+                    self.index[source] = future.result()
+                    cached += 1
+                except Exception as e:
+                    failed += 1
+                    print(f"  ⚠️ {source}: {e}")
+                if i % 100 == 0:
+                    print(f"  {i}/{len(todo)} images processed")
+                    self.save_index()  # Keep progress if interrupted
+        self.save_index()
+        return cached, failed
+
+    def variant_url(self, source, variant):
+        """URL of a cached variant, or None if the image is not cached"""
+        entry = self.index.get(source)
+        if not entry or variant not in entry:
+            return None
+        return f"/img/{entry[variant]}.webp"
+
+
+def attach_image_urls(wines, cache=None):
+    """Add thumbnail_url and detail_image_url to each wine (the original image_url is kept)"""
+    cache = cache or ImageCache()
+    for wine in wines:
+        wine['thumbnail_url'] = cache.variant_url(wine.get('image_url'), 'thumb') or wine.get('image_url')
+        wine['detail_image_url'] = cache.variant_url(wine.get('image_url'), 'detail') or wine.get('image_url')
+    return wines
+
+
+def main():
+    sources = []
+    for csv_file, store in STORE_FILES:
+        sources.extend(w['image_url'] for w in read_wines_csv(csv_file, store))
+    cache = ImageCache()
+    unique = set(sources)
+    print(f"Caching images for {len(sources)} wines ({len(unique)} unique images)...")
+    cached, failed = cache.prefetch(unique)
+    print(f"✓ {cached} images cached, {failed} failed, {len(unique) - cached - failed} already cached")
+    print(f"✓ Cache: {IMAGE_CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Request Metrics
+In-process metrics for the Flask app, exposed in the Prometheus text format on /metrics:
+
+  winevino_request_duration_seconds  histogram per route, method and status
+  winevino_response_size_bytes       histogram per route
+  winevino_cache_requests_total      wine and pairings cache hits and misses
+  winevino_refresh_duration_seconds  histogram of wine cache refreshes
+  winevino_wines_cached              wines currently in the cache
+
+Routes are labelled by their URL rule (/wine/<path:wine_name>), never by the raw path,
+so the number of series stays fixed.
+
+Slow request profiling is opt-in. With WINEVINO_PROFILE_SLOW_MS set, a sample of requests
+(WINEVINO_PROFILE_SAMPLE, default 0.1) runs under cProfile, and every profiled request
+slower than the threshold is saved to profiles/ as a .prof file (open with snakeviz or
+pstats) plus a text summary of the top functions. Only one request is profiled at a time.
+
+Usage:
+    WINEVINO_PROFILE_SLOW_MS=200 python app.py
+    curl localhost:5000/metrics
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from flask import g, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000)
+REFRESH_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+PROFILE_DIR = 'profiles'
+PROFILE_SLOW_MS = float(os.environ.get('WINEVINO_PROFILE_SLOW_MS', 0))  # 0 = profiling off
+PROFILE_SAMPLE = float(os.environ.get('WINEVINO_PROFILE_SAMPLE', 0.1))
+PROFILE_TOP_FUNCTIONS = 30
+
+_lock = threading.Lock()
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name, self.help_text, self.label_names = name, help_text, label_names
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[n] for n in self.label_names)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(dict(zip(self.label_names, key)))} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        key = tuple(labels[n] for n in self.label_names)
+        with _lock:
+            self.values[key] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name, self.help_text, self.label_names = name, help_text, label_names
+        self.buckets = tuple(buckets)
+        self.series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(labels[n] for n in self.label_names)
+        with _lock:
+            series = self.series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.series.items()):
+            labels = dict(zip(self.label_names, key))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': bound})} {count}")
+            lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': '+Inf'})} {series[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {series[-1]}")
+        return lines
+
+
+REQUEST_DURATION = Histogram('winevino_request_duration_seconds', 'Request latency',
+                             LATENCY_BUCKETS, ('route', 'method', 'status'))
+RESPONSE_SIZE = Histogram('winevino_response_size_bytes', 'Response body size', SIZE_BUCKETS, ('route',))
+CACHE_REQUESTS = Counter('winevino_cache_requests_total', 'Cache lookups', ('cache', 'result'))
+REFRESH_DURATION = Histogram('winevino_refresh_duration_seconds', 'Wine cache refresh duration', REFRESH_BUCKETS)
+WINES_CACHED = Gauge('winevino_wines_cached', 'Wines in the cache')
+METRICS = [REQUEST_DURATION, RESPONSE_SIZE, CACHE_REQUESTS, REFRESH_DURATION, WINES_CACHED]
+
+
+def cache_hit(cache):
+    CACHE_REQUESTS.inc(cache=cache, result='hit')
+
+
+def cache_miss(cache):
+    CACHE_REQUESTS.inc(cache=cache, result='miss')
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# --- Slow request profiling ---
+
+_profile_lock = threading.Lock()
+
+
+def save_profile(profiler, route, duration_ms):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    base = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{slug}_{duration_ms:.0f}ms")
+    profiler.dump_stats(base + '.prof')
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+    with open(base + '.txt', 'w', encoding='utf-8') as f:
+        f.write(f"{request.method} {request.full_path} took {duration_ms:.0f} ms\n\n")
+        f.write(summary.getvalue())
+    print(f"⚠️ Slow request {request.method} {request.path} ({duration_ms:.0f} ms), profile saved to {base}.prof")
+
+
+def init_app(app):
+    """Time every request, and profile a sample of them when WINEVINO_PROFILE_SLOW_MS is set"""
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        g.profiler = None
+        # cProfile allows one active profiler per process, so concurrent requests are skipped
+        if PROFILE_SLOW_MS and random.random() < PROFILE_SAMPLE and _profile_lock.acquire(blocking=False):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_DURATION.observe(duration, route=route, method=request.method, status=str(response.status_code))
+        if not response.direct_passthrough:  # Streamed files have no body in memory
+            RESPONSE_SIZE.observe(response.calculate_content_length() or 0, route=route)
+
+        profiler = g.pop('profiler', None)
+        if profiler:
+            profiler.disable()
+            try:
+                if duration * 1000 >= PROFILE_SLOW_MS:
+                    save_profile(profiler, route, duration * 1000)
+            finally:
+                _profile_lock.release()
+        return response
+
+    @app.teardown_request
+    def release_profiler(exc):
+        # after_request does not run when a view raises
+        profiler = g.pop('profiler', None)
+        if profiler:
+            profiler.disable()
+            _profile_lock.release()
@@ -22,6 +22,10 @@ document.addEventListener('DOMContentLoaded', () => {
     const DATA_URL = 'https://macdudu2014.github.io/winevino/mobile_build/wines.json';
     const CACHE_KEY = 'winevinoCachedDataV3'; // Changed to force cache refresh
     const CACHE_TIMESTAMP_KEY = 'winevinoCacheTimestampV3'; // Changed to force cache refresh
+    // Catalog split into shards by generate_wines_json.py (null: load DATA_URL in one piece)
+    const SHARDS_URL = 'https://macdudu2014.github.io/winevino/mobile_build/wines/manifest.json';
+    const MANIFEST_KEY = 'winevinoShardManifestV2';
+    const SHARD_KEY_PREFIX = 'winevinoShardV2:'; // + shard file name, one localStorage entry per shard
     const CACHE_DURATION = 24 * 60 * 60 * 1000; // 24 hours
 
     let allWines = [];
@@ -29,6 +33,8 @@ document.addEventListener('DOMContentLoaded', () => {
     let currentStore = 'all';
     let currentPairing = null;
     let currentSort = 'score'; // Default sort
+    const loadedShards = {}; // Shard file -> its wines, parsed at most once per page view
+    let loadGeneration = 0; // Bumped by every fetchWines, so a slower earlier load never overwrites a newer one
 
     // Pagination for performance
     let currentPage = 1;
@@ -230,67 +236,156 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     async function fetchWines() {
+        const generation = ++loadGeneration;
         try {
-            let data = [];
-
-            // Check cache first
-            const cachedData = localStorage.getItem(CACHE_KEY);
-            const cacheTimestamp = localStorage.getItem(CACHE_TIMESTAMP_KEY);
             const now = Date.now();
 
-            if (cachedData && cacheTimestamp && (now - parseInt(cacheTimestamp)) < CACHE_DURATION) {
-                console.log('Using cached data');
-                data = JSON.parse(cachedData);
-            } else {
-                console.log('Fetching fresh data from server');
-                // Add timestamp to prevent browser caching of the JSON file itself
-                const response = await fetch(`${DATA_URL}?t=${now}`);
-                if (!response.ok) throw new Error('Network response was not ok');
-                data = await response.json();
-
-                // Cache the data
-                localStorage.setItem(CACHE_KEY, JSON.stringify(data));
-                localStorage.setItem(CACHE_TIMESTAMP_KEY, now.toString());
+            if (SHARDS_URL) {
+                try {
+                    await loadShards(now, generation);
+                    return;
+                } catch (err) {
+                    console.warn('Loading shards failed, loading the full catalog', err);
+                }
             }
 
-            allWines = data;
+            const data = await fetchCatalog(now);
+            if (generation === loadGeneration) showWines(data);
 
-            // Enrich wines with local storage data (pairings)
-            const localPairings = JSON.parse(localStorage.getItem('winePairings') || '{}');
-            const personalScores = JSON.parse(localStorage.getItem('personalScores') || '{}');
+            // Loading spinner is removed by renderWines clearing the container
+        } catch (error) {
+            console.error('Error fetching wines:', error);
+            wineList.innerHTML = `<p class="error">Failed to load wines: ${error.message}. Please check your connection.</p>`;
+        }
+    }
 
-            allWines = allWines.map(wine => {
-                if (localPairings[wine.name]) {
-                    wine.pairings = localPairings[wine.name].pairings || [];
-                    wine.description = localPairings[wine.name].description || '';
-                }
-                wine.personalScore = personalScores[wine.name] || 0;
-                return wine;
-            });
+    // The whole catalog in one piece (DATA_URL), cached in localStorage for CACHE_DURATION
+    async function fetchCatalog(now) {
+        const cachedData = localStorage.getItem(CACHE_KEY);
+        const cacheTimestamp = localStorage.getItem(CACHE_TIMESTAMP_KEY);
 
-            // Client-side filtering by store
-            if (currentStore !== 'all') {
-                allWines = allWines.filter(w => w.store && w.store.toLowerCase() === currentStore.toLowerCase());
-            }
+        if (cachedData && cacheTimestamp && (now - parseInt(cacheTimestamp)) < CACHE_DURATION) {
+            console.log('Using cached data');
+            return JSON.parse(cachedData);
+        }
+
+        console.log('Fetching fresh data from server');
+        // Add timestamp to prevent browser caching of the JSON file itself
+        const response = await fetch(`${DATA_URL}?t=${now}`);
+        if (!response.ok) throw new Error('Network response was not ok');
+        const data = await response.json();
+
+        // Cache the data
+        localStorage.setItem(CACHE_KEY, JSON.stringify(data));
+        localStorage.setItem(CACHE_TIMESTAMP_KEY, now.toString());
+        return data;
+    }
+
+    // The shard manifest, fetched again after CACHE_DURATION; cached shards it no longer lists are dropped
+    async function fetchManifest(now) {
+        const cachedManifest = localStorage.getItem(MANIFEST_KEY);
+        const cacheTimestamp = localStorage.getItem(CACHE_TIMESTAMP_KEY);
+
+        if (cachedManifest && cacheTimestamp && (now - parseInt(cacheTimestamp)) < CACHE_DURATION) {
+            return JSON.parse(cachedManifest);
+        }
+
+        console.log('Fetching fresh shard manifest from server');
+        const response = await fetch(`${SHARDS_URL}?t=${now}`);
+        if (!response.ok) throw new Error('Shard manifest not available');
+        const manifest = await response.json();
+
+        const listed = new Set([manifest.first.file, ...manifest.shards.map(shard => shard.file)]);
+        Object.keys(localStorage)
+            .filter(key => key.startsWith(SHARD_KEY_PREFIX) && !listed.has(key.slice(SHARD_KEY_PREFIX.length)))
+            .forEach(key => localStorage.removeItem(key));
+        // The one-piece copy and the old hash list are not needed next to the shards
+        localStorage.removeItem(CACHE_KEY);
+        localStorage.removeItem('winevinoShardHashesV1');
+
+        localStorage.setItem(MANIFEST_KEY, JSON.stringify(manifest));
+        localStorage.setItem(CACHE_TIMESTAMP_KEY, now.toString());
+        return manifest;
+    }
+
+    // Shard files are named by content hash, so a cached copy is valid for as long as the
+    // manifest lists it. Each shard is parsed once per page view and kept in loadedShards.
+    async function readShard(file) {
+        if (loadedShards[file]) return loadedShards[file];
+
+        const cached = localStorage.getItem(SHARD_KEY_PREFIX + file);
+        if (cached) {
+            // Give the browser a turn between shards, so reading them does not freeze the page
+            await new Promise(resolve => setTimeout(resolve));
+            loadedShards[file] = JSON.parse(cached);
+            return loadedShards[file];
+        }
+
+        const baseUrl = SHARDS_URL.slice(0, SHARDS_URL.lastIndexOf('/') + 1);
+        const response = await fetch(baseUrl + file);
+        if (!response.ok) throw new Error(`Shard ${file} not available`);
+        const text = await response.text();
+        loadedShards[file] = JSON.parse(text);
+        try {
+            localStorage.setItem(SHARD_KEY_PREFIX + file, text);
+        } catch (err) {
+            console.warn(`Not caching shard ${file}`, err); // Storage full: downloaded again next time
+        }
+        return loadedShards[file];
+    }
+
+    // Show the first-screen shard (best scores) as soon as it is there, then read the shards
+    // the current store tab needs; other stores' shards are only read when their tab is opened
+    async function loadShards(now, generation) {
+        const manifest = await fetchManifest(now);
+        const shards = manifest.shards.filter(shard =>
+            currentStore === 'all' || (shard.store || '').toLowerCase() === currentStore.toLowerCase()
+        );
+
+        if (currentSort === 'score' && currentStore === 'all' && !shards.every(shard => loadedShards[shard.file])) {
+            const first = await readShard(manifest.first.file);
+            if (generation !== loadGeneration) return;
+            showWines(first);
+        }
+
+        const wines = await Promise.all(shards.map(shard => readShard(shard.file)));
+        if (generation !== loadGeneration) return; // A newer fetchWines (store tab, sort) took over
+        showWines(wines.flat());
+    }
+
+    function showWines(data) {
+        allWines = data;
 
-            // Client-side sorting
-            if (currentSort === 'personal-score') {
-                allWines.sort((a, b) => (b.personalScore || 0) - (a.personalScore || 0));
-            } else if (currentSort === 'price-low') {
-                allWines.sort((a, b) => parseFloat(a.price) - parseFloat(b.price));
-            } else if (currentSort === 'price-high') {
-                allWines.sort((a, b) => parseFloat(b.price) - parseFloat(a.price));
-            } else if (currentSort === 'score') {
-                allWines.sort((a, b) => parseFloat(b.vivino_score || 0) - parseFloat(a.vivino_score || 0));
+        // Enrich wines with local storage data (pairings)
+        const localPairings = JSON.parse(localStorage.getItem('winePairings') || '{}');
+        const personalScores = JSON.parse(localStorage.getItem('personalScores') || '{}');
+
+        allWines = allWines.map(wine => {
+            if (localPairings[wine.name]) {
+                wine.pairings = localPairings[wine.name].pairings || [];
+                wine.description = localPairings[wine.name].description || '';
             }
+            wine.personalScore = personalScores[wine.name] || 0;
+            return wine;
+        });
 
-            applyFilters();
+        // Client-side filtering by store
+        if (currentStore !== 'all') {
+            allWines = allWines.filter(w => w.store && w.store.toLowerCase() === currentStore.toLowerCase());
+        }
 
-            // Loading spinner is removed by renderWines clearing the container
-        } catch (error) {
-            console.error('Error fetching wines:', error);
-            wineList.innerHTML = `<p class="error">Failed to load wines: ${error.message}. Please check your connection.</p>`;
+        // Client-side sorting
+        if (currentSort === 'personal-score') {
+            allWines.sort((a, b) => (b.personalScore || 0) - (a.personalScore || 0));
+        } else if (currentSort === 'price-low') {
+            allWines.sort((a, b) => (a.price ?? Infinity) - (b.price ?? Infinity));
+        } else if (currentSort === 'price-high') {
+            allWines.sort((a, b) => (b.price ?? -Infinity) - (a.price ?? -Infinity));
+        } else if (currentSort === 'score') {
+            allWines.sort((a, b) => parseFloat(b.vivino_score || 0) - parseFloat(a.vivino_score || 0));
         }
+
+        applyFilters();
     }
 
     function renderWines(wines, append = false) {
@@ -354,12 +449,12 @@ document.addEventListener('DOMContentLoaded', () => {
                         </a>
                     </div>
                     <div class="wine-meta">
-                        <span class="vivino-score"><i class="fas fa-star"></i> ${wine.vivino_score}</span>
+                        <span class="vivino-score"><i class="fas fa-star"></i> ${wine.vivino_score ?? 'N/A'}</span>
                         ${pairingsHtml}
                     </div>
                     <h3>${wine.name}</h3>
                     <div class="wine-footer">
-                        <span class="wine-price">€${wine.price}</span>
+                        <span class="wine-price">${wine.price != null ? '€' + wine.price : 'N/A'}</span>
                     </div>
                 </div>
             `;
@@ -367,7 +462,7 @@ document.addEventListener('DOMContentLoaded', () => {
             // Make entire card clickable
             card.addEventListener('click', (e) => {
                 // Use query parameter for standalone detail page
-                window.location.href = `detail.html?name=${encodeURIComponent(wine.name)}`;
+                window.location.href = wine.detail_page || `detail.html?name=${encodeURIComponent(wine.name)}`;
             });
 
             wineList.appendChild(card);
@@ -441,18 +536,18 @@ document.addEventListener('DOMContentLoaded', () => {
                                 </a>
                             </div>
                             <div class="wine-meta">
-                                <span class="vivino-score"><i class="fas fa-star"></i> ${wine.vivino_score}</span>
+                                <span class="vivino-score"><i class="fas fa-star"></i> ${wine.vivino_score ?? 'N/A'}</span>
                                 ${pairingsHtml}
                             </div>
                             <h3>${wine.name}</h3>
                             <div class="wine-footer">
-                                <span class="wine-price">€${wine.price}</span>
+                                <span class="wine-price">${wine.price != null ? '€' + wine.price : 'N/A'}</span>
                             </div>
                         </div>
                     `;
 
                     card.addEventListener('click', (e) => {
-                        window.location.href = `detail.html?name=${encodeURIComponent(wine.name)}`;
+                        window.location.href = wine.detail_page || `detail.html?name=${encodeURIComponent(wine.name)}`;
                     });
 
                     wineList.appendChild(card);
@@ -0,0 +1,195 @@
+"""
+Price History - time series of store prices per wine URL (SQLite)
+Every scrape is recorded as a snapshot. Prices are stored as change points only
+(a row when a wine appears or its price changes), so a year of daily snapshots
+stays small, and history lookups use the (url, scraped_at) index.
+
+Each snapshot reports new, removed, price-dropped and price-raised wines.
+A deal is a wine whose current price is at least PROMO_MIN_DROP below the highest
+price it had in the last PROMO_LOOKBACK_DAYS.
+
+Usage:
+    python price_history.py                  # record the current store CSVs as a snapshot
+    python price_history.py deals            # list current deals
+    python price_history.py history "<url>"  # price history of one wine
+"""
+import sqlite3
+import sys
+import time
+from wine_schema import read_wines_csv
+
+PRICE_DB = 'price_history.db'
+STORE_FILES = [
+    ('carrefour_wines.csv', 'Carrefour'),
+    ('ah_wines.csv', 'Albert Heijn'),
+]
+
+PROMO_MIN_DROP = 0.10  # 10% below the recent regular price
+PROMO_LOOKBACK_DAYS = 60
+
+
+class PriceHistory:
+    def __init__(self, db_path=PRICE_DB):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                store TEXT NOT NULL,
+                scraped_at REAL NOT NULL,
+                wine_count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS wines (
+                url TEXT PRIMARY KEY,
+                store TEXT NOT NULL,
+                name TEXT,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                price_cents INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS prices (
+                url TEXT NOT NULL,
+                scraped_at REAL NOT NULL,
+                price_cents INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_prices_url_time ON prices (url, scraped_at);
+            CREATE INDEX IF NOT EXISTS idx_wines_store_seen ON wines (store, last_seen);
+        """)
+        self.conn.commit()
+
+    def record_snapshot(self, store, wines, scraped_at=None):
+        """Record one scrape of a store (normalized wine dicts) and return the changes:
+        {'new': [...], 'removed': [...], 'price_dropped': [...], 'price_raised': [...]}"""
+        scraped_at = scraped_at or time.time()
+        known = {url: (name, price) for url, name, price in self.conn.execute(
+            "SELECT url, name, price_cents FROM wines WHERE store = ?", (store,))}
+        previous = self.conn.execute(
+            "SELECT MAX(scraped_at) FROM snapshots WHERE store = ?", (store,)).fetchone()[0]
+
+        changes = {'new': [], 'removed': [], 'price_dropped': [], 'price_raised': []}
+        seen = set()
+        price_rows = []
+        upserts = []
+        for wine in wines:
+            url = wine.get('url')
+            if not url or url == '#' or url in seen:
+                continue
+            seen.add(url)
+            price = wine.get('price_cents')
+            entry = {'url': url, 'name': wine['name'], 'price_cents': price}
+            if url not in known:
+                changes['new'].append(entry)
+                price_rows.append((url, scraped_at, price))
+            elif known[url][1] != price:
+                old_price = known[url][1]
+                entry['old_price_cents'] = old_price
+                if price is not None and old_price is not None:
+                    changes['price_dropped' if price < old_price else 'price_raised'].append(entry)
+                price_rows.append((url, scraped_at, price))
+            upserts.append((url, store, wine['name'], scraped_at, scraped_at, price))
+
+        # Wines that were in the previous snapshot but not in this one
+        if previous is not None:
+            for url, name, price in self.conn.execute(
+                    "SELECT url, name, price_cents FROM wines WHERE store = ? AND last_seen = ?", (store, previous)):
+                if url not in seen:
+                    changes['removed'].append({'url': url, 'name': name, 'price_cents': price})
+
+        with self.conn:
+            self.conn.executemany("INSERT INTO prices (url, scraped_at, price_cents) VALUES (?, ?, ?)", price_rows)
+            self.conn.executemany("""
+                INSERT INTO wines (url, store, name, first_seen, last_seen, price_cents) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    name = excluded.name, last_seen = excluded.last_seen, price_cents = excluded.price_cents
+            """, upserts)
+            self.conn.execute("INSERT INTO snapshots (store, scraped_at, wine_count) VALUES (?, ?, ?)",
+                              (store, scraped_at, len(seen)))
+        return changes
+
+    def history(self, url):
+        """Price change points for one wine: {'url', 'name', 'first_seen', 'last_seen', 'points': [(time, cents)]}"""
+        wine = self.conn.execute(
+            "SELECT name, store, first_seen, last_seen FROM wines WHERE url = ?", (url,)).fetchone()
+        if not wine:
+            return None
+        points = self.conn.execute(
+            "SELECT scraped_at, price_cents FROM prices WHERE url = ? ORDER BY scraped_at", (url,)).fetchall()
+        return {'url': url, 'name': wine[0], 'store': wine[1], 'first_seen': wine[2], 'last_seen': wine[3],
+                'points': points}
+
+    def last_snapshot(self, store):
+        """Time of the latest snapshot of a store (None if it was never scraped)"""
+        return self.conn.execute("SELECT MAX(scraped_at) FROM snapshots WHERE store = ?", (store,)).fetchone()[0]
+
+    def deals(self, store=None, min_drop=PROMO_MIN_DROP, lookback_days=PROMO_LOOKBACK_DAYS, limit=50):
+        """Wines from the latest snapshot of their store priced at least min_drop below
+        their highest price in the lookback window, biggest drop first"""
+        since = time.time() - lookback_days * 24 * 60 * 60
+        # The regular price is the highest price in force during the window: change points
+        # inside it, plus the price that was current when the window started
+        rows = self.conn.execute("""
+            WITH latest AS (SELECT store, MAX(scraped_at) AS scraped_at FROM snapshots GROUP BY store),
+            regular AS (
+                SELECT p.url, MAX(p.price_cents) AS price_cents FROM prices p
+                WHERE p.scraped_at >= ? OR p.scraped_at = (
+                    SELECT MAX(p2.scraped_at) FROM prices p2 WHERE p2.url = p.url AND p2.scraped_at < ?)
+                GROUP BY p.url
+            )
+            SELECT w.url, w.name, w.store, w.price_cents, r.price_cents
+            FROM wines w
+            JOIN latest l ON l.store = w.store AND l.scraped_at = w.last_seen
+            JOIN regular r ON r.url = w.url
+            WHERE w.price_cents IS NOT NULL AND r.price_cents > 0
+              AND w.price_cents <= r.price_cents * (1 - ?)
+              AND (? IS NULL OR w.store = ?)
+            ORDER BY 1.0 * w.price_cents / r.price_cents
+            LIMIT ?
+        """, (since, since, min_drop, store, store, limit)).fetchall()
+        return [{'url': url, 'name': name, 'store': store_name, 'price_cents': price,
+                 'regular_price_cents': regular, 'drop_pct': round(100 * (1 - price / regular), 1)}
+                for url, name, store_name, price, regular in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+def print_changes(store, changes):
+    print(f"✓ Price history ({store}): {len(changes['new'])} new, {len(changes['removed'])} removed, "
+          f"{len(changes['price_dropped'])} price drops, {len(changes['price_raised'])} price rises")
+    for wine in changes['price_dropped'][:10]:
+        print(f"  ↓ {wine['name']}: €{wine['old_price_cents'] / 100:.2f} → €{wine['price_cents'] / 100:.2f}")
+
+
+def record_csv_snapshot(csv_file, store, history=None):
+    """Record the current contents of a store CSV as a snapshot"""
+    own_history = history is None
+    history = history or PriceHistory()
+    try:
+        changes = history.record_snapshot(store, read_wines_csv(csv_file, store))
+        print_changes(store, changes)
+        return changes
+    finally:
+        if own_history:
+            history.close()
+
+
+if __name__ == "__main__":
+    history = PriceHistory()
+    if len(sys.argv) > 1 and sys.argv[1] == 'deals':
+        for deal in history.deals():
+            print(f"-{deal['drop_pct']}% {deal['name']} ({deal['store']}): "
+                  f"€{deal['price_cents'] / 100:.2f} instead of €{deal['regular_price_cents'] / 100:.2f}")
+    elif len(sys.argv) > 2 and sys.argv[1] == 'history':
+        wine = history.history(sys.argv[2])
+        if not wine:
+            print("Wine not found")
+        else:
+            print(wine['name'])
+            for scraped_at, price in wine['points']:
+                price_text = 'unknown' if price is None else f"€{price / 100:.2f}"
+                print(f"  {time.strftime('%Y-%m-%d %H:%M', time.localtime(scraped_at))}: {price_text}")
+    else:
+        for csv_file, store in STORE_FILES:
+            record_csv_snapshot(csv_file, store, history)
+    history.close()
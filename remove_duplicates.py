@@ -1,21 +1,16 @@
 import pandas as pd
+from wine_schema import read_wines_frame, write_wines_frame
 
-# Remove duplicates from carrefour_wines.csv
-print("Cleaning carrefour_wines.csv...")
-df_carrefour = pd.read_csv('carrefour_wines.csv')
-original_count = len(df_carrefour)
-df_carrefour = df_carrefour.drop_duplicates()
-df_carrefour.to_csv('carrefour_wines.csv', index=False)
-print(f"  Removed {original_count - len(df_carrefour)} duplicates")
-print(f"  {len(df_carrefour)} wines remaining")
+# Remove duplicates from the store CSVs. Rows are compared after parsing, so "6,99" and
+# "6.99" or "N/A" and an empty score count as the same value.
+for csv_file in ['carrefour_wines.csv', 'ah_wines.csv']:
+    print(f"Cleaning {csv_file}...")
+    columns = list(pd.read_csv(csv_file, nrows=0).columns)  # Keep the file's own columns
+    df = read_wines_frame(csv_file)
+    original_count = len(df)
+    df = df.drop_duplicates()
+    write_wines_frame(df, csv_file, columns)
+    print(f"  Removed {original_count - len(df)} duplicates")
+    print(f"  {len(df)} wines remaining\n")
 
-# Remove duplicates from ah_wines.csv
-print("\nCleaning ah_wines.csv...")
-df_ah = pd.read_csv('ah_wines.csv')
-original_count = len(df_ah)
-df_ah = df_ah.drop_duplicates()
-df_ah.to_csv('ah_wines.csv', index=False)
-print(f"  Removed {original_count - len(df_ah)} duplicates")
-print(f"  {len(df_ah)} wines remaining")
-
-print("\n✅ All duplicates removed!")
+print("✅ All duplicates removed!")
@@ -0,0 +1,188 @@
+"""
+Run Telemetry - structured timings for scrape and enrichment runs
+Every run appends JSON lines to run_log.jsonl (one per event, all tagged with the run id)
+and ends with a summary event plus a short console report:
+
+  stages     - time per stage (per store category crawl, cookie banner, parsing, ...)
+  counters   - clicks, products, Vivino cache hits, failures by reason, ...
+  waits      - seconds spent in deliberate sleeps, per stage
+  latencies  - percentiles of sampled values (Vivino lookup time, match ratio)
+
+The log file is opened once per run and written through a buffer, so recording an
+event costs no more than a dict and a json.dumps.
+
+Usage:
+    telemetry = RunTelemetry('export')
+    with telemetry.stage('crawl:rode-wijn'):
+        telemetry.wait(2, 'crawl:rode-wijn')
+        telemetry.count('clicks')
+    telemetry.observe('vivino_lookup_s', 0.812)
+    telemetry.failure('vivino:no_match', wine='...')
+    telemetry.finish()   # writes the summary and prints the report
+
+    python run_telemetry.py            # report of the last run in run_log.jsonl
+"""
+import json
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+RUN_LOG_FILE = 'run_log.jsonl'
+SLOW_STAGE_SHARE = 0.25  # Stages taking more than a quarter of the run are flagged
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None when empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class RunTelemetry:
+    def __init__(self, run_name, log_file=RUN_LOG_FILE):
+        """log_file=None keeps the telemetry in memory only"""
+        self.run_name = run_name
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.stages = defaultdict(list)     # stage -> durations in seconds
+        self.counters = defaultdict(float)
+        self.waits = defaultdict(float)     # stage -> seconds slept
+        self.samples = defaultdict(list)    # name -> values
+        self.log_file = log_file
+        self.f = open(log_file, 'a', encoding='utf-8') if log_file else None
+        self.event('run_start')
+
+    def event(self, kind, **fields):
+        """Append one event to the run log"""
+        if not self.f:
+            return
+        record = {'run_id': self.run_id, 'run': self.run_name, 'ts': round(time.time(), 3), 'event': kind}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self.lock:
+            if self.f:
+                self.f.write(line + '\n')
+
+    def flush(self):
+        """Push buffered events to the log (for long-running processes)"""
+        with self.lock:
+            if self.f:
+                self.f.flush()
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """Time a block of work"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start, **fields)
+
+    def record_stage(self, name, duration, **fields):
+        """Add a stage timed by the caller (seconds)"""
+        with self.lock:
+            self.stages[name].append(duration)
+        self.event('stage', stage=name, duration_s=round(duration, 3), **fields)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def wait(self, seconds, stage='other'):
+        """time.sleep() that is accounted as waiting time of a stage"""
+        time.sleep(seconds)
+        with self.lock:
+            self.waits[stage] += seconds
+
+    def observe(self, name, value):
+        """Record one sample (e.g. a lookup latency) for percentiles"""
+        with self.lock:
+            self.samples[name].append(value)
+
+    def failure(self, reason, **fields):
+        self.count(f'failures.{reason}')
+        self.event('failure', reason=reason, **fields)
+
+    def summary(self):
+        with self.lock:
+            duration = time.time() - self.started
+            stages = {name: {'count': len(d), 'total_s': round(sum(d), 3), 'max_s': round(max(d), 3),
+                             'wait_s': round(self.waits.get(name, 0), 3)}
+                      for name, d in self.stages.items()}
+            counters = {name: int(v) if float(v).is_integer() else round(v, 3) for name, v in self.counters.items()}
+            latencies = {name: {'count': len(v), 'p50': percentile(v, 50), 'p90': percentile(v, 90),
+                                'p99': percentile(v, 99), 'max': max(v)}
+                         for name, v in self.samples.items() if v}
+            waits = {name: round(v, 3) for name, v in self.waits.items()}
+        products = counters.get('products', 0)
+        return {
+            'run_id': self.run_id,
+            'run': self.run_name,
+            'duration_s': round(duration, 3),
+            'products_per_s': round(products / duration, 3) if duration else None,
+            'stages': stages,
+            'counters': counters,
+            'waits': waits,
+            'latencies': latencies,
+        }
+
+    def finish(self):
+        """Write the summary event, print the report and close the log"""
+        summary = self.summary()
+        self.event('summary', **{k: v for k, v in summary.items() if k not in ('run_id', 'run')})
+        with self.lock:
+            if self.f:
+                self.f.close()
+                self.f = None
+        print_report(summary)
+        return summary
+
+
+def print_report(summary):
+    duration = summary['duration_s'] or 1
+    print(f"\n📊 Run report: {summary['run']} ({summary['run_id']}), {summary['duration_s'] / 60:.1f} minutes")
+    if summary['stages']:
+        print("  Stages (slowest first):")
+        for name, s in sorted(summary['stages'].items(), key=lambda item: -item[1]['total_s']):
+            flag = '🐢' if s['total_s'] >= duration * SLOW_STAGE_SHARE else '  '
+            wait = f", {s['wait_s']:.1f}s waiting" if s['wait_s'] else ''
+            print(f"   {flag} {name:<32} {s['total_s']:>8.1f}s  ({s['count']}x, max {s['max_s']:.1f}s{wait})")
+    for name, l in sorted(summary['latencies'].items()):
+        print(f"  {name}: p50 {l['p50']:.2f}, p90 {l['p90']:.2f}, p99 {l['p99']:.2f}, max {l['max']:.2f} "
+              f"({l['count']} samples)")
+    failures = {k: v for k, v in summary['counters'].items() if k.startswith('failures.')}
+    others = {k: v for k, v in summary['counters'].items() if not k.startswith('failures.')}
+    if others:
+        print("  " + ", ".join(f"{k}: {v}" for k, v in sorted(others.items())))
+    if summary['products_per_s']:
+        print(f"  Throughput: {summary['products_per_s']:.2f} products/s")
+    if failures:
+        print("  ⚠️ Failures: " + ", ".join(f"{k[len('failures.'):]}: {v}" for k, v in sorted(failures.items())))
+
+
+def last_summary(log_file=RUN_LOG_FILE):
+    """Summary event of the most recent finished run in the log"""
+    if not os.path.exists(log_file):
+        return None
+    found = None
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if '"event": "summary"' in line:
+                found = line
+    return json.loads(found) if found else None
+
+
+if __name__ == "__main__":
+    summary = last_summary(sys.argv[1] if len(sys.argv) > 1 else RUN_LOG_FILE)
+    if summary:
+        print_report(summary)
+    else:
+        print("No finished runs in the run log")
@@ -0,0 +1,411 @@
+"""
+Refresh Scheduler
+Keeps the catalog fresh without running the scripts by hand. A long-running loop runs the
+data jobs as a dependency chain, each as its own process:
+
+  crawl:carrefour, crawl:ah   store scrape + Vivino scores of new wines (export_pipeline.py --stores)
+  enrich                      Vivino lookups for unscored and stale wines (enrich_vivino_scores.py)
+  corrections                 manual corrections (apply_corrections.py)
+  generate                    wines.json and shards (generate_wines_json.py), then /api/refresh
+                              so the running app swaps in the new catalog
+
+A job is due when its data is older than its interval, when it has a backlog (unscored
+wines that were never looked up), or when a job it depends on produced new data since its
+own last run. Due jobs are started most urgent first: urgency is the age of the data in
+intervals, so the stalest store prices and the largest scoring backlog go first. A job
+waits while anything upstream of it is running or about to run, so a crawl is followed by
+one enrichment and one catalog build, not one per store.
+
+Every source domain has a concurrency limit and a daily run budget (DOMAIN_LIMITS). A job
+only starts when all the domains it touches have room, which keeps the load on the stores
+and on Vivino to a few sessions a day. A failed job is retried after RETRY_DELAY.
+
+Last runs and budgets are kept in scheduler_state.json, so a restart continues where the
+previous scheduler stopped. Job output goes to scheduler_logs/<job>.log and every finished
+job is recorded in run_log.jsonl (run_telemetry.py).
+
+Usage:
+    python scheduler.py                       # run forever
+    python scheduler.py --once                # run what is due now (and what that triggers), then exit
+    python scheduler.py --plan                # show what is due and why, run nothing
+    python scheduler.py --app-url http://localhost:5000
+"""
+import argparse
+import copy
+import heapq
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import requests
+from price_history import PriceHistory, STORE_FILES
+from run_telemetry import RunTelemetry
+from score_store import ScoreStore, wine_key
+from wine_schema import read_wines_csv
+
+STATE_FILE = 'scheduler_state.json'
+LOG_DIR = 'scheduler_logs'
+APP_URL = 'http://127.0.0.1:5000'
+TICK_SECONDS = 60
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+CRAWL_INTERVAL = DAY            # Store prices change at most daily
+ENRICH_INTERVAL = 7 * DAY       # Stale Vivino scores are re-checked weekly
+UNSCORED_BATCH = 25             # Unscored wines that justify an enrichment run on their own
+NEVER_RUN_URGENCY = 100.0       # Jobs without any previous run go first
+DEPENDENCY_URGENCY = 2.0        # Upstream data changed: run ahead of merely stale jobs
+RETRY_DELAY = 2 * HOUR          # Wait after a failed run before trying again
+JOB_TIMEOUT = 6 * HOUR
+
+# Source domain -> concurrent jobs and job starts per 24 hours
+DOMAIN_LIMITS = {
+    'carrefour.be': {'concurrency': 1, 'runs_per_day': 2},
+    'ah.be': {'concurrency': 1, 'runs_per_day': 2},
+    'vivino.com': {'concurrency': 1, 'runs_per_day': 6},
+}
+
+
+# --- Freshness of the data outside the scheduler ---
+
+def last_snapshot(store):
+    """Time of the store's last recorded scrape (price_history.db)"""
+    history = PriceHistory()
+    try:
+        return history.last_snapshot(store)
+    finally:
+        history.close()
+
+
+def last_enrichment():
+    store = ScoreStore()
+    try:
+        return store.last_finished_run()
+    finally:
+        store.close()
+
+
+def unscored_wines():
+    """Wines without a score that were never looked up on Vivino (the enrichment backlog)"""
+    store = ScoreStore()
+    try:
+        count = 0
+        for csv_file, store_name in STORE_FILES:
+            lookups = store.get_lookups(csv_file)
+            count += sum(1 for wine in read_wines_csv(csv_file, store_name)
+                         if wine['vivino_score'] is None and wine_key(wine) not in lookups)
+        return count
+    finally:
+        store.close()
+
+
+# --- Jobs and budgets ---
+
+class Job:
+    def __init__(self, name, command, domains=(), depends_on=(), interval=None, last_update=None,
+                 backlog=None, backlog_size=1, refresh_app=False):
+        """
+        interval     seconds after which the job's data is stale (None: only runs after its dependencies)
+        last_update  function -> when the data was last refreshed, for jobs the scheduler never ran
+        backlog      function -> number of items waiting for this job; backlog_size items make it due
+        refresh_app  ask the app to reload its catalog after a successful run
+        """
+        self.name = name
+        self.command = command
+        self.domains = tuple(domains)
+        self.depends_on = tuple(depends_on)
+        self.interval = interval
+        self.last_update = last_update
+        self.backlog = backlog
+        self.backlog_size = backlog_size
+        self.refresh_app = refresh_app
+
+
+def default_jobs():
+    python = sys.executable
+    return [
+        Job('crawl:carrefour', [python, 'export_pipeline.py', '--stores', 'Carrefour'],
+            domains=('carrefour.be', 'vivino.com'), interval=CRAWL_INTERVAL,
+            last_update=lambda: last_snapshot('Carrefour')),
+        Job('crawl:ah', [python, 'export_pipeline.py', '--stores', 'Albert Heijn'],
+            domains=('ah.be', 'vivino.com'), interval=CRAWL_INTERVAL,
+            last_update=lambda: last_snapshot('Albert Heijn')),
+        Job('enrich', [python, 'enrich_vivino_scores.py', '--mode', 'stale', '--local-first'],
+            domains=('vivino.com',), depends_on=('crawl:carrefour', 'crawl:ah'), interval=ENRICH_INTERVAL,
+            last_update=last_enrichment, backlog=unscored_wines, backlog_size=UNSCORED_BATCH),
+        Job('corrections', [python, 'apply_corrections.py'], depends_on=('enrich',)),
+        Job('generate', [python, 'generate_wines_json.py'], depends_on=('corrections',), refresh_app=True),
+    ]
+
+
+class DomainBudget:
+    """Concurrency limit and a rolling 24 hour run budget for one source domain"""
+
+    def __init__(self, concurrency=1, runs_per_day=None, starts=None):
+        self.concurrency = concurrency
+        self.runs_per_day = runs_per_day
+        self.running = 0
+        self.starts = list(starts or [])  # Job start times in the last 24 hours
+
+    def blocked_by(self, now):
+        """'concurrency' or 'budget' when no job may start now, else None"""
+        self.starts = [t for t in self.starts if t > now - DAY]
+        if self.running >= self.concurrency:
+            return 'concurrency'
+        if self.runs_per_day is not None and len(self.starts) >= self.runs_per_day:
+            return 'budget'
+        return None
+
+    def available(self, now):
+        return self.blocked_by(now) is None
+
+    def acquire(self, now):
+        self.running += 1
+        self.starts.append(now)
+
+    def release(self):
+        self.running = max(0, self.running - 1)
+
+
+class Scheduler:
+    def __init__(self, jobs=None, domain_limits=DOMAIN_LIMITS, app_url=APP_URL, state_file=STATE_FILE,
+                 telemetry=None):
+        self.jobs = {job.name: job for job in (jobs or default_jobs())}
+        self.app_url = app_url
+        self.state_file = state_file
+        self.state = self.load_state()
+        self.domains = {domain: DomainBudget(starts=self.state['domains'].get(domain), **limits)
+                        for domain, limits in domain_limits.items()}
+        self.running = {}              # job name -> thread
+        self.finished = queue.Queue()  # (job name, status, started, ended) from the job threads
+        self.wakeup = threading.Event()
+        self.telemetry = telemetry or RunTelemetry('scheduler')
+
+    # State
+
+    def load_state(self):
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                return {'jobs': state.get('jobs', {}), 'domains': state.get('domains', {})}
+            except ValueError:
+                print(f"⚠️ {self.state_file} is not valid JSON, starting with an empty state")
+        return {'jobs': {}, 'domains': {}}
+
+    def save_state(self):
+        self.state['domains'] = {domain: budget.starts for domain, budget in self.domains.items()}
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.state_file)
+
+    def record(self, name):
+        return self.state['jobs'].setdefault(name, {})
+
+    def last_success(self, name):
+        return self.state['jobs'].get(name, {}).get('last_success')
+
+    # Planning
+
+    def upstream(self, job):
+        """Names of every job this job depends on, directly or indirectly"""
+        names = set()
+        pending = list(job.depends_on)
+        while pending:
+            name = pending.pop()
+            if name not in names and name in self.jobs:
+                names.add(name)
+                pending.extend(self.jobs[name].depends_on)
+        return names
+
+    def urgency(self, job, now):
+        """(urgency, reason); the job is due at urgency >= 1"""
+        record = self.state['jobs'].get(job.name, {})
+        if record.get('last_status', 'success') != 'success' and now - record.get('last_attempt', 0) < RETRY_DELAY:
+            return 0.0, f"last run failed ({record['last_status']}), retrying later"
+
+        last = record.get('last_success')
+        if last is None and job.last_update:
+            last = job.last_update()
+        urgency, reason = 0.0, 'up to date'
+        if job.interval:
+            if last is None:
+                urgency, reason = NEVER_RUN_URGENCY, 'never ran'
+            else:
+                urgency, reason = (now - last) / job.interval, f"data {(now - last) / HOUR:.0f}h old"
+        if job.backlog:
+            pending = job.backlog()
+            if pending / job.backlog_size > urgency:
+                urgency, reason = pending / job.backlog_size, f"{pending} waiting"
+        for dep in job.depends_on:
+            dep_success = self.last_success(dep)
+            own_success = record.get('last_success')
+            if dep_success and (own_success is None or dep_success > own_success) and urgency < DEPENDENCY_URGENCY:
+                urgency, reason = DEPENDENCY_URGENCY, f"new data from {dep}"
+        return urgency, reason
+
+    def budget_available(self, job, budgets, now):
+        return all(budgets[domain].available(now) for domain in job.domains if domain in budgets)
+
+    def tick(self, now=None, dry_run=False):
+        """Start the due jobs that may run now; returns [(job, urgency, reason, action)]"""
+        now = now or time.time()
+        self.collect()
+        budgets = copy.deepcopy(self.domains) if dry_run else self.domains
+
+        plan = {name: self.urgency(job, now) for name, job in self.jobs.items() if name not in self.running}
+        due = {name for name, (urgency, _) in plan.items() if urgency >= 1}
+        # Due jobs that will start as soon as nothing upstream of them runs
+        startable = {name for name in due if self.budget_available(self.jobs[name], budgets, now)}
+
+        heap = [(-plan[name][0], name) for name in due]
+        heapq.heapify(heap)
+        started = []
+        actions = {}
+        while heap:
+            _, name = heapq.heappop(heap)
+            job = self.jobs[name]
+            waiting = sorted(dep for dep in self.upstream(job)
+                             if dep in self.running or dep in startable or dep in started)
+            if waiting:
+                actions[name] = f"waits for {', '.join(waiting)}"
+            elif not self.budget_available(job, budgets, now):
+                blocked = {d: budgets[d].blocked_by(now) for d in job.domains if d in budgets}
+                busy = [d for d, limit in blocked.items() if limit == 'concurrency']
+                spent = [d for d, limit in blocked.items() if limit == 'budget']
+                reasons = []
+                if busy:
+                    reasons.append(f"domain busy ({', '.join(busy)})")
+                if spent:
+                    reasons.append(f"daily budget used up ({', '.join(spent)})")
+                actions[name] = ', '.join(reasons)
+            else:
+                for domain in job.domains:
+                    if domain in budgets:
+                        budgets[domain].acquire(now)
+                started.append(name)
+                actions[name] = 'start'
+                if not dry_run:
+                    self.start(job, now)
+
+        result = [(name, None, 'running', 'running') for name in self.running if name not in started]
+        result += [(name, urgency, reason, actions.get(name, '-'))
+                   for name, (urgency, reason) in sorted(plan.items(), key=lambda item: -item[1][0])]
+        return result
+
+    # Running
+
+    def start(self, job, now):
+        record = self.record(job.name)
+        record['last_attempt'] = now
+        self.save_state()
+        print(f"▶️ {time.strftime('%Y-%m-%d %H:%M:%S')} starting {job.name}")
+        thread = threading.Thread(target=self.run_job, args=(job,), name=job.name, daemon=True)
+        self.running[job.name] = thread
+        thread.start()
+
+    def log_path(self, job):
+        return os.path.join(LOG_DIR, job.name.replace(':', '-') + '.log')
+
+    def run_job(self, job):
+        os.makedirs(LOG_DIR, exist_ok=True)
+        env = dict(os.environ, PYTHONUNBUFFERED='1', PYTHONIOENCODING='utf-8')
+        started = time.time()
+        try:
+            with open(self.log_path(job), 'a', encoding='utf-8') as log:
+                log.write(f"\n=== {time.strftime('%Y-%m-%d %H:%M:%S')} {' '.join(job.command)}\n")
+                log.flush()
+                result = subprocess.run(job.command, stdout=log, stderr=subprocess.STDOUT, env=env,
+                                        timeout=JOB_TIMEOUT)
+            status = 'success' if result.returncode == 0 else f"exit {result.returncode}"
+        except subprocess.TimeoutExpired:
+            status = 'timeout'
+        except OSError as e:
+            status = f"error: {e}"
+        self.finished.put((job.name, status, started, time.time()))
+        self.wakeup.set()
+
+    def collect(self):
+        """Book the jobs that finished since the last tick"""
+        while True:
+            try:
+                name, status, started, ended = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            self.finish(self.jobs[name], status, started, ended)
+
+    def finish(self, job, status, started, ended):
+        self.running.pop(job.name).join()
+        for domain in job.domains:
+            if domain in self.domains:
+                self.domains[domain].release()
+        record = self.record(job.name)
+        record['last_status'] = status
+        record['last_duration_s'] = round(ended - started, 1)
+        if status == 'success':
+            record['last_success'] = ended
+        self.save_state()
+
+        self.telemetry.record_stage(f'job:{job.name}', ended - started, status=status)
+        if status == 'success':
+            print(f"✓ {job.name} finished in {(ended - started) / 60:.1f} min")
+            if job.refresh_app:
+                self.refresh_app()
+        else:
+            self.telemetry.failure(f'job:{job.name}', status=status)
+            print(f"❌ {job.name} failed ({status}) after {(ended - started) / 60:.1f} min, "
+                  f"see {self.log_path(job)}")
+        self.telemetry.flush()
+
+    def refresh_app(self):
+        """Make the running app reload its catalog (it serves the old one until the swap)"""
+        if not self.app_url:
+            return
+        try:
+            response = requests.post(f"{self.app_url.rstrip('/')}/api/refresh", timeout=10)
+            print(f"✓ Catalog refresh requested from {self.app_url} ({response.json().get('status')})")
+        except (requests.RequestException, ValueError) as e:
+            print(f"⚠️ Could not refresh the app at {self.app_url}: {e} (it loads the new catalog on restart)")
+
+    def run(self, once=False, tick_seconds=TICK_SECONDS):
+        print("=" * 60)
+        print("REFRESH SCHEDULER" + (" (once)" if once else ""))
+        print("=" * 60)
+        try:
+            while True:
+                self.wakeup.clear()
+                started = [name for name, _, _, action in self.tick() if action == 'start']
+                if once and not started and not self.running:
+                    break
+                self.wakeup.wait(tick_seconds)
+        except KeyboardInterrupt:
+            print("\nStopping the scheduler (running jobs are interrupted and retried later)")
+        finally:
+            self.save_state()
+            self.telemetry.finish()
+
+
+def print_plan(plan):
+    print(f"{'job':<18} {'urgency':>8}  {'reason':<36} action")
+    for name, urgency, reason, action in plan:
+        shown = '' if urgency is None else f"{urgency:.2f}"
+        print(f"{name:<18} {shown:>8}  {reason:<36} {action}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the wine data fresh: crawl, enrich, correct and publish")
+    parser.add_argument('--once', action='store_true', help="Run what is due now, then exit")
+    parser.add_argument('--plan', action='store_true', help="Show what is due and why, run nothing")
+    parser.add_argument('--app-url', default=APP_URL, help="App to refresh after a new catalog ('' for none)")
+    parser.add_argument('--tick', type=int, default=TICK_SECONDS, help="Seconds between scheduling rounds")
+    args = parser.parse_args()
+
+    if args.plan:
+        scheduler = Scheduler(app_url=args.app_url, telemetry=RunTelemetry('scheduler', log_file=None))
+        print_plan(scheduler.tick(dry_run=True))
+    else:
+        Scheduler(app_url=args.app_url).run(once=args.once, tick_seconds=args.tick)
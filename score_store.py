@@ -0,0 +1,88 @@
+"""
+Score Store - durable record of Vivino lookups (SQLite)
+Keeps when each wine was last looked up so enrichment can skip known wines
+and resume after an interruption.
+"""
+import sqlite3
+import time
+
+SCORE_DB = 'vivino_scores.db'
+
+
+def wine_key(row):
+    """Stable key for a CSV row: URL when available, otherwise the name"""
+    url = row.get('url')
+    if isinstance(url, str) and url and url != '#':
+        return url
+    return row['name']
+
+
+class ScoreStore:
+    def __init__(self, db_path=SCORE_DB):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS lookups (
+                csv_file TEXT NOT NULL,
+                wine_key TEXT NOT NULL,
+                name TEXT,
+                vivino_score TEXT,
+                looked_up_at REAL NOT NULL,
+                PRIMARY KEY (csv_file, wine_key)
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                csv_file TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL
+            );
+        """)
+        self.conn.commit()
+
+    def get_lookups(self, csv_file):
+        """Return wine_key -> (vivino_score, looked_up_at)"""
+        rows = self.conn.execute(
+            "SELECT wine_key, vivino_score, looked_up_at FROM lookups WHERE csv_file = ?", (csv_file,))
+        return {key: (score, ts) for key, score, ts in rows}
+
+    def seed(self, csv_file, entries, looked_up_at):
+        """Record scores that already exist in the CSV but were never tracked.
+        entries is a list of (wine_key, name, score)."""
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO lookups (csv_file, wine_key, name, vivino_score, looked_up_at) VALUES (?, ?, ?, ?, ?)",
+            [(csv_file, key, name, score, looked_up_at) for key, name, score in entries])
+        self.conn.commit()
+
+    def put_batch(self, csv_file, entries):
+        """Durably store a batch of lookup results: list of (wine_key, name, score, looked_up_at)"""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO lookups (csv_file, wine_key, name, vivino_score, looked_up_at) VALUES (?, ?, ?, ?, ?)",
+            [(csv_file,) + tuple(e) for e in entries])
+        self.conn.commit()
+
+    def start_run(self, csv_file, mode):
+        """Start a run, or resume the last unfinished one with the same mode.
+        Returns (run_id, started_at); wines looked up since started_at are already done."""
+        row = self.conn.execute(
+            "SELECT id, started_at FROM runs WHERE csv_file = ? AND mode = ? AND finished_at IS NULL "
+            "ORDER BY id DESC LIMIT 1", (csv_file, mode)).fetchone()
+        if row:
+            return row[0], row[1]
+        started_at = time.time()
+        cur = self.conn.execute(
+            "INSERT INTO runs (csv_file, mode, started_at) VALUES (?, ?, ?)", (csv_file, mode, started_at))
+        self.conn.commit()
+        return cur.lastrowid, started_at
+
+    def finish_run(self, run_id):
+        self.conn.execute("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), run_id))
+        self.conn.commit()
+
+    def last_finished_run(self):
+        """Time the last complete enrichment run finished (None if none did)"""
+        return self.conn.execute("SELECT MAX(finished_at) FROM runs").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
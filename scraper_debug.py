@@ -0,0 +1,68 @@
+"""
+Scraper Debug Capture
+Debug output for the scrapers, off by default so the lookup loops do no disk I/O.
+
+With WINEVINO_DEBUG_CAPTURE=1 (or debug_capture=True on a scraper):
+  - log messages also go to scraper_debug.txt
+  - the page HTML of the last DEBUG_RING_SIZE failed Vivino lookups is kept in memory
+    and written to scraper_debug/ when the scraper closes
+  - the store scrapers save their final page HTML to scraper_debug/
+
+Successful lookups are never captured.
+"""
+import os
+import re
+import time
+from collections import deque
+
+DEBUG_CAPTURE = os.environ.get('WINEVINO_DEBUG_CAPTURE', '') not in ('', '0')
+DEBUG_DIR = 'scraper_debug'
+DEBUG_LOG_FILE = 'scraper_debug.txt'
+DEBUG_RING_SIZE = 20
+
+HTML_PARSER = 'lxml'  # Several times faster than html.parser on full result pages
+
+
+def save_page(name, html):
+    """Write one page to DEBUG_DIR; returns the path"""
+    os.makedirs(DEBUG_DIR, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_')[:60] or 'page'
+    path = os.path.join(DEBUG_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{slug}.html")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    return path
+
+
+class DebugCapture:
+    """Ring buffer of failed lookups plus an optional debug log file"""
+
+    def __init__(self, enabled=None, size=DEBUG_RING_SIZE):
+        self.enabled = DEBUG_CAPTURE if enabled is None else enabled
+        self.failures = deque(maxlen=size)
+        self.log_file = None
+
+    def log(self, message):
+        if not self.enabled:
+            return
+        try:
+            if not self.log_file:
+                self.log_file = open(DEBUG_LOG_FILE, 'w', encoding='utf-8')
+            self.log_file.write(f"{message}\n")
+        except OSError:
+            pass
+
+    def capture_failure(self, name, reason, html):
+        """Remember the page of a failed lookup (only the newest DEBUG_RING_SIZE are kept)"""
+        if self.enabled:
+            self.failures.append((name, reason, html))
+
+    def flush(self):
+        """Write the captured pages to DEBUG_DIR and close the log file"""
+        for name, reason, html in self.failures:
+            save_page(f"{reason}_{name}", html)
+        if self.failures:
+            print(f"Saved {len(self.failures)} failed lookup pages to {DEBUG_DIR}/")
+        self.failures.clear()
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
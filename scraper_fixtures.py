@@ -0,0 +1,301 @@
+"""
+Scraper Fixtures - record and replay scraped pages
+Work on the extraction code offline: record the pages the scrapers see once, then replay
+them through the same parse code in seconds.
+
+Recording is off by default. With WINEVINO_RECORD_FIXTURES=1 every scraper run saves what
+it parses to fixtures/:
+
+  carrefour   the Carrefour listing page after all products are loaded
+  ah          each Albert Heijn category page
+  vivino      Vivino search result pages (VivinoScraper)
+  vivino_api  Vivino explore API responses (VivinoAPIScraper)
+
+fixtures/index.json lists every fixture with its key (URL or search query), size, hash and
+recording date. A new recording of the same key replaces the old one. The directory is
+meant to be committed, so parser changes can be checked against the same pages.
+
+Replay runs each fixture through the scraper's parse function (Vivino lookups go through
+get_score/search_wine with the browser or HTTP session replaced). The first replay saves
+the result next to the fixture as <fixture>.expected.json; later replays report any
+difference, so a parser change that alters output is caught immediately.
+
+Usage:
+    WINEVINO_RECORD_FIXTURES=1 python export_pipeline.py   # record
+    python scraper_fixtures.py                             # list the fixtures
+    python scraper_fixtures.py replay [--kind vivino]      # compare with the expected results
+    python scraper_fixtures.py replay --accept             # take the new results as expected
+    python benchmark_parsers.py                            # parser speed over the fixtures
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+FIXTURES_DIR = 'fixtures'
+FIXTURE_INDEX = 'index.json'
+FIXTURE_VERSION = 1  # Bump when the fixture layout changes
+INDEX_LOCK_STALE = 30  # Seconds after which an index lock file is taken to be left behind
+RECORD_FIXTURES = os.environ.get('WINEVINO_RECORD_FIXTURES', '') not in ('', '0')
+KINDS = ('carrefour', 'ah', 'vivino', 'vivino_api')
+
+# The export pipeline records from several scraper threads at once: they share one store
+_store = None
+_store_lock = threading.Lock()
+
+
+class FixtureStore:
+    def __init__(self, root=FIXTURES_DIR):
+        self.root = root
+        self.index_file = os.path.join(root, FIXTURE_INDEX)
+        self.lock = threading.Lock()
+        self.index = self.load_index()
+
+    def load_index(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get('version') == FIXTURE_VERSION:
+                    return index
+                print(f"⚠️ {self.index_file} has fixture version {index.get('version')}, "
+                      f"expected {FIXTURE_VERSION}; starting a new index")
+            except ValueError:
+                pass
+        return {'version': FIXTURE_VERSION, 'fixtures': {}}
+
+    def save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_file = f"{self.index_file}.{os.getpid()}.{threading.get_ident()}.tmp"  # Unique per writer
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.index_file)
+
+    @staticmethod
+    def fixture_id(kind, key):
+        """kind/<readable part of the key>-<hash>: stable for a key, unique across keys"""
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', key.split('://')[-1]).strip('-')[-50:] or 'page'
+        return f"{kind}/{slug}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:8]}"
+
+    def record(self, kind, key, content, ext='html', **meta):
+        """Save one page or response; returns its fixture entry"""
+        fixture_id = self.fixture_id(kind, key)
+        path = os.path.join(self.root, f"{fixture_id}.{ext}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = content.encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(data)
+        entry = {
+            'kind': kind,
+            'key': key,
+            'file': f"{fixture_id}.{ext}",
+            'bytes': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'recorded': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'meta': meta,
+        }
+        with self.index_lock():
+            # Merge with the index on disk, which another process may have extended
+            self.index = self.load_index()
+            self.index['fixtures'][fixture_id] = entry
+            self.save_index()
+        return entry
+
+    @contextlib.contextmanager
+    def index_lock(self):
+        """Serialize index updates across threads and processes (lock file next to the index)"""
+        os.makedirs(self.root, exist_ok=True)
+        path = self.index_file + '.lock'
+        with self.lock:
+            while True:
+                try:
+                    os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    break
+                except FileExistsError:
+                    try:
+                        if time.time() - os.path.getmtime(path) > INDEX_LOCK_STALE:
+                            os.remove(path)
+                    except OSError:
+                        pass
+                    time.sleep(0.01)
+            try:
+                yield
+            finally:
+                os.remove(path)
+
+    def entries(self, kind=None):
+        return [dict(e, id=fixture_id) for fixture_id, e in sorted(self.index['fixtures'].items())
+                if kind is None or e['kind'] == kind]
+
+    def find(self, kind, key):
+        entry = self.index['fixtures'].get(self.fixture_id(kind, key))
+        return dict(entry, id=self.fixture_id(kind, key)) if entry else None
+
+    def load(self, entry):
+        with open(os.path.join(self.root, entry['file']), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def expected_path(self, entry):
+        return os.path.join(self.root, entry['id'] + '.expected.json')
+
+    def load_expected(self, entry):
+        path = self.expected_path(entry)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_expected(self, entry, result):
+        with open(self.expected_path(entry), 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+
+
+def record_page(kind, key, content, ext='html', **meta):
+    """Save a page as a fixture when WINEVINO_RECORD_FIXTURES is on (no-op otherwise)"""
+    global _store
+    if not RECORD_FIXTURES or not content:
+        return
+    try:
+        with _store_lock:
+            if _store is None:
+                _store = FixtureStore()
+        _store.record(kind, key, content, ext, **meta)
+    except OSError as e:
+        print(f"⚠️ Could not record fixture {kind} {key}: {e}")
+
+
+# --- Replay ---
+
+class ReplayDriver:
+    """Stands in for the Selenium driver: get() loads the recorded page of that URL"""
+
+    def __init__(self, store, kind='vivino'):
+        self.store, self.kind = store, kind
+        self.page_source = ''
+
+    def get(self, url):
+        entry = self.store.find(self.kind, url)
+        if not entry:
+            raise KeyError(f"No {self.kind} fixture for {url}")
+        self.page_source = self.store.load(entry)
+
+    def quit(self):
+        pass
+
+
+class ReplayResponse:
+    def __init__(self, text, status_code=200):
+        self.text, self.status_code = text, status_code
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ReplaySession:
+    """Stands in for requests: get() returns the recorded API response of that query"""
+
+    def __init__(self, store, kind='vivino_api'):
+        self.store, self.kind = store, kind
+
+    def get(self, url, params=None, **kwargs):
+        entry = self.store.find(self.kind, (params or {}).get('q', url))
+        if not entry:
+            return ReplayResponse('', status_code=404)
+        return ReplayResponse(self.store.load(entry))
+
+
+def replay(store, entry):
+    """Run one fixture through the scraper's extraction code; returns a JSON-able result"""
+    # Scrapers log every step; replays only report the result
+    with contextlib.redirect_stdout(io.StringIO()):
+        if entry['kind'] == 'carrefour':
+            from cf_scraper import parse_products
+            count, wines = parse_products(store.load(entry))
+            return {'products': count, 'wines': wines}
+        if entry['kind'] == 'ah':
+            from ah_scraper import parse_products
+            count, wines = parse_products(store.load(entry))
+            return {'products': count, 'wines': wines}
+        if entry['kind'] == 'vivino':
+            from vivino_scraper import VivinoScraper
+            scraper = VivinoScraper(debug_capture=False)
+            scraper.search_wait = 0
+            scraper.driver = ReplayDriver(store)
+            cards, results = scraper.parse_results(store.load(entry))
+            wine = entry['meta'].get('wine')
+            return {'cards': cards, 'results': results, 'score': scraper.get_score(wine) if wine else None}
+        if entry['kind'] == 'vivino_api':
+            from vivino_api_scraper import VivinoAPIScraper
+            scraper = VivinoAPIScraper()
+            scraper.session = ReplaySession(store)
+            results = scraper.parse_matches(json.loads(store.load(entry)))
+            wine = entry['meta'].get('wine')
+            return {'results': results, 'score': scraper.search_wine(wine) if wine else None}
+    raise ValueError(f"Unknown fixture kind: {entry['kind']}")
+
+
+def result_size(result):
+    items = result.get('wines', result.get('results')) or []
+    return len(items)
+
+
+def replay_all(store, kind=None, accept=False):
+    """Replay fixtures and compare with their expected results; returns the number that differ"""
+    entries = store.entries(kind)
+    if not entries:
+        print("No fixtures recorded yet (run a scraper with WINEVINO_RECORD_FIXTURES=1)")
+        return 0
+    changed = 0
+    start = time.perf_counter()
+    for entry in entries:
+        result = json.loads(json.dumps(replay(store, entry), ensure_ascii=False))  # As stored on disk
+        expected = store.load_expected(entry)
+        if expected is None or accept:
+            store.save_expected(entry, result)
+            status = '🆕' if expected is None else ('✓' if expected == result else '✏️')
+        elif expected == result:
+            status = '✓'
+        else:
+            status = '❌'
+            changed += 1
+        extra = f", score {result['score']}" if 'score' in result else ''
+        print(f"{status} {entry['id']}: {result_size(result)} items{extra}")
+        if status == '❌':
+            print(f"   expected {result_size(expected)} items"
+                  f"{', score ' + str(expected.get('score')) if 'score' in expected else ''}")
+    print(f"\nReplayed {len(entries)} fixtures in {time.perf_counter() - start:.2f}s"
+          + (f", ❌ {changed} differ from the expected results (--accept to update)" if changed else ''))
+    return changed
+
+
+def print_fixtures(store):
+    entries = store.entries()
+    if not entries:
+        print("No fixtures recorded yet (run a scraper with WINEVINO_RECORD_FIXTURES=1)")
+        return
+    for kind in KINDS:
+        group = [e for e in entries if e['kind'] == kind]
+        if group:
+            print(f"{kind}: {len(group)} fixtures, {sum(e['bytes'] for e in group) / 1024:.0f} KB")
+            for e in group:
+                print(f"   {e['recorded']}  {e['bytes'] / 1024:>7.0f} KB  {e['key']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recorded scraper pages: list or replay them")
+    parser.add_argument('command', nargs='?', choices=('list', 'replay'), default='list')
+    parser.add_argument('--kind', choices=KINDS, help="Only fixtures of this scraper")
+    parser.add_argument('--accept', action='store_true', help="Save the replayed results as expected")
+    parser.add_argument('--dir', default=FIXTURES_DIR, help="Fixture directory")
+    args = parser.parse_args()
+
+    fixture_store = FixtureStore(args.dir)
+    if args.command == 'replay':
+        sys.exit(1 if replay_all(fixture_store, args.kind, args.accept) else 0)
+    print_fixtures(fixture_store)
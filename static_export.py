@@ -0,0 +1,255 @@
+"""
+Static Site Export
+Pre-renders the web app into plain files, so the catalog can be served from disk, a CDN
+or the Capacitor bundle without the Flask server:
+
+  index.html                 templates/index.html
+  wine/<slug>.html           templates/wine_detail.html, one page per wine in static/wines.json
+  assets/<name>.<hash>.<ext> the files in static/ plus the catalog JSON, named by content hash
+                             (safe to cache forever; a changed file gets a new name)
+
+The export goes into the bundles (www/ and mobile_build/ by default). A target that
+already has an index.html the export did not write keeps it: that shell loads its own
+script.js, which opens the exported pages through the detail_page links that
+generate_wines_json.py puts in the bundle catalogs. A new directory (site/) gets the
+exported index.html as well.
+
+Pages are rendered in parallel across a process pool. Each target keeps an
+export_manifest.json with a hash of every page's inputs (templates, asset names, the
+wine and its pairings), so a re-run only renders pages whose inputs changed and deletes
+pages of wines that left the catalog.
+
+Links between pages and to the assets are relative, so the same files work from any
+directory or host. Wine images stay the stores' absolute URLs.
+
+Usage:
+    python generate_wines_json.py          # refresh the catalog first
+    python static_export.py                # exports to www/ and mobile_build/
+    python static_export.py --targets site --workers 4 --force
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+TEMPLATES_DIR = 'templates'
+STATIC_DIR = 'static'
+CATALOG_FILE = os.path.join(STATIC_DIR, 'wines.json')
+PAIRINGS_FILE = 'pairings.json'
+TARGETS = ('www', 'mobile_build')
+ASSETS_DIR = 'assets'
+PAGES_DIR = 'wine'
+MANIFEST_FILE = 'export_manifest.json'
+CHUNK_SIZE = 50  # Pages per pool task
+
+
+def content_hash(data, length=10):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def page_slug(name):
+    """File name for a wine page: readable part plus a hash, so different names never collide"""
+    readable = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')[:60] or 'wine'
+    return f"{readable}-{content_hash(name, 8)}"
+
+
+def detail_page(name):
+    """Relative link to a wine's exported page"""
+    return f"{PAGES_DIR}/{page_slug(name)}.html"
+
+
+def hashed_name(filename, data):
+    base, ext = os.path.splitext(filename)
+    return f"{base}.{content_hash(data)}{ext}"
+
+
+def load_catalog():
+    with open(CATALOG_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_pairings():
+    if not os.path.exists(PAIRINGS_FILE):
+        return {}
+    with open(PAIRINGS_FILE, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    # Old files store a plain list of pairings per wine
+    return {k: {"pairings": v, "description": ""} if isinstance(v, list) else v for k, v in data.items()}
+
+
+def write_file(path, data):
+    """Write atomically (temp file + rename), so a served file is never half written"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+    os.replace(tmp_file, path)
+
+
+# --- Rendering (runs in the worker processes) ---
+
+_env = None
+
+
+def init_worker():
+    global _env
+    # Same autoescaping as Flask for .html templates
+    _env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=select_autoescape(['html']))
+
+
+def asset_url_for(assets, prefix):
+    """Stand-in for Flask's url_for('static', filename=...) in the templates"""
+    def url_for(endpoint, filename=None, **values):
+        if endpoint != 'static' or filename not in assets:
+            raise ValueError(f"No static export for url_for({endpoint!r}, filename={filename!r})")
+        return f"{prefix}{ASSETS_DIR}/{assets[filename]}"
+    return url_for
+
+
+def render_pages(jobs, assets):
+    """Render (path, template, context) jobs; returns [(path, html)]"""
+    if _env is None:
+        init_worker()
+    rendered = []
+    for path, template, context in jobs:
+        prefix = '../' * path.count('/')
+        html = _env.get_template(template).render(url_for=asset_url_for(assets, prefix), **context)
+        rendered.append((path, html))
+    return rendered
+
+
+# --- Export ---
+
+def build_assets(wines):
+    """Hashed asset name per static file, plus the catalog with links to the static pages"""
+    assets = {}
+    files = {}
+    for filename in sorted(os.listdir(STATIC_DIR)):
+        path = os.path.join(STATIC_DIR, filename)
+        if filename == os.path.basename(CATALOG_FILE) or not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        assets[filename] = hashed_name(filename, data)
+        files[assets[filename]] = data
+
+    catalog = [dict(wine, detail_page=detail_page(wine['name'])) for wine in wines]
+    data = json.dumps(catalog, ensure_ascii=False).encode('utf-8')
+    data_asset = hashed_name('wines.json', data)
+    files[data_asset] = data
+    return assets, data_asset, files
+
+
+def build_jobs(wines, pairings, assets, data_asset):
+    """All pages as path -> (template, context, input hash)"""
+    with open(os.path.join(TEMPLATES_DIR, 'index.html'), 'rb') as f:
+        index_source = f.read()
+    with open(os.path.join(TEMPLATES_DIR, 'wine_detail.html'), 'rb') as f:
+        detail_source = f.read()
+    shared = json.dumps(assets, sort_keys=True)
+
+    jobs = {'index.html': ('index.html', {'data_url': f"{ASSETS_DIR}/{data_asset}"},
+                           content_hash(index_source + shared.encode() + data_asset.encode(), 16))}
+    detail_version = content_hash(detail_source + shared.encode(), 16)
+    for wine in wines:
+        path = detail_page(wine['name'])
+        if path in jobs:
+            continue  # Same name in several stores: the page shows the first, like /wine/<name>
+        p_data = pairings.get(wine['name'], {})
+        context = {'wine': dict(wine, pairings=p_data.get('pairings', []),
+                                description=p_data.get('description', "")),
+                   'index_url': '../index.html'}
+        inputs = json.dumps([detail_version, context['wine']], sort_keys=True, ensure_ascii=False)
+        jobs[path] = ('wine_detail.html', context, content_hash(inputs, 16))
+    return jobs
+
+
+def load_manifest(target):
+    try:
+        with open(os.path.join(target, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f).get('pages', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def foreign_index(target):
+    """True if the target has an index.html that an earlier export did not write"""
+    return os.path.exists(os.path.join(target, 'index.html')) and 'index.html' not in load_manifest(target)
+
+
+def export_site(targets=TARGETS, workers=None, force=False):
+    start = time.time()
+    wines = load_catalog()
+    assets, data_asset, asset_files = build_assets(wines)
+    jobs = build_jobs(wines, load_pairings(), assets, data_asset)
+
+    # Pages of each target; a bundle keeps its own index.html
+    pages = {}
+    for target in targets:
+        pages[target] = set(jobs)
+        if foreign_index(target):
+            pages[target].discard('index.html')
+            print(f"⚠️ {target}/ has its own index.html (not from a static export), keeping it")
+
+    # Pages each target is missing or has from different inputs
+    stale = {}
+    for target in targets:
+        manifest = {} if force else load_manifest(target)
+        stale[target] = {path for path in pages[target]
+                         if manifest.get(path) != jobs[path][2] or not os.path.exists(os.path.join(target, path))}
+    to_render = sorted(set().union(*stale.values())) if stale else []
+    exported = set().union(*pages.values()) if pages else set()
+    print(f"Exporting {len(exported)} pages to {', '.join(targets)}: "
+          f"{len(to_render)} to render, {len(exported) - len(to_render)} unchanged")
+
+    work = [(path, jobs[path][0], jobs[path][1]) for path in to_render]
+    chunks = [work[i:i + CHUNK_SIZE] for i in range(0, len(work), CHUNK_SIZE)]
+    rendered = {}
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            rendered.update(render_pages(chunk, assets))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            for chunk_pages in pool.map(render_pages, chunks, [assets] * len(chunks)):
+                rendered.update(chunk_pages)
+
+    for target in targets:
+        assets_dir = os.path.join(target, ASSETS_DIR)
+        for name, data in asset_files.items():
+            if not os.path.exists(os.path.join(assets_dir, name)):
+                write_file(os.path.join(assets_dir, name), data)
+        # Old hashed files are no longer referenced by any page
+        for name in os.listdir(assets_dir):
+            if name not in asset_files:
+                os.remove(os.path.join(assets_dir, name))
+
+        for path in stale[target]:
+            write_file(os.path.join(target, path), rendered[path])
+        removed = 0
+        for path in load_manifest(target):
+            if path not in pages[target] and os.path.exists(os.path.join(target, path)):
+                os.remove(os.path.join(target, path))
+                removed += 1
+
+        manifest = {'generated': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'pages': {path: jobs[path][2] for path in sorted(pages[target])}}
+        write_file(os.path.join(target, MANIFEST_FILE), json.dumps(manifest, indent=0, sort_keys=True))
+        print(f"✓ {target}/: {len(stale[target])} pages written, {removed} removed")
+
+    print(f"✅ Static export done in {time.time() - start:.1f}s")
+    return {target: sorted(paths) for target, paths in stale.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render the wine pages to static files")
+    parser.add_argument('--targets', nargs='+', default=list(TARGETS), help="Output directories")
+    parser.add_argument('--workers', type=int, default=None, help="Render processes (default: one per CPU)")
+    parser.add_argument('--force', action='store_true', help="Render every page, even unchanged ones")
+    args = parser.parse_args()
+    export_site(args.targets, args.workers, args.force)
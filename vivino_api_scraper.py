@@ -5,14 +5,19 @@ Much more reliable than HTML scraping!
 import requests
 import time
 import re
-import difflib
+from wine_matcher import rank_candidates, MATCH_THRESHOLD
+from scraper_fixtures import record_page
 
 class VivinoAPIScraper:
-    def __init__(self):
+    def __init__(self, local_index=None):
         self.base_url = "https://www.vivino.com/api/"
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         }
+        # Optional VivinoIndex: answer known wines locally and remember every result we fetch
+        self.local_index = local_index
+        # Anything with requests' get(); scraper_fixtures.py swaps in recorded responses
+        self.session = requests.Session()
     
     def clean_wine_name(self, name):
         """Remove size indicators and clean the name"""
@@ -22,20 +27,63 @@ class VivinoAPIScraper:
         name = ' '.join(name.split())
         return name.strip()
     
-    def extract_year(self, name):
-        """Extract vintage year from wine name"""
-        match = re.search(r'\b(19|20)\d{2}\b', name)
-        return match.group(0) if match else None
+    def parse_matches(self, data):
+        """Results with a rating and enough ratings from an explore API response
+        (None when the response has no matches)"""
+        if 'explore_vintage' not in data or 'matches' not in data['explore_vintage']:
+            print(f"  No matches found in API response")
+            return None
+        
+        matches = data['explore_vintage']['matches']
+        
+        if not matches:
+            print(f"  No results found")
+            return None
+        
+        print(f"  Found {len(matches)} results")
+        
+        # Keep every result with enough ratings, then pick the best name match
+        results = []
+        for i, match in enumerate(matches):
+            try:
+                vintage = match.get('vintage', {})
+                wine = vintage.get('wine', {})
+                statistics = vintage.get('statistics', {})
+                
+                result_name = wine.get('name', '')
+                rating = statistics.get('ratings_average')
+                ratings_count = statistics.get('ratings_count', 0)
+                
+                if not rating or ratings_count < 5:
+                    print(f"    Result {i+1}: {result_name} - No rating or too few ratings")
+                    continue
+                
+                results.append({
+                    'name': result_name,
+                    'vintage': vintage.get('year'),
+                    'rating': rating,
+                    'ratings_count': ratings_count
+                })
+            
+            except Exception as e:
+                print(f"    Error parsing result {i}: {e}")
+                continue
+        return results
     
     def search_wine(self, wine_name):
         """
         Search for a wine using Vivino's API
         Returns the best match with rating
         """
+        if self.local_index:
+            hit = self.local_index.lookup(wine_name)
+            if hit:
+                print(f"Local match for '{wine_name}': {hit['name']} ({hit['rating']})")
+                return hit['rating']
+
         clean_name = self.clean_wine_name(wine_name)
-        target_year = self.extract_year(wine_name)
         
-        print(f"Searching for: '{clean_name}' (Year: {target_year})")
+        print(f"Searching for: '{clean_name}'")
         
         try:
             # Use Vivino's explore API with required parameters
@@ -53,7 +101,7 @@ class VivinoAPIScraper:
             print(f"  Request URL: {url}")
             print(f"  Params: {params}")
             
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
+            response = self.session.get(url, params=params, headers=self.headers, timeout=10)
             
             # Debug: print response
             print(f"  Response status: {response.status_code}")
@@ -64,70 +112,28 @@ class VivinoAPIScraper:
                 print(f"  API returned status {response.status_code}")
                 return None
             
-            data = response.json()
-            
-            # Extract matches
-            if 'explore_vintage' not in data or 'matches' not in data['explore_vintage']:
-                print(f"  No matches found in API response")
-                return None
-            
-            matches = data['explore_vintage']['matches']
-            
-            if not matches:
-                print(f"  No results found")
+            record_page('vivino_api', clean_name, response.text, ext='json', wine=wine_name)
+            results = self.parse_matches(response.json())
+            if results is None:
                 return None
             
-            print(f"  Found {len(matches)} results")
-            
-            # Analyze top 5 results
-            best_match = None
-            highest_ratio = 0.0
-            
-            for i, match in enumerate(matches[:5]):
-                try:
-                    vintage = match.get('vintage', {})
-                    wine = vintage.get('wine', {})
-                    statistics = vintage.get('statistics', {})
-                    
-                    result_name = wine.get('name', '')
-                    rating = statistics.get('ratings_average')
-                    ratings_count = statistics.get('ratings_count', 0)
-                    
-                    if not rating or ratings_count < 5:
-                        print(f"    Result {i+1}: {result_name} - No rating or too few ratings")
-                        continue
-                    
-                    # Calculate similarity
-                    ratio = difflib.SequenceMatcher(None, clean_name.lower(), result_name.lower()).ratio()
-                    
-                    # Check year match
-                    result_year = self.extract_year(result_name)
-                    year_match = True
-                    if target_year and result_year:
-                        if target_year != result_year:
-                            year_match = False
-                            ratio -= 0.1
-                    
-                    print(f"    Result {i+1}: {result_name} | Rating: {rating} ({ratings_count} ratings) | Match: {ratio:.2f}")
-                    
-                    if ratio > highest_ratio and year_match:
-                        highest_ratio = ratio
-                        best_match = {
-                            'name': result_name,
-                            'rating': rating,
-                            'ratings_count': ratings_count,
-                            'match_ratio': ratio
-                        }
-                
-                except Exception as e:
-                    print(f"    Error parsing result {i}: {e}")
-                    continue
+            if self.local_index:
+                self.local_index.add_results(results)
+
+            # The year in wine_name is matched against each result's vintage
+            ranked = rank_candidates(wine_name, [r['name'] for r in results], [r['vintage'] for r in results])
+            for idx, ratio in ranked[:5]:
+                r = results[idx]
+                print(f"    {r['name']} | Rating: {r['rating']} ({r['ratings_count']} ratings) | Match: {ratio:.2f}")
             
             # Threshold for accepting a match
-            if highest_ratio > 0.4 and best_match:
+            if ranked and ranked[0][1] >= MATCH_THRESHOLD:
+                idx, highest_ratio = ranked[0]
+                best_match = dict(results[idx], match_ratio=highest_ratio)
                 print(f"  ✅ Selected: {best_match['name']} - Rating: {best_match['rating']} (Match: {highest_ratio:.2f})")
                 return best_match['rating']
             else:
+                highest_ratio = ranked[0][1] if ranked else 0.0
                 print(f"  ❌ No good match found (best ratio: {highest_ratio:.2f})")
                 return None
         
@@ -0,0 +1,119 @@
+"""
+Local Vivino Reference Index
+Stores every Vivino result the scrapers have fetched (Vivino's name, vintage, rating,
+ratings_count) in a SQLite table and serves lookups from an in-memory trigram index, so
+known wines resolve locally and the network is only used for true misses.
+
+Only real Vivino results go in: store names with the score they were given are not Vivino
+wines, and would make any similar store name match itself. An index opened with
+max_age_days ignores results fetched longer ago, so those wines are searched again (and
+their entries refreshed) - enrich_vivino_scores.py --mode stale does this.
+
+Usage:
+    python vivino_index.py                   # number of indexed Vivino wines
+    python vivino_index.py lookup "<name>"   # try a local lookup
+"""
+import sys
+import sqlite3
+import time
+from score_store import SCORE_DB
+from wine_matcher import WineMatcher
+from wine_schema import parse_score
+
+LOCAL_MATCH_THRESHOLD = 0.8  # Stricter than live search - a local hit is not re-checked online
+
+
+class VivinoIndex:
+    def __init__(self, db_path=SCORE_DB, max_age_days=None):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS vivino_wines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                vintage TEXT NOT NULL DEFAULT '',
+                rating REAL NOT NULL,
+                ratings_count INTEGER,
+                source TEXT,
+                fetched_at REAL NOT NULL,
+                UNIQUE (name, vintage)
+            );
+        """)
+        self.max_age_days = max_age_days
+        self.matcher = None
+        self.rows = []  # matcher position -> (id, name, vintage, rating, ratings_count, fetched_at)
+        self.positions = {}  # (name, vintage) -> matcher position
+
+    def _build(self):
+        """Build the in-memory trigram index on first use"""
+        self.matcher = WineMatcher()
+        for row in self.conn.execute(
+                "SELECT id, name, vintage, rating, ratings_count, fetched_at FROM vivino_wines"):
+            self._index_row(row)
+
+    def _index_row(self, row):
+        key = (row[1], row[2])
+        if key in self.positions:
+            self.rows[self.positions[key]] = row
+            return
+        self.positions[key] = self.matcher.add(f"{row[1]} {row[2]}".strip())
+        self.rows.append(row)
+
+    def add_results(self, results, source='vivino'):
+        """Ingest Vivino results: list of dicts with Vivino's name, rating and optional vintage/ratings_count"""
+        now = time.time()
+        entries = []
+        for r in results:
+            rating = parse_score(r.get('rating'))
+            if rating is None:
+                continue
+            entries.append((r['name'], str(r.get('vintage') or ''), rating, r.get('ratings_count'), source, now))
+        if not entries:
+            return 0
+        self.conn.executemany("""
+            INSERT INTO vivino_wines (name, vintage, rating, ratings_count, source, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (name, vintage) DO UPDATE SET
+                rating = excluded.rating, ratings_count = excluded.ratings_count,
+                source = excluded.source, fetched_at = excluded.fetched_at
+        """, entries)
+        self.conn.commit()
+        if self.matcher is not None:
+            for name, vintage, rating, count, _, _ in entries:
+                row = self.conn.execute(
+                    "SELECT id, name, vintage, rating, ratings_count, fetched_at FROM vivino_wines "
+                    "WHERE name = ? AND vintage = ?",
+                    (name, vintage)).fetchone()
+                self._index_row(row)
+        return len(entries)
+
+    def lookup(self, wine_name, threshold=LOCAL_MATCH_THRESHOLD):
+        """Return {'name', 'vintage', 'rating', 'ratings_count', 'match_ratio'} or None
+        (also None when the best match was fetched more than max_age_days ago)"""
+        if self.matcher is None:
+            self._build()
+        ranked = self.matcher.rank_ids(wine_name, limit=1)
+        if not ranked or ranked[0][1] < threshold:
+            return None
+        pos, ratio = ranked[0]
+        _, name, vintage, rating, ratings_count, fetched_at = self.rows[pos]
+        if self.max_age_days is not None and fetched_at < time.time() - self.max_age_days * 24 * 60 * 60:
+            return None
+        return {'name': name, 'vintage': vintage, 'rating': rating,
+                'ratings_count': ratings_count, 'match_ratio': ratio}
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM vivino_wines").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    index = VivinoIndex()
+    if len(sys.argv) > 2 and sys.argv[1] == 'lookup':
+        start = time.perf_counter()
+        hit = index.lookup(sys.argv[2])
+        print(f"{hit} ({(time.perf_counter() - start) * 1000:.2f} ms)")
+    else:
+        print(f"Index holds {len(index)} Vivino wines")
+    index.close()
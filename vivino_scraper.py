@@ -1,38 +1,60 @@
 """
 Vivino Scraper - Extracts wine ratings from Vivino.com
 """
-import undetected_chromedriver as uc
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import json
 import time
 import urllib.parse
 import re
-import difflib
+from selenium.webdriver.common.by import By
+import browser
+from wine_matcher import rank_candidates, MATCH_THRESHOLD
+from wine_schema import parse_score
+from run_telemetry import RunTelemetry
+from scraper_debug import DebugCapture, HTML_PARSER
+from scraper_fixtures import record_page
+
+SEARCH_WAIT = 3  # Longest wait for the search results to render
+
+# Result markup: class names carry build hashes (wineCard__wineCard--3zxIX), so match on the stable prefix
+CARD_SELECTOR = 'div[class*="wineCard__wineCard"]'
+# Only result cards (and their contents) are built into the tree, not the whole page
+CARD_STRAINER = SoupStrainer('div', class_=lambda c: c is not None and 'wineCard__wineCard' in c)
+NAME_SELECTORS = ('a[class*="anchor_anchor"]', '[class*="wineCard__name"]')
+RATING_SELECTOR = '[class*="averageValue"]'
+RATING_TEXT_RE = re.compile(r'^\d\.\d$')
+YEAR_PARAM_RE = re.compile(r'[?&]year=((?:19|20)\d{2})\b')  # Vintage in a result link
 
 class VivinoScraper:
-    def __init__(self):
+    def __init__(self, local_index=None, telemetry=None, debug_capture=None):
         self.base_url = "https://www.vivino.com"
         self.driver = None
+        # Debug log file and pages of failed lookups - off unless WINEVINO_DEBUG_CAPTURE=1
+        self.debug = DebugCapture(debug_capture)
+        # Lookup timings, cache hits and match ratios (in memory only unless the caller logs the run)
+        self.telemetry = telemetry or RunTelemetry('vivino', log_file=None)
+        # Optional VivinoIndex: answer known wines locally and remember every result we fetch
+        self.local_index = local_index
+        self.last_was_local = False  # True when the last get_score() needed no network
+        self.search_wait = SEARCH_WAIT  # Fixture replays (scraper_fixtures.py) need no wait
 
     def start_browser(self):
         """Start the browser session"""
         if not self.driver:
-            options = uc.ChromeOptions()
-            # options.add_argument('--headless') 
-            options.add_argument('--no-sandbox')
-            
-            self.driver = uc.Chrome(options=options)
-            print("Vivino browser started (standard)")
+            # Headless with images, fonts and trackers blocked, in the saved Vivino profile (see browser.py)
+            with self.telemetry.stage('vivino:browser_start'):
+                self.driver = browser.start_browser('vivino', telemetry=self.telemetry)
 
     def close_browser(self):
         """Close the browser session"""
         if self.driver:
             try:
-                self.driver.quit()
+                browser.close_browser(self.driver)
                 print("Vivino browser closed")
             except:
                 pass
             self.driver = None
+        self.debug.flush()
 
     def clean_wine_name(self, name):
         """Clean wine name for better search results"""
@@ -49,126 +71,138 @@ class VivinoScraper:
         return match.group(0) if match else None
 
     def log(self, message):
-        """Log message to file and console"""
+        """Log message to console (and to the debug file in debug capture mode)"""
         print(message)
-        try:
-            with open('scraper_debug.txt', 'a', encoding='utf-8') as f:
-                f.write(f"{message}\n")
-        except:
-            pass
+        self.debug.log(message)
+
+    def parse_results(self, html, parser=HTML_PARSER):
+        """(number of result cards, [(name, score, vintage)] for the cards with a valid score)
 
-    def find_by_partial_class(self, element, partial_class, tag=None):
-        """Find element where class contains partial_class"""
-        if tag:
-            return element.find(tag, class_=lambda x: x and partial_class in x)
-        return element.find(class_=lambda x: x and partial_class in x)
+        The vintage comes from the card link (?year=2019) or the name, None when neither has one.
+        """
+        soup = BeautifulSoup(html, parser, parse_only=CARD_STRAINER)
+        cards = soup.select(CARD_SELECTOR)
+        results = []
+        for i, card in enumerate(cards):
+            try:
+                # The link usually holds the name; fall back to the name element
+                name_elem = None
+                for selector in NAME_SELECTORS:
+                    name_elem = card.select_one(selector)
+                    if name_elem:
+                        break
+                if not name_elem:
+                    self.log(f"  Result {i+1}: Could not find name element")
+                    continue
+                result_name = name_elem.get_text(strip=True)
+
+                rating_elem = card.select_one(RATING_SELECTOR)
+                if rating_elem:
+                    score = rating_elem.get_text(strip=True)
+                else:
+                    # Try finding text that looks like a rating (e.g. "3.7")
+                    score = next((text.strip() for text in card.find_all(string=True)
+                                  if RATING_TEXT_RE.match(text.strip())), "N/A")
+
+                # If score is not a number (e.g. "N/A" or empty), skip
+                if parse_score(score) is None:
+                    self.log(f"  Result {i+1}: {result_name} | Score: {score} (Skipped - invalid score)")
+                    continue
+                year = YEAR_PARAM_RE.search(name_elem.get('href') or '') if name_elem.name == 'a' else None
+                vintage = year.group(1) if year else self.extract_year(result_name)
+                results.append((result_name, parse_score(score), vintage))
+            except Exception as e:
+                self.log(f"  Error parsing result {i}: {e}")
+        return len(cards), results
 
     def get_score(self, wine_name):
-        """Get Vivino score with fuzzy matching and multi-result analysis"""
+        """Get Vivino score (float, or None when no good match) with fuzzy matching and multi-result analysis"""
+        self.last_was_local = False
+        if self.local_index:
+            hit = self.local_index.lookup(wine_name)
+            if hit:
+                print(f"Local match for '{wine_name}': {hit['name']} ({hit['rating']})")
+                self.last_was_local = True
+                self.telemetry.count('vivino.local_hits')
+                return parse_score(hit['rating'])
+
         if not self.driver:
             raise Exception("Browser not started. Call start_browser() first.")
         
-        # Clear log file on first call
-        with open('scraper_debug.txt', 'w', encoding='utf-8') as f:
-            f.write(f"--- Scraping '{wine_name}' ---\n")
-            
+        self.log(f"--- Scraping '{wine_name}' ---")
+        self.telemetry.count('vivino.lookups')
+        started = time.perf_counter()
+        try:
+            return self._search_score(wine_name)
+        finally:
+            self.telemetry.observe('vivino_lookup_s', time.perf_counter() - started)
+
+    def _search_score(self, wine_name):
+        """Search Vivino for one wine (get_score without the local index and timing)"""
         original_name = wine_name
         clean_name = self.clean_wine_name(wine_name)
-        target_year = self.extract_year(wine_name)
         
-        self.log(f"Searching for: '{clean_name}' (Year: {target_year})")
+        self.log(f"Searching for: '{clean_name}'")
         
         try:
             search_url = f"{self.base_url}/search/wines?q={urllib.parse.quote_plus(clean_name)}"
-            self.driver.get(search_url)
-            time.sleep(3) # Wait for results to load
-            
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+            with self.telemetry.stage('vivino:search'):
+                self.driver.get(search_url)
+                if self.search_wait and browser.is_challenge(self.driver) and not browser.wait_for_site(self.driver):
+                    # The saved session no longer passes the bot check: start it over
+                    self.log("Vivino bot check did not pass, clearing the saved session")
+                    self.telemetry.failure('vivino:session_reset', wine=wine_name)
+                    browser.forget_session(self.driver, 'vivino')
+                    self.driver.get(search_url)
+                if self.search_wait:
+                    # Results render after the DOM is ready (eager page loads): continue at the
+                    # first result card, or after search_wait when there are none
+                    browser.wait_for_count(self.driver, By.CSS_SELECTOR, CARD_SELECTOR, 0, timeout=self.search_wait)
+            parse_start = time.perf_counter()
             
-            # Save HTML for debugging
-            with open('page_source.html', 'w', encoding='utf-8') as f:
-                f.write(self.driver.page_source)
+            html = self.driver.page_source  # One round trip to the browser
+            record_page('vivino', search_url, html, wine=wine_name)
+            card_count, results = self.parse_results(html)
+            self.log(f"Found {card_count} results")
+            if not card_count:
+                self.telemetry.failure('vivino:no_results', wine=wine_name)
+                self.debug.capture_failure(wine_name, 'no_results', html)
             
-            # Find wine cards using partial class match (list comprehension method)
-            all_divs = soup.find_all('div')
-            cards = [div for div in all_divs if div.get('class') and any('wineCard__wineCard' in cls for cls in div.get('class', []))]
-            
-            self.log(f"Found {len(cards)} results")
-            
-            best_match = None
-            highest_ratio = 0.0
-            
-            # Analyze top 5 results
-            for i, card in enumerate(cards[:5]):
-                try:
-                    # Extract name
-                    # Look for the link which usually contains the name
-                    name_elem = self.find_by_partial_class(card, 'anchor_anchor', 'a')
-                    if not name_elem:
-                        # Fallback: look for any element with 'wineCard__name' or similar
-                        name_elem = self.find_by_partial_class(card, 'wineCard__name')
-                    
-                    if not name_elem:
-                        self.log(f"  Result {i+1}: Could not find name element")
-                        continue
-                        
-                    result_name = name_elem.get_text(strip=True)
-                    
-                    # Extract rating
-                    # Look for the rating number. It's usually a large number.
-                    # We can look for a div with 'vivinoRating__averageValue' or similar
-                    rating_elem = self.find_by_partial_class(card, 'averageValue')
-                    if not rating_elem:
-                        # Try finding text that looks like a rating (e.g. "3.7")
-                        for elem in card.find_all(string=True):
-                            if re.match(r'^\d\.\d$', elem.strip()):
-                                score = elem.strip()
-                                break
-                        else:
-                            score = "N/A"
-                    else:
-                        score = rating_elem.get_text(strip=True)
-                        
-                    # If score is not a number (e.g. "N/A" or empty), skip
-                    try:
-                        float(score.replace(',', '.'))
-                    except ValueError:
-                        self.log(f"  Result {i+1}: {result_name} | Score: {score} (Skipped - invalid score)")
-                        continue
-
-                    # Calculate similarity
-                    # We compare the result name with the CLEANED name
-                    ratio = difflib.SequenceMatcher(None, clean_name.lower(), result_name.lower()).ratio()
-                    
-                    # Check for year match if target year exists
-                    result_year = self.extract_year(result_name)
-                    year_match = True
-                    if target_year and result_year:
-                        if target_year != result_year:
-                            year_match = False
-                            ratio -= 0.1 # Penalize wrong year
-                    
-                    self.log(f"  Result {i+1}: {result_name} | Score: {score} | Match: {ratio:.2f}")
-                    
-                    if ratio > highest_ratio and year_match:
-                        highest_ratio = ratio
-                        best_match = score
-                        
-                except Exception as e:
-                    self.log(f"  Error parsing result {i}: {e}")
-                    continue
+            if self.local_index:
+                self.local_index.add_results([{'name': name, 'rating': score, 'vintage': vintage}
+                                              for name, score, vintage in results])
+
+            # The year in wine_name is matched against each result's vintage
+            ranked = rank_candidates(wine_name, [name for name, _, _ in results],
+                                     [vintage for _, _, vintage in results])
+            self.telemetry.record_stage('vivino:parse', time.perf_counter() - parse_start)
+            if ranked:
+                self.telemetry.observe('vivino_match_ratio', ranked[0][1])
+            for idx, ratio in ranked[:5]:
+                self.log(f"  {results[idx][0]} | Score: {results[idx][1]} | Match: {ratio:.2f}")
             
             # Threshold for accepting a match
-            if highest_ratio > 0.4: 
+            if ranked and ranked[0][1] >= MATCH_THRESHOLD:
+                idx, highest_ratio = ranked[0]
+                best_match = results[idx][1]
                 self.log(f"✅ Selected match with ratio {highest_ratio:.2f}: {best_match}")
-                return str(best_match).replace(',', '.')
+                self.telemetry.count('vivino.matched')
+                return parse_score(best_match)
             else:
+                highest_ratio = ranked[0][1] if ranked else 0.0
                 self.log(f"❌ No good match found (best ratio: {highest_ratio:.2f})")
-                return "N/A"
+                if results:
+                    self.telemetry.failure('vivino:no_match', wine=wine_name, best_ratio=round(highest_ratio, 3))
+                    self.debug.capture_failure(wine_name, 'no_match', html)
+                elif card_count:
+                    self.telemetry.failure('vivino:no_scores', wine=wine_name)
+                    self.debug.capture_failure(wine_name, 'no_scores', html)
+                return None
 
         except Exception as e:
             self.log(f"Vivino scraping error for '{wine_name}': {e}")
-            return "N/A"
+            self.telemetry.failure(f'vivino:{type(e).__name__}', wine=wine_name, error=str(e))
+            return None
     
     def __enter__(self):
         """Context manager entry"""
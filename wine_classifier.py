@@ -0,0 +1,222 @@
+"""
+Wine Classifier - wine type and bottle size from the product name
+All keywords live in wine_keywords.json (FR/NL/EN colours, grapes, appellations, sizes)
+and are compiled into a single regex. Conflicts are settled by tier: style words
+(champagne, sangria...) beat explicit colours (rosé, blanc, rood...), which beat grapes
+and appellations. So "Merlot Rosé" is Rosé and "Sauvignon Blanc" is White.
+
+Usage:
+    python wine_classifier.py learn        # learn from wines_with_other_type.csv corrections
+    python wine_classifier.py reclassify   # re-run type and size over the store CSVs
+    python wine_classifier.py "<name>"     # classify a single name
+"""
+import json
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+KEYWORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wine_keywords.json')
+
+VOLUME_RE = re.compile(r'(?:\b(\d+)\s*x\s*)?(\d+(?:[.,]\d+)?)\s*(cl|ml|l|ltr|liter|litre|liters|litres)\b')
+UNIT_CL = {'cl': 1, 'ml': 0.1}  # everything else is litres
+WORD_RE = re.compile(r"[^\W\d_]{4,}")  # Candidate keywords in a folded name
+
+# A word becomes a learned keyword when at least MIN_KEYWORD_SUPPORT corrected names
+# contain it, all corrected to one type, and at least MIN_KEYWORD_PRECISION of the labelled
+# names containing it have that type
+MIN_KEYWORD_SUPPORT = 3
+MIN_KEYWORD_PRECISION = 0.9
+
+
+def fold_accents(text):
+    """'Rosé Côtes' -> 'Rose Cotes'"""
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def fold(text):
+    return fold_accents(str(text)).lower()
+
+
+def parse_volume(text):
+    """'6 x 75 cl' -> (6, 75.0), 'Rouge 1,5L' -> (None, 150.0), no volume -> None"""
+    match = VOLUME_RE.search(fold(text))
+    if not match:
+        return None
+    count, amount, unit = match.groups()
+    return (int(count) if count else None), float(amount.replace(',', '.')) * UNIT_CL.get(unit, 100)
+
+
+def load_keywords(path=KEYWORDS_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compile_pattern(words):
+    """One regex over all keywords, longest first so 'cabernet sauvignon' beats 'sauvignon'.
+    Keywords must not touch other letters, but digits are fine ('blanc75cl')."""
+    alternatives = sorted({re.escape(w) for w in words}, key=len, reverse=True)
+    return re.compile(r"(?<![a-z])(?:" + '|'.join(alternatives) + r")(?![a-z])")
+
+
+class WineClassifier:
+    def __init__(self, keywords=None):
+        self.keywords = keywords or load_keywords()
+        priority = self.keywords['type_priority']
+
+        # folded keyword -> (tier, priority index, type)
+        self.lookup = {}
+        for wine_type, tiers in self.keywords['types'].items():
+            for tier, words in tiers.items():
+                for word in words:
+                    self._add(fold(word), (int(tier), priority.index(wine_type), wine_type))
+        for word, wine_type in self.keywords['learned']['keywords'].items():
+            self._add(fold(word), (3, priority.index(wine_type), wine_type))
+        self.type_re = compile_pattern(self.lookup)
+        self.learned_names = {fold(k): v for k, v in self.keywords['learned']['names'].items()}
+
+        sizes = self.keywords['sizes']
+        self.size_ranges = [(label, low, high) for label, (low, high) in sizes['ranges'].items()]
+        self.box_min_cl = sizes['box_min_cl']
+        self.box_re = compile_pattern(fold(w) for w in sizes['box_keywords'])
+        self.classify_type = lru_cache(maxsize=20000)(self._classify_type)
+        self.classify_size = lru_cache(maxsize=20000)(self._classify_size)
+
+    def _add(self, word, entry):
+        # Keep the strongest entry when a word is listed twice
+        if word not in self.lookup or entry < self.lookup[word]:
+            self.lookup[word] = entry
+
+    def _resolve(self, matches):
+        best = min((self.lookup[m] for m in matches), default=None)
+        return best[2] if best else 'Other'
+
+    def _classify_type(self, name):
+        text = fold(name)
+        learned = self.learned_names.get(text)
+        if learned:
+            return learned
+        return self._resolve(self.type_re.findall(text))
+
+    def _classify_size(self, name):
+        text = fold(name)
+        if self.box_re.search(text):
+            return 'Box'
+        volume = parse_volume(text)
+        if not volume:
+            return 'Other'
+        count, cl = volume
+        if count:
+            return 'Other'  # Multipacks keep their own listing size
+        if cl >= self.box_min_cl:
+            return 'Box'
+        for label, low, high in self.size_ranges:
+            if low <= cl <= high:
+                return label
+        return 'Other'
+
+    def classify_frame(self, df, name_col='name'):
+        """Classify a whole DataFrame in one pass; returns a copy with type and size columns"""
+        df = df.copy()
+        folded = df[name_col].astype(str).map(fold)
+        learned = folded.map(self.learned_names)
+        matched = folded.str.findall(self.type_re).map(self._resolve)
+        df['type'] = learned.fillna(matched)
+        df['size'] = df[name_col].astype(str).map(self.classify_size)
+        return df
+
+
+def learn_from_corrections(keywords, type_corrections, labelled=None):
+    """Record corrected names, and words that reliably point to one type, in the learned section
+
+    type_corrections and labelled map names to types; labelled is the rest of the catalog
+    (corrections win) and only serves to check a word's precision, 'Other' not counted.
+    Learned keywords are worked out again on every run, so one that no longer qualifies
+    is dropped.
+    """
+    priority = keywords['type_priority']
+    learned = keywords['learned']
+    learned['keywords'] = {}
+    classifier = WineClassifier(keywords)
+
+    word_types = {}
+    for name, corrected in type_corrections.items():
+        if corrected not in priority:
+            continue
+        if classifier.classify_type(name) != corrected:
+            learned['names'][name] = corrected
+        for word in set(WORD_RE.findall(fold(name))):
+            word_types.setdefault(word, []).append(corrected)
+
+    word_counts = {}
+    for name, wine_type in {**(labelled or {}), **type_corrections}.items():
+        if wine_type not in priority or wine_type == 'Other':
+            continue
+        for word in set(WORD_RE.findall(fold(name))):
+            word_counts.setdefault(word, Counter())[wine_type] += 1
+
+    for word, types in word_types.items():
+        if word in classifier.lookup or len(types) < MIN_KEYWORD_SUPPORT or len(set(types)) > 1:
+            continue
+        counts = word_counts[word]
+        if counts[types[0]] / sum(counts.values()) >= MIN_KEYWORD_PRECISION:
+            learned['keywords'][word] = types[0]
+    return keywords
+
+
+_default = None
+
+
+def default_classifier():
+    """Shared classifier built from wine_keywords.json on first use"""
+    global _default
+    if _default is None:
+        _default = WineClassifier()
+    return _default
+
+
+def classify_type(name):
+    return default_classifier().classify_type(name)
+
+
+def classify_size(name):
+    return default_classifier().classify_size(name)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'reclassify':
+        import pandas as pd
+        from wine_schema import read_wines_frame, write_wines_frame
+        classifier = default_classifier()
+        for csv_file in ['carrefour_wines.csv', 'ah_wines.csv', 'manual_wines.csv']:
+            if not os.path.exists(csv_file):
+                continue
+            columns = list(pd.read_csv(csv_file, nrows=0).columns)  # Keep the file's own columns
+            df = read_wines_frame(csv_file)
+            if df.empty:
+                continue
+            new_df = classifier.classify_frame(df)
+            # Only fill in what the classifier knows - an existing label beats 'Other'
+            for col in ['type', 'size']:
+                unknown = (new_df[col] == 'Other') & (df[col] != 'Other')
+                new_df.loc[unknown, col] = df.loc[unknown, col]
+            changed = ((new_df['type'] != df['type']) | (new_df['size'] != df['size'])).sum()
+            write_wines_frame(new_df, csv_file, columns)
+            print(f"✓ {csv_file}: {changed} of {len(df)} wines changed type or size")
+    elif len(sys.argv) > 1 and sys.argv[1] == 'learn':
+        from apply_corrections import load_corrections
+        from wine_schema import read_wines_csv
+        type_corrections, _ = load_corrections()
+        names = dict(type_corrections.values())
+        labelled = {w['name']: w['type'] for csv_file in ['carrefour_wines.csv', 'ah_wines.csv', 'manual_wines.csv']
+                    for w in read_wines_csv(csv_file)}
+        keywords = learn_from_corrections(load_keywords(), names, labelled)
+        with open(KEYWORDS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(keywords, f, ensure_ascii=False, indent=2)
+        print(f"✅ Learned {len(keywords['learned']['names'])} names and "
+              f"{len(keywords['learned']['keywords'])} keywords into {KEYWORDS_FILE}")
+    else:
+        for name in sys.argv[1:]:
+            print(f"{name}: {classify_type(name)}, {classify_size(name)}")
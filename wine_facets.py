@@ -0,0 +1,171 @@
+"""
+Wine Facets - precomputed filter index for /api/wines
+Built once per wine cache refresh (update_cache in app.py):
+
+  bitsets         facet -> value -> boolean mask over the wine cache
+                  (type, size, store, pairing; values are lowercased)
+  sorted columns  price_cents and vivino_score as numpy arrays plus their sort order,
+                  so a range filter is two binary searches and sorted output needs no sort
+
+A query ORs the values within a facet and ANDs across facets. Facet counts are
+disjunctive: the counts of a facet apply every filter except that facet's own, so the
+client can show how many wines each other choice would give.
+
+The pairing facet doubles as the inverted index pairing tag -> wines. Pairings are
+edited at runtime: a POST re-tags one wine (update_pairings), and the facet is rebuilt
+on its own (set_pairings) only when pairings.json changed on disk. Both build new dicts
+and masks and swap them in whole, labels before bitsets, so a query running at the same
+time sees either the old or the new facet, never one being changed.
+"""
+import numpy as np
+
+FACETS = ('type', 'size', 'store', 'pairing')
+SORTS = ('price-low', 'price-high', 'score')
+
+
+class SortedColumn:
+    """A numeric column with unknown values (None) and its ascending sort order"""
+
+    def __init__(self, values):
+        self.values = np.array([np.nan if v is None else v for v in values], dtype=float)
+        # Stable sorts keep the cache order for ties; NaN (unknown) sorts last both ways
+        self.order = np.argsort(self.values, kind='stable')
+        self.order_desc = np.argsort(-self.values, kind='stable')
+        self.known = int(np.count_nonzero(~np.isnan(self.values)))
+        self.sorted = self.values[self.order[:self.known]]
+
+    def range_mask(self, low=None, high=None):
+        """Mask of wines with low <= value <= high (unknown values never match)"""
+        start = 0 if low is None else int(np.searchsorted(self.sorted, low, side='left'))
+        end = self.known if high is None else int(np.searchsorted(self.sorted, high, side='right'))
+        mask = np.zeros(len(self.values), dtype=bool)
+        mask[self.order[start:end]] = True
+        return mask
+
+    def ascending(self):
+        return self.order
+
+    def descending(self):
+        """Highest first, unknown values still last"""
+        return self.order_desc
+
+
+class FacetIndex:
+    def __init__(self, wines, pairings=None, pairings_version=None):
+        self.wines = wines  # Query results are positions in this list
+        self.size = len(wines)
+        self.names = [w['name'] for w in wines]
+        self.positions_by_name = {}  # Pairings are keyed by name; a name can be in several stores
+        for i, name in enumerate(self.names):
+            self.positions_by_name.setdefault(name, []).append(i)
+        self.bitsets = {facet: {} for facet in FACETS}
+        self.labels = {facet: {} for facet in FACETS}  # lowercased value -> value as shown
+        self.cache = {}  # Derived results (wine_ranking.py), dropped with the index on refresh
+        for facet in ('type', 'size', 'store'):
+            self.labels[facet], self.bitsets[facet] = self.build_bitsets([[w.get(facet)] for w in wines])
+        self.price = SortedColumn([w.get('price_cents') for w in wines])
+        self.score = SortedColumn([w.get('vivino_score') for w in wines])
+        self.set_pairings(pairings or {}, pairings_version)
+
+    def build_bitsets(self, values_per_wine):
+        """(labels, bitsets) of one facet"""
+        positions = {}
+        labels = {}
+        for i, values in enumerate(values_per_wine):
+            for value in values:
+                if value:
+                    key = str(value).lower()
+                    positions.setdefault(key, []).append(i)
+                    labels.setdefault(key, str(value))
+        bitsets = {}
+        for value, idx in positions.items():
+            mask = np.zeros(self.size, dtype=bool)
+            mask[idx] = True
+            bitsets[value] = mask
+        return labels, bitsets
+
+    def set_pairings(self, pairings, version=None):
+        """Rebuild the pairing facet from pairings.json data (wine name -> {"pairings": [...]});
+        version identifies the pairings data so callers can tell when to rebuild"""
+        labels, bitsets = self.build_bitsets([pairings.get(name, {}).get('pairings', []) for name in self.names])
+        self.pairings = pairings
+        self.pairings_version = version
+        self.labels['pairing'] = labels
+        self.bitsets['pairing'] = bitsets
+
+    def update_pairings(self, name, tags, version=None):
+        """Incrementally re-tag one wine (all its listings) after a pairings update"""
+        positions = self.positions_by_name.get(name)
+        self.pairings_version = version
+        if not positions:
+            return
+        labels = dict(self.labels['pairing'])
+        new_tags = {}
+        for tag in tags or []:
+            if tag:
+                new_tags.setdefault(str(tag).lower(), str(tag))
+        bitsets = {}
+        for key, bitset in self.bitsets['pairing'].items():
+            if key in new_tags or bitset[positions].any():
+                bitset = bitset.copy()  # Queries may be reading the old mask
+                bitset[positions] = key in new_tags
+            bitsets[key] = bitset
+        for key, label in new_tags.items():
+            if key not in bitsets:
+                bitsets[key] = np.zeros(self.size, dtype=bool)
+                bitsets[key][positions] = True
+                labels[key] = label
+        self.labels['pairing'] = labels
+        self.bitsets['pairing'] = bitsets
+
+    def facet_mask(self, facet, values, bitsets=None):
+        """Wines matching any of the values (None when the facet is not filtered)"""
+        if not values:
+            return None
+        bitsets = self.bitsets[facet] if bitsets is None else bitsets
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            bitset = bitsets.get(value.lower())
+            if bitset is not None:
+                mask |= bitset
+        return mask
+
+    def query(self, facets=None, min_price=None, max_price=None, min_score=None, sort='price-low'):
+        """Filter and sort: returns (wine indices in sort order, facet counts)
+
+        facets: {'type': ['red', 'white'], 'store': ['carrefour'], ...}
+        min_price/max_price in cents, min_score on the Vivino 0-5 scale"""
+        facets = facets or {}
+        base = np.ones(self.size, dtype=bool)
+        if min_price is not None or max_price is not None:
+            base &= self.price.range_mask(min_price, max_price)
+        if min_score is not None:
+            base &= self.score.range_mask(min_score, None)
+
+        # One snapshot per facet; bitsets first, as the pairing facet swaps labels first
+        bitsets = {facet: self.bitsets[facet] for facet in FACETS}
+        labels = {facet: self.labels[facet] for facet in FACETS}
+        masks = {facet: self.facet_mask(facet, facets.get(facet), bitsets[facet]) for facet in FACETS}
+        selected = base.copy()
+        for mask in masks.values():
+            if mask is not None:
+                selected &= mask
+
+        counts = {}
+        for facet in FACETS:
+            others = base.copy()
+            for other, mask in masks.items():
+                if other != facet and mask is not None:
+                    others &= mask
+            counts[facet] = {labels[facet].get(value, value): int(np.count_nonzero(others & bitset))
+                             for value, bitset in sorted(bitsets[facet].items())}
+
+        if sort == 'price-low':
+            order = self.price.ascending()
+        elif sort == 'price-high':
+            order = self.price.descending()
+        elif sort == 'score':
+            order = self.score.descending()
+        else:
+            order = np.arange(self.size)  # Cache order
+        return order[selected[order]], counts
@@ -0,0 +1,169 @@
+"""
+Wine Matcher - fast fuzzy matching of store wine names against Vivino results
+Names are normalized once (sizes, alcohol %, store prefixes stripped, accents folded)
+and compared with token-set and trigram similarity. Year and colour signals are
+folded into the final score.
+"""
+import re
+from functools import lru_cache
+from wine_classifier import classify_type, fold_accents
+
+MATCH_THRESHOLD = 0.45  # Minimum score to accept a match (tuned on the 'tune' split of matcher_labels.csv)
+
+SIZE_RE = re.compile(
+    r'\b(\d+\s*x\s*)?\d+([.,]\d+)?\s*(cl|ml|l|ltr|liter|litre|litres|liters)\b|\bbag in box\b|\bbib\b|\b\d+x\b')
+ALCOHOL_RE = re.compile(r'\b\d+([.,]\d+)?\s*%\s*(alc|vol)?\b\.?|\balc\b\.?')
+YEAR_RE = re.compile(r'\b(19|20)\d{2}\b')
+NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+# Private labels that Vivino does not use in its wine names
+STORE_PREFIXES = [
+    'ah excellent selectie', 'ah biologisch', 'ah vol & droge', 'ah fris & droge', 'ah',
+    "la cave d'augustin florent", 'carrefour bio', 'carrefour',
+]
+
+# Words that carry no identity: colours (used as a separate signal) and filler
+STOPWORDS = {
+    'rouge', 'red', 'rood', 'rooi', 'rosso', 'tinto', 'white', 'wit', 'bianco', 'blanco',
+    'rose', 'rosato', 'rosado', 'vin', 'vino', 'wine', 'wijn', 'wijntap', 'huiswijn',
+    'de', 'du', 'des', 'la', 'le', 'les', 'di', 'del', 'the', 'd', 'l', 'et', 'en', 'and', 'y', 'e',
+}
+
+YEAR_BONUS = 0.05
+YEAR_PENALTY = 0.15
+COLOUR_PENALTY = 0.2
+
+
+class PreparedName:
+    """A wine name with everything needed for matching precomputed"""
+    __slots__ = ('name', 'normalized', 'tokens', 'grams', 'year', 'colour')
+
+    def __init__(self, name):
+        self.name = name
+        self.year = extract_year(name)
+        colour = classify_type(name)
+        self.colour = colour if colour != 'Other' else None
+        self.normalized = normalize_name(name)
+        self.tokens = frozenset(t for t in self.normalized.split() if t not in STOPWORDS and not YEAR_RE.match(t))
+        self.grams = trigrams(' '.join(sorted(self.tokens)) or self.normalized)
+
+
+def extract_year(name):
+    """Extract vintage year from wine name"""
+    match = YEAR_RE.search(name)
+    return match.group(0) if match else None
+
+
+def normalize_name(name):
+    """Lowercase, fold accents and strip sizes, alcohol %, store prefixes and punctuation"""
+    text = fold_accents(str(name)).lower()
+    for prefix in STORE_PREFIXES:
+        folded = fold_accents(prefix)
+        if text.startswith(folded + ' '):
+            text = text[len(folded):]
+            break
+        text = text.replace(' ' + folded + ' ', ' ')
+    text = SIZE_RE.sub(' ', text)
+    text = ALCOHOL_RE.sub(' ', text)
+    text = NON_WORD_RE.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+@lru_cache(maxsize=50000)
+def prepare(name):
+    """Cached PreparedName - repeated lookups of the same name cost nothing"""
+    return PreparedName(name)
+
+
+def similarity(query, candidate):
+    """Score two PreparedNames between 0 and 1"""
+    shared = len(query.tokens & candidate.tokens)
+    if query.tokens and candidate.tokens:
+        dice = 2 * shared / (len(query.tokens) + len(candidate.tokens))
+        containment = shared / min(len(query.tokens), len(candidate.tokens))
+        token_score = 0.5 * dice + 0.5 * containment
+    else:
+        token_score = 0.0
+
+    union = len(query.grams | candidate.grams)
+    gram_score = len(query.grams & candidate.grams) / union if union else 0.0
+
+    score = 0.6 * token_score + 0.4 * gram_score
+
+    if query.year and candidate.year:
+        score += YEAR_BONUS if query.year == candidate.year else -YEAR_PENALTY
+    if query.colour and candidate.colour and query.colour != candidate.colour:
+        score -= COLOUR_PENALTY
+    return max(0.0, min(1.0, score))
+
+
+class WineMatcher:
+    """Matches names against a growing set of candidates.
+
+    Candidates are prepared once and indexed by trigram, so each query only
+    scores candidates that share enough of its trigrams.
+    """
+
+    def __init__(self, candidates=(), shortlist=50):
+        self.candidates = []
+        self.shortlist = shortlist
+        self.index = {}
+        for c in candidates:
+            self.add(c)
+
+    def add(self, name):
+        """Add a candidate and return its position"""
+        i = len(self.candidates)
+        cand = prepare(name)
+        self.candidates.append(cand)
+        for gram in cand.grams:
+            self.index.setdefault(gram, []).append(i)
+        return i
+
+    def rank(self, name, limit=5):
+        """Return [(candidate_name, score)] best first"""
+        return [(self.candidates[i].name, score) for i, score in self.rank_ids(name, limit)]
+
+    def rank_ids(self, name, limit=5):
+        """Return [(candidate_position, score)] best first"""
+        query = prepare(name)
+        counts = {}
+        for gram in query.grams:
+            for i in self.index.get(gram, ()):
+                counts[i] = counts.get(i, 0) + 1
+        if len(counts) > self.shortlist:
+            ids = sorted(counts, key=counts.get, reverse=True)[:self.shortlist]
+        else:
+            ids = counts
+        scored = [(i, similarity(query, self.candidates[i])) for i in ids]
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return scored[:limit]
+
+    def best_match(self, name, threshold=MATCH_THRESHOLD):
+        """Return (candidate_name, score) or None if nothing clears the threshold"""
+        ranked = self.rank(name, limit=1)
+        if ranked and ranked[0][1] >= threshold:
+            return ranked[0]
+        return None
+
+    def match_many(self, names, threshold=MATCH_THRESHOLD):
+        """Batch version of best_match: {name: (candidate_name, score) or None}"""
+        return {name: self.best_match(name, threshold) for name in names}
+
+
+def rank_candidates(name, candidates, vintages=None):
+    """Score a small list of candidate names (e.g. one Vivino search page) against name.
+    vintages (one per candidate, None when unknown) count as the candidates' years when
+    their names have none, as in Vivino results, so a wrong vintage is penalised.
+    Returns [(index, score)] best first."""
+    query = prepare(name)
+    if vintages:
+        candidates = [f"{c} {v}" if v and not extract_year(c) else c for c, v in zip(candidates, vintages)]
+    scored = [(i, similarity(query, prepare(c))) for i, c in enumerate(candidates)]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored
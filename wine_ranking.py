@@ -0,0 +1,85 @@
+"""
+Wine Ranking - top-k "best value" wines for /api/top
+Ranks the wines of a FacetIndex (wine_facets.py) by a value metric:
+
+  score_per_euro    Vivino score per euro of price
+  score_under_cap   Vivino score, only wines at or below a price cap ("best under €10")
+
+A rating-count-weighted score needs each wine's Vivino ratings_count, which the store
+CSVs do not carry yet, so it is not offered.
+
+Metric columns are numpy arrays computed once per index, and the top k are picked with
+a partial selection (argpartition) instead of sorting the catalog. Results are cached on
+the index, so they are recomputed only after a wine cache refresh.
+"""
+import numpy as np
+
+METRICS = ('score_per_euro', 'score_under_cap')
+DEFAULT_K = 10
+MAX_K = 100
+DEFAULT_PRICE_CAP = 1000  # Cents
+TOP_CACHE_SIZE = 256
+
+
+def metric_column(index, metric, price_cap=DEFAULT_PRICE_CAP):
+    """Metric value per wine, NaN for wines the metric cannot rank"""
+    key = ('column', metric, price_cap if metric == 'score_under_cap' else None)
+    if key in index.cache:
+        return index.cache[key]
+
+    score = index.score.values
+    price = index.price.values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if metric == 'score_per_euro':
+            values = np.where(price > 0, score / (price / 100), np.nan)
+        elif metric == 'score_under_cap':
+            values = np.where(price <= price_cap, score, np.nan)
+        else:
+            raise ValueError(f"Unknown metric: {metric}")
+    remember(index, key, values)
+    return values
+
+
+def remember(index, key, value):
+    if len(index.cache) >= TOP_CACHE_SIZE:
+        index.cache.clear()
+    index.cache[key] = value
+
+
+def top_positions(values, price, mask, k):
+    """Positions of the k highest values among the masked wines, best first
+    (ties: cheaper first, then cache order)"""
+    candidates = np.flatnonzero(mask & ~np.isnan(values))
+    if len(candidates) > k:
+        # Keep everything tied with the k-th best value, so ties are broken by price below
+        kth_best = -np.partition(-values[candidates], k - 1)[k - 1]
+        candidates = candidates[values[candidates] >= kth_best]
+    return candidates[np.lexsort((candidates, price[candidates], -values[candidates]))][:k]
+
+
+def top_wines(index, metric, facets=None, k=DEFAULT_K, price_cap=DEFAULT_PRICE_CAP, group_by=None):
+    """Best k wines as (position, value) pairs; with group_by, a dict of group -> pairs"""
+    facets = {facet: tuple(sorted(v.lower() for v in values)) for facet, values in (facets or {}).items() if values}
+    key = ('top', metric, tuple(sorted(facets.items())), k, price_cap, group_by)
+    if key in index.cache:
+        return index.cache[key]
+
+    values = metric_column(index, metric, price_cap)
+    mask = np.ones(index.size, dtype=bool)
+    for facet, wanted in facets.items():
+        facet_mask = index.facet_mask(facet, wanted)
+        if facet_mask is not None:
+            mask &= facet_mask
+
+    def ranked(group_mask):
+        return [(int(i), float(values[i])) for i in top_positions(values, index.price.values, group_mask, k)]
+
+    if group_by:
+        result = {index.labels[group_by][value]: ranked(mask & bitset)
+                  for value, bitset in sorted(index.bitsets[group_by].items())}
+        result = {group: wines for group, wines in result.items() if wines}
+    else:
+        result = ranked(mask)
+
+    remember(index, key, result)
+    return result
@@ -0,0 +1,165 @@
+"""
+Wine Schema
+Parses the loosely typed values coming from scrapers, CSVs and corrections once,
+at scrape or load time, into native types:
+
+  price_cents   int or None    (6.99, "€ 6,99", "6.99 €" -> 699, "Free" -> 0, "N/A" -> None)
+  vivino_score  float or None  ("3,8" -> 3.8, 0 / "0" / "N/A" / "" -> None)
+  size_cl       int or None    (per bottle, from the name: "6 x 75 cl" -> 75, "Box 3L" -> 300)
+  type          one of WINE_TYPES
+  size          one of SIZE_LABELS
+
+`price` is kept next to price_cents as a number of euros for the frontends.
+Every CSV is read with read_wines_csv()/read_wines_frame() and written with
+write_wines_frame(), so consumers sort and filter on native values and never see
+"N/A" or 0 for an unknown score.
+"""
+import math
+import os
+import re
+import pandas as pd
+from wine_classifier import classify_size, parse_volume
+
+WINE_TYPES = ('Red', 'White', 'Rosé', 'Sparkling', 'Dessert', 'Other')
+SIZE_LABELS = ('25cl', '75cl', 'Box', 'Other')
+CSV_COLUMNS = ['name', 'price', 'url', 'image_url', 'type', 'size', 'vivino_score', 'store']
+NO_IMAGE_URL = "https://upload.wikimedia.org/wikipedia/commons/a/ac/No_image_available.svg"
+
+FREE_WORDS = {'free', 'gratis', 'gratuit'}
+PRICE_RE = re.compile(r'(\d+(?:[.,]\d{3})*)(?:[.,](\d{1,2}))?')
+_TYPE_LOOKUP = {t.lower(): t for t in WINE_TYPES}
+_TYPE_LOOKUP.update({'rose': 'Rosé', 'mousserend': 'Sparkling', 'dessert wine': 'Dessert'})
+
+
+def is_missing(value):
+    """None, NaN, and the placeholders the scrapers used for 'unknown'"""
+    if value is None or value is pd.NA:
+        return True
+    if isinstance(value, float) and math.isnan(value):
+        return True
+    return isinstance(value, str) and value.strip().lower() in ('', 'n/a', 'nan', 'none', '#')
+
+
+def parse_price_cents(value):
+    """Price in euro cents, or None when unknown"""
+    if is_missing(value):
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value * 100)) if value >= 0 else None
+    text = str(value).strip().lower()
+    if text in FREE_WORDS:
+        return 0
+    match = PRICE_RE.search(text.replace(' ', ''))
+    if not match:
+        return None
+    euros, cents = match.groups()
+    euros = euros.replace('.', '').replace(',', '')
+    return int(euros) * 100 + int((cents or '0').ljust(2, '0'))
+
+
+def parse_score(value):
+    """Vivino score as a float between 0 and 5, or None when unknown (0 means unknown)"""
+    if is_missing(value):
+        return None
+    try:
+        score = float(str(value).replace(',', '.'))
+    except ValueError:
+        return None
+    if math.isnan(score) or not 0 < score <= 5:
+        return None
+    return round(score, 2)
+
+
+def parse_type(value):
+    """One of WINE_TYPES ('rosé', 'ROSE' -> 'Rosé'); anything unknown is 'Other'"""
+    if is_missing(value):
+        return 'Other'
+    return _TYPE_LOOKUP.get(str(value).strip().lower(), 'Other')
+
+
+def parse_size(value, name=''):
+    """One of SIZE_LABELS, falling back to the classifier when the label is unknown"""
+    if not is_missing(value) and str(value) in SIZE_LABELS and str(value) != 'Other':
+        return str(value)
+    return classify_size(name) if name else 'Other'
+
+
+def parse_size_cl(name, size=None):
+    """Volume of one bottle in cl, from the name or else the size label"""
+    volume = parse_volume(str(name))
+    if volume:
+        return int(round(volume[1]))
+    if size in ('25cl', '75cl'):
+        return int(size[:2])
+    return None
+
+
+def price_euros(price_cents):
+    return None if price_cents is None else price_cents / 100
+
+
+def normalize_wine(wine, store=None):
+    """Return a copy of a wine dict with every field parsed into its native type"""
+    name = str(wine.get('name') or '').strip()
+    price_cents = parse_price_cents(wine.get('price'))
+    size = parse_size(wine.get('size'), name)
+    url = wine.get('url')
+    image_url = wine.get('image_url')
+    normalized = dict(wine)
+    normalized.update({
+        'name': name,
+        'price_cents': price_cents,
+        'price': price_euros(price_cents),
+        'url': '#' if is_missing(url) else str(url),
+        'image_url': NO_IMAGE_URL if is_missing(image_url) else str(image_url),
+        'type': parse_type(wine.get('type')),
+        'size': size,
+        'size_cl': parse_size_cl(name, size),
+        'vivino_score': parse_score(wine.get('vivino_score')),
+    })
+    store = store or wine.get('store')
+    if not is_missing(store):
+        normalized['store'] = store
+    return normalized
+
+
+def read_wines_csv(csv_file, store=None):
+    """Load a store CSV as a list of normalized wine dicts"""
+    if not os.path.exists(csv_file):
+        return []
+    df = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+    return [normalize_wine(row, store) for row in df.to_dict('records')]
+
+
+def read_wines_frame(csv_file, store=None):
+    """Load a store CSV as a DataFrame with native columns (price_cents and size_cl
+    are nullable integers, vivino_score is a float with NaN for unknown)"""
+    df = pd.DataFrame(read_wines_csv(csv_file, store))
+    if df.empty:
+        return df
+    df['price_cents'] = df['price_cents'].astype('Int64')
+    df['size_cl'] = df['size_cl'].astype('Int64')
+    df['price'] = df['price'].astype(float)
+    df['vivino_score'] = df['vivino_score'].astype(float)
+    return df
+
+
+def to_csv_record(wine):
+    """A normalized wine as a CSV row: prices with two decimals, unknown values empty"""
+    record = {col: wine.get(col) for col in CSV_COLUMNS}
+    cents = wine['price_cents'] if 'price_cents' in wine else parse_price_cents(wine.get('price'))
+    record['price'] = '' if is_missing(cents) else f"{cents / 100:.2f}"
+    score = parse_score(wine.get('vivino_score'))
+    record['vivino_score'] = '' if score is None else str(score)
+    record['type'] = parse_type(wine.get('type'))
+    return {k: ('' if is_missing(v) else v) for k, v in record.items()}
+
+
+def write_wines_frame(df, csv_file, columns=None):
+    """Atomically write wines (DataFrame or list of dicts) to a store CSV"""
+    wines = df.to_dict('records') if isinstance(df, pd.DataFrame) else df
+    columns = columns or CSV_COLUMNS
+    records = pd.DataFrame([to_csv_record(w) for w in wines], columns=CSV_COLUMNS)[columns]
+    tmp_file = csv_file + '.tmp'
+    records.to_csv(tmp_file, index=False, encoding='utf-8')
+    os.replace(tmp_file, csv_file)